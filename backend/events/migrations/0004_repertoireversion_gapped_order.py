@@ -0,0 +1,62 @@
+# Generated by Django 4.2.27 on 2026-10-17 03:02
+
+from django.db import migrations, models
+
+ORDER_GAP = 1024
+
+
+def spread_repertoire_orders(apps, schema_editor):
+    """
+    Renumera las versiones de cada repertorio con huecos de ORDER_GAP,
+    conservando el orden actual (order, created_at)
+    """
+    RepertoireVersion = apps.get_model('events', 'RepertoireVersion')
+
+    rows = []
+    position = 0
+    repertoire_id = None
+    for rv in RepertoireVersion.objects.order_by('repertoire_id', 'order', 'created_at', 'pk'):
+        if rv.repertoire_id != repertoire_id:
+            repertoire_id = rv.repertoire_id
+            position = 0
+        position += 1
+        rv.order = position * ORDER_GAP
+        rows.append(rv)
+    RepertoireVersion.objects.bulk_update(rows, ['order'], batch_size=500)
+
+
+def compact_repertoire_orders(apps, schema_editor):
+    """Vuelve a posiciones consecutivas (0, 1, 2...)"""
+    RepertoireVersion = apps.get_model('events', 'RepertoireVersion')
+
+    rows = []
+    position = 0
+    repertoire_id = None
+    for rv in RepertoireVersion.objects.order_by('repertoire_id', 'order', 'created_at', 'pk'):
+        if rv.repertoire_id != repertoire_id:
+            repertoire_id = rv.repertoire_id
+            position = 0
+        rv.order = position
+        position += 1
+        rows.append(rv)
+    RepertoireVersion.objects.bulk_update(rows, ['order'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_location_google_url'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='repertoireversion',
+            name='order',
+            field=models.PositiveIntegerField(default=0, help_text='Orden de la versión en el repertorio (con huecos entre posiciones)'),
+        ),
+        migrations.AddIndex(
+            model_name='repertoireversion',
+            index=models.Index(fields=['repertoire', 'order'], name='repversion_rep_order_idx'),
+        ),
+        migrations.RunPython(spread_repertoire_orders, compact_repertoire_orders),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+import re
+
+from django.db import IntegrityError, models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from django.dispatch import Signal
 from django.utils import timezone
 from django.utils.text import slugify
 from music.models import Version
@@ -65,12 +68,18 @@ class RepertoireVersion(models.Model):
     """
     Modelo intermedio para la relación muchos a muchos entre Repertoire y Version
     con campos adicionales como el orden de las versiones en el repertorio.
+
+    El orden usa enteros con huecos (ORDER_GAP entre posiciones consecutivas):
+    mover o insertar una versión entre otras dos sólo escribe esa fila, y el
+    repertorio se renumera (rebalance) únicamente cuando se agota el hueco.
     """
+    ORDER_GAP = 1024
+
     repertoire = models.ForeignKey(Repertoire, on_delete=models.CASCADE)
     version = models.ForeignKey(Version, on_delete=models.CASCADE)
     order = models.PositiveIntegerField(
         default=0,
-        help_text='Orden de la versión en el repertorio'
+        help_text='Orden de la versión en el repertorio (con huecos entre posiciones)'
     )
     notes = models.TextField(blank=True, verbose_name='Notas adicionales')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -78,12 +87,82 @@ class RepertoireVersion(models.Model):
     class Meta:
         ordering = ['order', 'created_at']
         unique_together = ('repertoire', 'version')
+        indexes = [
+            models.Index(fields=['repertoire', 'order'], name='repversion_rep_order_idx'),
+        ]
         verbose_name = 'Versión en repertorio'
         verbose_name_plural = 'Versiones en repertorios'
 
     def __str__(self):
         return f"{self.repertoire.name} - {self.version.theme.title} (Orden: {self.order})"
 
+    @classmethod
+    def position_order(cls, position):
+        """Valor de `order` para la posición `position` (0, 1, ...) de una lista"""
+        return (position + 1) * cls.ORDER_GAP
+
+    @classmethod
+    def next_order(cls, repertoire_id):
+        """Valor de `order` para agregar una versión al final del repertorio"""
+        max_order = cls.objects.filter(
+            repertoire_id=repertoire_id
+        ).aggregate(models.Max('order'))['order__max']
+        return (max_order or 0) + cls.ORDER_GAP
+
+    @classmethod
+    def rebalance(cls, repertoire_id):
+        """
+        Renumera las versiones del repertorio con ORDER_GAP de separación,
+        conservando el orden actual (los empates se resuelven por created_at).
+
+        Returns:
+            list: Las filas del repertorio con su nuevo orden
+        """
+        rows = list(cls.objects.filter(repertoire_id=repertoire_id).order_by('order', 'created_at', 'pk'))
+        for position, rv in enumerate(rows):
+            rv.order = cls.position_order(position)
+        cls.objects.bulk_update(rows, ['order'])
+        return rows
+
+    def _free_order(self, target, before):
+        """Orden libre entre `target` y su vecino, o None si no queda hueco"""
+        siblings = RepertoireVersion.objects.filter(
+            repertoire_id=self.repertoire_id
+        ).exclude(pk__in=[self.pk, target.pk])
+
+        if before:
+            neighbour = siblings.filter(order__lte=target.order).aggregate(models.Max('order'))['order__max']
+            low, high = (-1 if neighbour is None else neighbour), target.order
+        else:
+            neighbour = siblings.filter(order__gte=target.order).aggregate(models.Min('order'))['order__min']
+            if neighbour is None:
+                return target.order + self.ORDER_GAP
+            low, high = target.order, neighbour
+
+        order = (low + high) // 2
+        return order if low < order < high else None
+
+    def move(self, target, before=True):
+        """
+        Mueve esta versión justo antes (o después) de `target`, otra fila del
+        mismo repertorio. En el caso común sólo se actualiza esta fila; si no
+        queda hueco entre los vecinos se renumera el repertorio una vez.
+        El llamador debe bloquear el repertorio (select_for_update).
+        """
+        order = self._free_order(target, before)
+        if order is None:
+            rows = {rv.pk: rv for rv in RepertoireVersion.rebalance(self.repertoire_id)}
+            target.order = rows[target.pk].order
+            order = self._free_order(target, before)
+
+        self.order = order
+        self.save(update_fields=['order'])
+
+# Enviada tras Event.confirm/cancel/complete/reschedule, que escriben con
+# update() y por lo tanto no disparan post_save. Argumentos: instance, changes.
+event_transitioned = Signal()
+
+
 class Event(models.Model):
     """
     Modelo para representar un evento donde se tocará un repertorio.
@@ -163,6 +242,24 @@ class Event(models.Model):
         verbose_name = 'Evento'
         verbose_name_plural = 'Eventos'
         ordering = ['start_datetime']
+        indexes = [
+            # ?status= por fecha (EventViewSet)
+            models.Index(fields=['status', 'start_datetime'], name='event_status_start_idx'),
+            # Listados públicos (jdv, jamdevientos) por fecha. Parciales porque
+            # is_public=True se compila como "is_public" a secas, que SQLite
+            # sólo asocia a un índice cuya condición sea la misma
+            models.Index(
+                fields=['start_datetime'],
+                condition=models.Q(is_public=True),
+                name='event_public_start_idx'
+            ),
+            # Carrousel y próximos: sólo eventos públicos confirmados
+            models.Index(
+                fields=['start_datetime'],
+                condition=models.Q(is_public=True, status='CONFIRMED'),
+                name='event_public_confirmed_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.get_event_type_display()} - {self.start_datetime.strftime('%d/%m/%Y %H:%M')}"
@@ -176,26 +273,101 @@ class Event(models.Model):
         if not self.pk and self.start_datetime < timezone.now():
             raise ValidationError('No se puede crear un evento con fecha en el pasado')
 
+    # Reintentos si otro evento con el mismo título toma el slug a la vez
+    SLUG_ATTEMPTS = 3
+
+    @classmethod
+    def allocate_slug(cls, title, exclude_pk=None):
+        """
+        Slug libre para `title`: `base` o `base-N`, con N mayor que cualquier
+        sufijo ya usado. Una sola consulta, sin importar cuántos eventos
+        compartan el título.
+        """
+        base_slug = slugify(title)[:50].strip('-') or 'evento'
+        taken = cls.objects.filter(
+            slug__regex=rf'^{re.escape(base_slug)}(-[0-9]+)?$'
+        ).exclude(pk=exclude_pk).values_list('slug', flat=True)
+
+        suffixes = [int(slug[len(base_slug) + 1:] or 0) for slug in taken]
+        if not suffixes:
+            return base_slug
+        return f"{base_slug}-{max(suffixes) + 1}"
+
     def save(self, *args, **kwargs):
         # Generar slug único si no existe
-        if not self.slug and self.title:
-            base_slug = slugify(self.title)[:50]
-            slug = base_slug
-            counter = 1
+        if self.slug or not self.title:
+            self.full_clean()
+            return super().save(*args, **kwargs)
+
+        # La unicidad del slug generado la garantiza la base de datos
+        self.full_clean(exclude=['slug'])
+        for attempt in range(self.SLUG_ATTEMPTS):
+            self.slug = Event.allocate_slug(self.title, exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                self.slug = ''
+                if attempt == self.SLUG_ATTEMPTS - 1:
+                    raise
 
-            # Encontrar slug único
-            while Event.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-                if len(slug) > 100:
-                    base_slug = base_slug[:50 - len(str(counter)) - 1]
-                    slug = f"{base_slug}-{counter}"
+    # Estados desde los que se puede llegar a cada estado
+    TRANSITIONS = {
+        'CONFIRMED': ('DRAFT', 'CANCELLED'),
+        'CANCELLED': ('DRAFT', 'CONFIRMED'),
+        'COMPLETED': ('CONFIRMED',),
+    }
+    RESCHEDULABLE = ('DRAFT', 'CONFIRMED')
 
-            self.slug = slug
+    def _apply(self, **changes):
+        """
+        Escribe sólo `changes` (y updated_at) con un único UPDATE, condicionado
+        a que el estado en la base siga siendo el leído. Sin full_clean():
+        cada transición valida lo que cambia.
+        """
+        changes['updated_at'] = timezone.now()
+        updated = Event.objects.filter(pk=self.pk, status=self.status).update(**changes)
+        if not updated:
+            raise ValidationError('El evento cambió de estado mientras se actualizaba, vuelva a intentarlo')
 
-        self.full_clean()
-        super().save(*args, **kwargs)
+        for field, value in changes.items():
+            setattr(self, field, value)
+        event_transitioned.send(sender=Event, instance=self, changes=changes)
+
+    def _transition(self, status):
+        if self.status not in self.TRANSITIONS[status]:
+            raise ValidationError(
+                f'No se puede pasar de {self.get_status_display()} a {dict(self.STATUS_CHOICES)[status]}'
+            )
+        self._apply(status=status)
+
+    def confirm(self):
+        """Confirma el evento (desde borrador o cancelado)"""
+        self._transition('CONFIRMED')
+
+    def cancel(self):
+        """Cancela el evento (desde borrador o confirmado)"""
+        self._transition('CANCELLED')
+
+    def complete(self):
+        """Marca como completado un evento confirmado"""
+        self._transition('COMPLETED')
+
+    def reschedule(self, start_datetime, end_datetime=None):
+        """
+        Cambia las fechas de un evento en borrador o confirmado. Sin
+        `end_datetime` se conserva la duración actual.
+        """
+        if self.status not in self.RESCHEDULABLE:
+            raise ValidationError(f'No se puede reprogramar un evento {self.get_status_display().lower()}')
+        if end_datetime is None:
+            end_datetime = start_datetime + (self.end_datetime - self.start_datetime)
+        if start_datetime >= end_datetime:
+            raise ValidationError('La fecha de inicio debe ser anterior a la de finalización')
+        if start_datetime < timezone.now():
+            raise ValidationError('No se puede reprogramar un evento a una fecha en el pasado')
 
+        self._apply(start_datetime=start_datetime, end_datetime=end_datetime)
 
     @property
     def is_upcoming(self):
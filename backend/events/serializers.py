@@ -2,6 +2,7 @@ from rest_framework import serializers
 from .models import Location, Repertoire, RepertoireVersion, Event
 from music.models import Version, Theme
 from music.serializers import VersionSerializer, ThemeSerializer
+from .utils import get_ordered_versions
 
 class LocationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,6 +23,28 @@ class RepertoireVersionSerializer(serializers.ModelSerializer):
         fields = ['id', 'version', 'version_id', 'order', 'notes', 'created_at']
         read_only_fields = ('created_at',)
 
+class RepertoireVersionItemSerializer(serializers.Serializer):
+    """Una posición del repertorio en el payload de set_versions"""
+    version_id = serializers.IntegerField(min_value=1)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class RepertoireSetVersionsSerializer(serializers.Serializer):
+    """Lista ordenada completa de versiones para RepertoireViewSet.set_versions"""
+    versions = RepertoireVersionItemSerializer(many=True, allow_empty=True)
+
+    def validate_versions(self, value):
+        seen = set()
+        repeated = []
+        for item in value:
+            if item['version_id'] in seen:
+                repeated.append(item['version_id'])
+            seen.add(item['version_id'])
+        if repeated:
+            raise serializers.ValidationError(f'Versiones repetidas: {repeated}')
+        return value
+
+
 class RepertoireSerializer(serializers.ModelSerializer):
     versions = RepertoireVersionSerializer(
         source='repertoireversion_set', 
@@ -45,13 +68,17 @@ class RepertoireSerializer(serializers.ModelSerializer):
         versions_data = self.context.get('request').data.get('versions', [])
         repertoire = Repertoire.objects.create(**validated_data)
         
-        for version_data in versions_data:
-            RepertoireVersion.objects.create(
+        # `order` del payload sólo se usa para ordenar: se guardan posiciones con huecos
+        versions_data = sorted(versions_data, key=lambda version_data: version_data.get('order', 0))
+        RepertoireVersion.objects.bulk_create([
+            RepertoireVersion(
                 repertoire=repertoire,
                 version_id=version_data.get('version_id'),
-                order=version_data.get('order', 0),
+                order=RepertoireVersion.position_order(position),
                 notes=version_data.get('notes', '')
             )
+            for position, version_data in enumerate(versions_data)
+        ])
         
         return repertoire
 
@@ -99,6 +126,12 @@ class EventSerializer(serializers.ModelSerializer):
 
         return data
             
+class EventRescheduleSerializer(serializers.Serializer):
+    """Payload de EventViewSet.reschedule"""
+    start_datetime = serializers.DateTimeField()
+    end_datetime = serializers.DateTimeField(required=False)
+
+
 class EventCarouselSerializer(serializers.ModelSerializer):
     """
     Serializer optimizado para mostrar eventos en el carrousel de jamdevientos.com
@@ -129,10 +162,8 @@ class RepertoireCarouselSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'versions']
 
     def get_versions(self, obj):
-        # Obtener las versiones ordenadas por el campo 'order' en RepertoireVersion
-        repertoire_versions = obj.repertoireversion_set.select_related(
-            'version__theme'
-        ).prefetch_related('version__sheet_music').order_by('order')
+        # Versiones ordenadas por RepertoireVersion.order (usa el prefetch de la vista)
+        repertoire_versions = get_ordered_versions(obj)
 
         versions_data = []
         for rv in repertoire_versions:
@@ -153,7 +184,7 @@ class RepertoireCarouselSerializer(serializers.ModelSerializer):
                 'type': version.type,
                 'order': rv.order,
                 'notes': version.notes,
-                'sheet_music_count': version.sheet_music.count(),
+                'sheet_music_count': rv.sheet_music_count,
                 'created_at': version.created_at.isoformat() if version.created_at else None,
             }
             versions_data.append(version_data)
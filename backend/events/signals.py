@@ -1,123 +1,88 @@
 """
-Django signals for events app to send webhooks to n8n
+Django signals for events app
+
+- Send webhooks to n8n. Notifications are written to the webhook outbox and
+  delivered by `python manage.py dispatch_webhooks`, so saving never waits on n8n.
+- Invalidate the cached public responses (jamdevientos and jdv endpoints).
 """
-import os
-import httpx
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Location, Event, Repertoire
-import logging
-
-logger = logging.getLogger(__name__)
-
-# n8n webhook URL from environment
-# Use localhost since sheet-api runs on host, n8n accessible via host network
-N8N_WEBHOOK_URL = os.getenv('N8N_WEBHOOK_URL', 'http://localhost:5678/webhook/sheet-api-created')
-WEBHOOK_ENABLED = os.getenv('WEBHOOK_ENABLED', 'true').lower() == 'true'
-
-
-async def send_webhook(entity_type: str, entity_id: int, data: dict):
-    """
-    Send webhook to n8n when entity is created.
-
-    Args:
-        entity_type: Type of entity (Location, Event, Repertoire)
-        entity_id: ID of created entity
-        data: Entity data to send
-    """
-    if not WEBHOOK_ENABLED:
-        logger.info(f"Webhooks disabled. Skipping {entity_type} #{entity_id}")
-        return
-
-    payload = {
-        'entity_type': entity_type,
-        'entity_id': entity_id,
-        'action': 'created',
-        'data': data
-    }
-
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.post(N8N_WEBHOOK_URL, json=payload)
-            response.raise_for_status()
-            logger.info(f"Webhook sent for {entity_type} #{entity_id}: {response.status_code}")
-    except httpx.HTTPError as e:
-        logger.error(f"Failed to send webhook for {entity_type} #{entity_id}: {str(e)}")
-    except Exception as e:
-        logger.error(f"Unexpected error sending webhook: {str(e)}")
+from music.models import Theme, Instrument, Version, SheetMusic, VersionFile
+from sheetmusic_api.cache import public_events_cache
+from webhooks.utils import enqueue_webhook
+from .models import Location, Event, Repertoire, RepertoireVersion, event_transitioned
 
 
 @receiver(post_save, sender=Location)
 def location_created(sender, instance, created, **kwargs):
     """Send webhook when Location is created."""
     if created:
-        import asyncio
         data = {
             'id': instance.id,
             'name': instance.name,
             'address': instance.address,
             'city': instance.city,
             'capacity': instance.capacity,
-            'phone': instance.phone,
-            'email': instance.email,
+            'phone': instance.contact_phone,
+            'email': instance.contact_email,
             'website': instance.website,
             'notes': instance.notes,
             'created_at': instance.created_at.isoformat() if instance.created_at else None
         }
-
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(send_webhook('Location', instance.id, data))
+        enqueue_webhook('Location', instance.id, data)
 
 
 @receiver(post_save, sender=Event)
 def event_created(sender, instance, created, **kwargs):
     """Send webhook when Event is created."""
     if created:
-        import asyncio
         data = {
             'id': instance.id,
             'title': instance.title,
             'event_type': instance.event_type,
             'start_datetime': instance.start_datetime.isoformat() if instance.start_datetime else None,
             'end_datetime': instance.end_datetime.isoformat() if instance.end_datetime else None,
-            'location_id': instance.location.id if instance.location else None,
+            'location_id': instance.location_id,
             'location_name': instance.location.name if instance.location else None,
-            'repertoire_id': instance.repertoire.id if instance.repertoire else None,
+            'repertoire_id': instance.repertoire_id,
             'repertoire_name': instance.repertoire.name if instance.repertoire else None,
-            'notes': instance.notes,
+            'notes': instance.description,
             'created_at': instance.created_at.isoformat() if instance.created_at else None
         }
-
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(send_webhook('Event', instance.id, data))
+        enqueue_webhook('Event', instance.id, data)
 
 
 @receiver(post_save, sender=Repertoire)
 def repertoire_created(sender, instance, created, **kwargs):
     """Send webhook when Repertoire is created."""
     if created:
-        import asyncio
         data = {
             'id': instance.id,
             'name': instance.name,
             'description': instance.description,
             'created_at': instance.created_at.isoformat() if instance.created_at else None
         }
+        enqueue_webhook('Repertoire', instance.id, data)
+
+
+# Models whose data is rendered by the public event endpoints. Instrument
+# because its tuning feeds Version.part_matrix, which refresh_part_matrix
+# rewrites with update() (no post_save for Version)
+PUBLIC_CACHE_MODELS = [
+    Event, Location, Repertoire, RepertoireVersion,
+    Theme, Instrument, Version, SheetMusic, VersionFile,
+]
+
+
+def invalidate_public_events_cache(sender, **kwargs):
+    """Drop cached public event responses once the change is committed."""
+    transaction.on_commit(public_events_cache.invalidate)
+
 
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+for model in PUBLIC_CACHE_MODELS:
+    post_save.connect(invalidate_public_events_cache, sender=model, dispatch_uid=f'public_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_public_events_cache, sender=model, dispatch_uid=f'public_cache_delete_{model.__name__}')
 
-        loop.run_until_complete(send_webhook('Repertoire', instance.id, data))
+# Transiciones de estado y reprogramaciones usan update(), sin post_save
+event_transitioned.connect(invalidate_public_events_cache, sender=Event, dispatch_uid='public_cache_transition_Event')
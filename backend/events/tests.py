@@ -1,3 +1,427 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from music.models import Theme, Instrument, Version, SheetMusic
+from sheetmusic_api.cache import public_events_cache
+from sheetmusic_api.testing import QueryPlanMixin
+from .models import Location, Repertoire, RepertoireVersion, Event
+
+
+def create_public_event(title, versions_per_repertoire=3, location=None):
+    """Create a confirmed public event with a repertoire of versions with sheet music"""
+    instrument, _ = Instrument.objects.get_or_create(name='Trompeta', defaults={'afinacion': 'Bb'})
+    repertoire = Repertoire.objects.create(name=f'Repertorio {title}')
+
+    for order in range(versions_per_repertoire):
+        theme = Theme.objects.create(title=f'{title} tema {order}', tonalidad='C')
+        version = Version.objects.create(theme=theme, title=f'{title} versión {order}')
+        SheetMusic.objects.create(version=version, instrument=instrument, file='sheet_music/test.pdf')
+        RepertoireVersion.objects.create(repertoire=repertoire, version=version, order=order)
+
+    start = timezone.now() + timedelta(days=7)
+    return Event.objects.create(
+        title=title,
+        status='CONFIRMED',
+        is_public=True,
+        start_datetime=start,
+        end_datetime=start + timedelta(hours=3),
+        location=location,
+        repertoire=repertoire,
+    )
+
+
+class JamDeVientosQueryBudgetTest(TestCase):
+    """The public jamdevientos endpoints must not scale queries with events or versions"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.location = Location.objects.create(
+            name='Teatro', address='Calle 1', city='Buenos Aires', postal_code='1000', capacity=100
+        )
+
+    def count_queries(self, url):
+        cache.clear()  # measure the serialization, not the response cache
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_upcoming_query_count_is_constant(self):
+        create_public_event('Jam uno', location=self.location)
+        small, _ = self.count_queries('/api/v1/events/jamdevientos/upcoming/')
+
+        for i in range(4):
+            create_public_event(f'Jam extra {i}', versions_per_repertoire=5, location=self.location)
+        large, response = self.count_queries('/api/v1/events/jamdevientos/upcoming/')
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 2)
+        self.assertEqual(response.data['total'], 5)
+
+    def test_list_and_repertoire_query_budget(self):
+        event = create_public_event('Jam lista', location=self.location)
+        create_public_event('Jam lista 2', location=self.location)
+
+        queries, response = self.count_queries('/api/v1/events/jamdevientos/')
+        self.assertLessEqual(queries, 2)
+
+        queries, response = self.count_queries(f'/api/v1/events/jamdevientos/{event.id}/repertoire/')
+        self.assertLessEqual(queries, 2)
+
+    def test_versions_keep_repertoire_order_and_counts(self):
+        event = create_public_event('Jam orden', location=self.location)
+        RepertoireVersion.objects.filter(repertoire=event.repertoire, order=0).update(order=10)
+
+        _, response = self.count_queries(f'/api/v1/events/jamdevientos/{event.id}/repertoire/')
+        versions = response.data['versions']
+
+        self.assertEqual([v['order'] for v in versions], [1, 2, 10])
+        self.assertTrue(all(v['sheet_music_count'] == 1 for v in versions))
+
+
+class PublicResponseCacheTest(TestCase):
+    """Public event endpoints are cached, revalidated with ETags and invalidated on writes"""
+
+    url = '/api/v1/events/jamdevientos/upcoming/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.event = create_public_event('Jam cache', versions_per_repertoire=1)
+
+    def test_hit_and_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_write_invalidates_cached_response(self):
+        first = self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            theme = self.event.repertoire.versions.first().theme
+            theme.title = 'Otro título'
+            theme.save()
+
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['X-Cache'], 'MISS')
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+    def test_instrument_tuning_change_invalidates_part_matrix(self):
+        url = f'/api/v1/jdv/events/{self.event.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            instrument = Instrument.objects.get(name='Trompeta')
+            instrument.afinacion = 'Eb'
+            instrument.save()
+
+        second = self.client.get(url)
+        self.assertEqual(second['X-Cache'], 'MISS')
+        self.assertNotEqual(second.content, first.content)
+
+    def test_invalidation_during_render_is_not_cached(self):
+        from .views import JamDeVientosViewSet
+
+        upcoming = JamDeVientosViewSet.upcoming
+
+        def render_then_invalidate(viewset, request, *args, **kwargs):
+            response = upcoming(viewset, request, *args, **kwargs)
+            # A write commits while the response is being built from the old rows
+            public_events_cache.invalidate()
+            return response
+
+        with mock.patch.object(JamDeVientosViewSet, 'upcoming', render_then_invalidate):
+            self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+
+class RepertoireBulkEditTest(TestCase):
+    """Repertoire contents are edited in bulk with a bounded number of queries"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('musico', password='secret'))
+        self.repertoire = create_public_event('Jam edición', versions_per_repertoire=3).repertoire
+        self.current = list(self.repertoire.repertoireversion_set.values_list('version_id', flat=True))
+        self.extra = [
+            Version.objects.create(theme=Theme.objects.create(title=f'Extra {i}', tonalidad='C')).pk
+            for i in range(5)
+        ]
+        self.url = f'/api/v1/events/repertoires/{self.repertoire.pk}/'
+
+    def setlist(self):
+        return list(RepertoireVersion.objects.filter(
+            repertoire=self.repertoire
+        ).order_by('order').values_list('version_id', 'notes'))
+
+    def test_set_versions_adds_removes_and_reorders(self):
+        payload = {'versions': [
+            {'version_id': self.extra[0], 'notes': 'Abre'},
+            {'version_id': self.current[2]},
+            {'version_id': self.current[0], 'notes': 'Cierra'},
+        ]}
+        response = self.client.put(f'{self.url}set_versions/', payload, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['added'], response.data['removed'], response.data['updated']), (1, 1, 2))
+        self.assertEqual(self.setlist(), [
+            (self.extra[0], 'Abre'), (self.current[2], ''), (self.current[0], 'Cierra')
+        ])
+        self.assertEqual(
+            [row['version']['id'] for row in response.data['repertoire']['versions']],
+            [self.extra[0], self.current[2], self.current[0]]
+        )
+
+    def test_set_versions_query_count_does_not_grow_with_the_list(self):
+        def count(version_ids):
+            payload = {'versions': [{'version_id': pk} for pk in version_ids]}
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.put(f'{self.url}set_versions/', payload, format='json')
+            self.assertEqual(response.status_code, 200)
+            # Only writes: the nested VersionSerializer output is not part of the edit
+            return len([
+                q for q in context.captured_queries
+                if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            ])
+
+        # Each edit removes one version, adds others and reorders the rest
+        small = count([self.extra[0], self.current[1], self.current[0]])
+        large = count(list(reversed(self.extra[1:])) + [self.current[0], self.extra[0]])
+        self.assertEqual(small, large)
+        self.assertEqual(large, 3)
+
+    def test_set_versions_rejects_unknown_and_repeated_ids(self):
+        response = self.client.put(
+            f'{self.url}set_versions/', {'versions': [{'version_id': 999999}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['version_ids'], [999999])
+
+        repeated = {'versions': [{'version_id': self.current[0]}, {'version_id': self.current[0]}]}
+        response = self.client.put(f'{self.url}set_versions/', repeated, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([version_id for version_id, _ in self.setlist()], self.current)
+
+    def test_add_versions_appends_in_order(self):
+        payload = {'version_ids': [self.extra[1], self.current[0], 999999, self.extra[0]]}
+        response = self.client.post(f'{self.url}add_versions/', payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['added']), 2)
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertEqual(
+            [version_id for version_id, _ in self.setlist()],
+            self.current + [self.extra[1], self.extra[0]]
+        )
+        self.assertEqual(response.data['repertoire']['version_count'], 5)
+
+    def test_move_version_rewrites_only_the_moved_row(self):
+        RepertoireVersion.rebalance(self.repertoire.pk)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                f'{self.url}move_version/',
+                {'version_id': self.current[2], 'before': self.current[0]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        updates = [q for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            [version_id for version_id, _ in self.setlist()],
+            [self.current[2], self.current[0], self.current[1]]
+        )
+
+    def test_move_version_rebalances_when_there_is_no_gap(self):
+        # create_public_event leaves consecutive orders (0, 1, 2)
+        response = self.client.post(
+            f'{self.url}move_version/',
+            {'version_id': self.current[2], 'after': self.current[0]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [version_id for version_id, _ in self.setlist()],
+            [self.current[0], self.current[2], self.current[1]]
+        )
+        orders = sorted(RepertoireVersion.objects.filter(repertoire=self.repertoire).values_list('order', flat=True))
+        self.assertTrue(all(b - a > 1 for a, b in zip(orders, orders[1:])))
+
+        response = self.client.post(
+            f'{self.url}move_version/', {'version_id': self.extra[0], 'after': self.current[0]}, format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class EventSlugTest(TestCase):
+    """Event slugs are allocated with a single lookup, however many events share a title"""
+
+    def create_event(self, title, **kwargs):
+        start = timezone.now() + timedelta(days=7)
+        return Event.objects.create(
+            title=title, start_datetime=start, end_datetime=start + timedelta(hours=2), **kwargs
+        )
+
+    def test_duplicate_titles_get_numbered_slugs(self):
+        slugs = [self.create_event('Jam de Vientos').slug for _ in range(3)]
+        self.assertEqual(slugs, ['jam-de-vientos', 'jam-de-vientos-1', 'jam-de-vientos-2'])
+
+        # Unrelated slugs sharing the prefix are not counted
+        self.create_event('Jam de Vientos invierno')
+        self.assertEqual(self.create_event('Jam de Vientos').slug, 'jam-de-vientos-3')
+
+    def test_slug_lookup_query_count_is_constant(self):
+        for _ in range(5):
+            self.create_event('Ensayo general')
+        with CaptureQueriesContext(connection) as context:
+            event = self.create_event('Ensayo general')
+        selects = [q for q in context.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(event.slug, 'ensayo-general-5')
+
+    def test_retries_when_the_slug_is_taken_concurrently(self):
+        existing = self.create_event('Concierto')
+        with mock.patch.object(Event, 'allocate_slug', side_effect=['concierto', 'concierto-1']):
+            event = self.create_event('Concierto')
+        self.assertEqual((existing.slug, event.slug), ('concierto', 'concierto-1'))
+
+    def test_jdv_by_slug(self):
+        event = self.create_event('Jam pública', status='CONFIRMED', is_public=True)
+        client = APIClient()
+
+        response = client.get('/api/v1/jdv/events/by_slug/', {'slug': event.slug})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], event.id)
+
+        response = client.get('/api/v1/jdv/events/by_slug/', {'slug': 'jam publica'})
+        self.assertEqual(response.status_code, 404)
+
+
+class EventTransitionTest(TestCase):
+    """Status transitions and rescheduling write one UPDATE, without full_clean()"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('organizador', password='secret'))
+        start = timezone.now() + timedelta(days=7)
+        self.event = Event.objects.create(
+            title='Ensayo abierto', start_datetime=start, end_datetime=start + timedelta(hours=2)
+        )
+        self.url = f'/api/v1/events/events/{self.event.pk}/'
+
+    def test_query_count_per_transition(self):
+        # get_object + UPDATE; the event has no location/repertoire to serialize
+        new_start = self.event.start_datetime + timedelta(days=1)
+        steps = [
+            ('confirm', {}, 'CONFIRMED'),
+            ('reschedule', {'start_datetime': new_start.isoformat()}, 'CONFIRMED'),
+            ('complete', {}, 'COMPLETED'),
+        ]
+        for transition, payload, expected in steps:
+            with self.subTest(transition=transition), self.assertNumQueries(2):
+                response = self.client.post(f'{self.url}{transition}/', payload, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['status'], expected)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.start_datetime, new_start)
+        self.assertEqual(self.event.end_datetime - self.event.start_datetime, timedelta(hours=2))
+
+    def test_model_transition_is_a_single_update(self):
+        with self.assertNumQueries(1):
+            self.event.cancel()
+        with self.assertNumQueries(1):
+            self.event.confirm()
+        self.assertEqual(Event.objects.get(pk=self.event.pk).status, 'CONFIRMED')
+
+    def test_invalid_transitions_are_rejected(self):
+        response = self.client.post(f'{self.url}complete/')
+        self.assertEqual(response.status_code, 400)
+
+        past = (timezone.now() - timedelta(days=1)).isoformat()
+        response = self.client.post(f'{self.url}reschedule/', {'start_datetime': past}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        # Another request changed the status after this instance was read
+        stale = Event.objects.get(pk=self.event.pk)
+        self.event.cancel()
+        with self.assertRaises(ValidationError):
+            stale.confirm()
+        self.assertEqual(Event.objects.get(pk=self.event.pk).status, 'CANCELLED')
+
+    def test_transition_invalidates_public_cache(self):
+        public_events_cache.set('probe', 'cached')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.confirm()
+        self.assertIsNone(public_events_cache.get('probe'))
+
+
+class JDVFieldsetTest(TestCase):
+    """The jdv endpoints only load the setlist when the response includes the repertoire"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for i in range(2):
+            create_public_event(f'Jam campos {i}')
+
+    def test_upcoming_without_repertoire(self):
+        with CaptureQueriesContext(connection) as full:
+            response = self.client.get('/api/v1/jdv/events/upcoming/')
+        self.assertIn('repertoire', response.data['events'][0])
+
+        with CaptureQueriesContext(connection) as light:
+            response = self.client.get('/api/v1/jdv/events/upcoming/', {'omit': 'repertoire'})
+        self.assertNotIn('repertoire', response.data['events'][0])
+        self.assertEqual(len(light.captured_queries), len(full.captured_queries) - 2)
+
+        response = self.client.get('/api/v1/jdv/events/upcoming/', {'fields': 'id,title'})
+        self.assertEqual(set(response.data['events'][0]), {'id', 'title'})
+
+
+class EventQueryPlanTest(QueryPlanMixin, TestCase):
+    """Los listados públicos y por estado usan los índices de Event"""
+
+    def test_public_listing(self):
+        # JDVViewSet y JamDeVientosViewSet
+        self.assertUsesIndex(
+            Event.objects.filter(is_public=True).exclude(status='CANCELLED').order_by('start_datetime'),
+            'event_public_start_idx'
+        )
+
+    def test_upcoming_confirmed(self):
+        # carousel / upcoming
+        self.assertUsesIndex(
+            Event.objects.filter(
+                is_public=True, status='CONFIRMED', start_datetime__gte=timezone.now()
+            ).order_by('start_datetime'),
+            'event_public_confirmed_idx', 'event_status_start_idx'
+        )
 
-# Create your tests here.
+    def test_status_filter(self):
+        self.assertUsesIndex(
+            Event.objects.filter(status='DRAFT').order_by('start_datetime'),
+            'event_status_start_idx'
+        )
@@ -0,0 +1,67 @@
+"""
+Query helpers for events app
+"""
+from django.db.models import Count, Prefetch
+
+
+def ordered_repertoire_versions():
+    """
+    RepertoireVersion queryset used to render a repertoire's setlist.
+
+    Rows come ordered by position with version and theme joined, and carry a
+    `sheet_music_count` annotation so serializers never count per version.
+    """
+    from .models import RepertoireVersion
+
+    return RepertoireVersion.objects.select_related(
+        'version__theme'
+    ).annotate(
+        sheet_music_count=Count('version__sheet_music')
+    ).order_by('order', 'created_at')
+
+
+def prefetch_ordered_versions(lookup='repertoire__repertoireversion_set'):
+    """
+    Prefetch the ordered setlist into `Repertoire.ordered_versions`.
+
+    Args:
+        lookup: Path to the repertoireversion_set relation from the queryset
+            model ('repertoireversion_set' when prefetching on Repertoire)
+
+    Returns:
+        Prefetch: One extra query for the whole page, regardless of how many
+        events or versions it contains
+    """
+    return Prefetch(
+        lookup,
+        queryset=ordered_repertoire_versions(),
+        to_attr='ordered_versions'
+    )
+
+
+def get_ordered_versions(repertoire):
+    """
+    Return the repertoire's ordered setlist, using the prefetch when present.
+    """
+    repertoire_versions = getattr(repertoire, 'ordered_versions', None)
+    if repertoire_versions is None:
+        repertoire_versions = list(ordered_repertoire_versions().filter(repertoire=repertoire))
+    return repertoire_versions
+
+
+def prefetch_repertoire_versions(lookup='repertoireversion_set__version'):
+    """
+    Prefetch the versions rendered by RepertoireSerializer, with their theme,
+    sheet music/file counts and inherited media already resolved.
+
+    Args:
+        lookup: Path to the versions from the queryset model
+            ('repertoire__repertoireversion_set__version' from Event)
+    """
+    from music.models import Version
+    from music.utils import with_effective_media, with_version_counts
+
+    return Prefetch(
+        lookup,
+        queryset=with_effective_media(with_version_counts(Version.objects.select_related('theme')))
+    )
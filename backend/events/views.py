@@ -4,7 +4,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from django.db import models
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 
 from .models import Location, Repertoire, Event, RepertoireVersion
 from .serializers import (
@@ -14,12 +15,17 @@ from .serializers import (
     EventCarouselSerializer,
     RepertoireCarouselSerializer,
     EventWithRepertoireSerializer,
-    JamDeVientosEventSerializer
+    JamDeVientosEventSerializer,
+    RepertoireSetVersionsSerializer,
+    EventRescheduleSerializer
 )
 from .filters import EventFilter, RepertoireFilter
+from .utils import prefetch_ordered_versions, prefetch_repertoire_versions
 from music.models import Version
+from sheetmusic_api.cache import CachedResponseMixin, public_events_cache
+from sheetmusic_api.fieldsets import SparseFieldsetMixin
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint que permite ver y editar ubicaciones.
     """
@@ -39,11 +45,15 @@ class LocationViewSet(viewsets.ModelViewSet):
             self.permission_classes = [IsAdminUser]
         return super().get_permissions()
 
-class RepertoireViewSet(viewsets.ModelViewSet):
+class RepertoireViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint que permite ver y editar repertorios.
     """
-    queryset = Repertoire.objects.prefetch_related('repertoireversion_set__version').all()
+    queryset = Repertoire.objects.all()
+    # Las versiones se cargan sólo si la respuesta las incluye (?fields=, ?omit=, ?expand=)
+    field_querysets = {
+        'versions': lambda queryset: queryset.prefetch_related(prefetch_repertoire_versions()),
+    }
     serializer_class = RepertoireSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -68,6 +78,13 @@ class RepertoireViewSet(viewsets.ModelViewSet):
         instance.is_active = False
         instance.save()
 
+    def _reload(self, repertoire):
+        """
+        Vuelve a leer el repertorio con sus versiones en una sola pasada
+        (el prefetch hecho por get_object queda desactualizado tras escribir).
+        """
+        return self.get_queryset().get(pk=repertoire.pk)
+
     @action(detail=True, methods=['post'])
     def add_versions(self, request, pk=None):
         """
@@ -89,39 +106,46 @@ class RepertoireViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        added_versions = []
         errors = []
 
-        for version_id in version_ids:
-            try:
-                version = Version.objects.get(id=version_id)
+        with transaction.atomic():
+            # Bloquea el repertorio para que dos altas simultáneas no repitan el orden
+            Repertoire.objects.select_for_update().only('pk').get(pk=repertoire.pk)
 
-                # Verificar si ya existe
-                if RepertoireVersion.objects.filter(
-                    repertoire=repertoire,
-                    version=version
-                ).exists():
+            versions = Version.objects.only('pk').in_bulk(
+                [version_id for version_id in version_ids if str(version_id).isdigit()]
+            )
+            existing = set(RepertoireVersion.objects.filter(
+                repertoire=repertoire,
+                version_id__in=versions
+            ).values_list('version_id', flat=True))
+            next_order = RepertoireVersion.next_order(repertoire.pk)
+
+            new_rows = []
+            for version_id in version_ids:
+                version = versions.get(int(version_id)) if str(version_id).isdigit() else None
+                if version is None:
+                    errors.append(f'Version {version_id} no encontrada')
+                    continue
+                if version.pk in existing:
                     errors.append(f'Version {version_id} ya está en el repertorio')
                     continue
 
-                # Obtener el siguiente orden
-                max_order = RepertoireVersion.objects.filter(
-                    repertoire=repertoire
-                ).aggregate(models.Max('order'))['order__max'] or -1
-
-                # Crear RepertoireVersion
-                rv = RepertoireVersion.objects.create(
+                existing.add(version.pk)
+                new_rows.append(RepertoireVersion(
                     repertoire=repertoire,
                     version=version,
-                    order=max_order + 1,
+                    order=next_order,
                     notes=notes
-                )
-                added_versions.append(rv.id)
+                ))
+                next_order += RepertoireVersion.ORDER_GAP
 
-            except Version.DoesNotExist:
-                errors.append(f'Version {version_id} no encontrada')
+            added_versions = [rv.id for rv in RepertoireVersion.objects.bulk_create(new_rows)]
+            if added_versions:
+                # bulk_create no dispara post_save
+                transaction.on_commit(public_events_cache.invalidate)
 
-        serializer = self.get_serializer(repertoire)
+        serializer = self.get_serializer(self._reload(repertoire))
         return Response({
             'message': f'{len(added_versions)} versiones agregadas',
             'added': added_versions,
@@ -129,6 +153,136 @@ class RepertoireViewSet(viewsets.ModelViewSet):
             'repertoire': serializer.data
         }, status=status.HTTP_201_CREATED if added_versions else status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['put'])
+    def set_versions(self, request, pk=None):
+        """
+        Reemplaza el contenido completo del repertorio en una sola transacción.
+
+        La posición en la lista define el orden. Las versiones que no estén en
+        la lista se quitan del repertorio y las nuevas se agregan; `notes` es
+        opcional y, si se omite, se conservan las notas actuales.
+
+        Payload esperado:
+        {
+            "versions": [
+                {"version_id": 3, "notes": "Abre el show"},
+                {"version_id": 1},
+                ...
+            ]
+        }
+        """
+        repertoire = self.get_object()
+        payload = RepertoireSetVersionsSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        items = payload.validated_data['versions']
+        wanted_ids = [item['version_id'] for item in items]
+
+        found = Version.objects.only('pk').in_bulk(wanted_ids)
+        missing = [version_id for version_id in wanted_ids if version_id not in found]
+        if missing:
+            return Response(
+                {'error': 'Versiones no encontradas', 'version_ids': missing},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            Repertoire.objects.select_for_update().only('pk').get(pk=repertoire.pk)
+
+            current = {
+                rv.version_id: rv
+                for rv in RepertoireVersion.objects.filter(repertoire=repertoire)
+            }
+            removed = [rv.pk for version_id, rv in current.items() if version_id not in found]
+
+            to_create = []
+            to_update = []
+            for position, item in enumerate(items):
+                order = RepertoireVersion.position_order(position)
+                rv = current.get(item['version_id'])
+                if rv is None:
+                    to_create.append(RepertoireVersion(
+                        repertoire=repertoire,
+                        version_id=item['version_id'],
+                        order=order,
+                        notes=item.get('notes', '')
+                    ))
+                    continue
+
+                notes = item.get('notes', rv.notes)
+                if rv.order != order or rv.notes != notes:
+                    rv.order = order
+                    rv.notes = notes
+                    to_update.append(rv)
+
+            if removed:
+                RepertoireVersion.objects.filter(pk__in=removed).delete()
+            RepertoireVersion.objects.bulk_create(to_create)
+            RepertoireVersion.objects.bulk_update(to_update, ['order', 'notes'])
+
+            if removed or to_create or to_update:
+                # bulk_create/bulk_update no disparan post_save
+                transaction.on_commit(public_events_cache.invalidate)
+
+        serializer = self.get_serializer(self._reload(repertoire))
+        return Response({
+            'message': 'Repertorio actualizado',
+            'added': len(to_create),
+            'removed': len(removed),
+            'updated': len(to_update),
+            'repertoire': serializer.data
+        })
+
+    @action(detail=True, methods=['post'])
+    def move_version(self, request, pk=None):
+        """
+        Mueve una versión antes o después de otra dentro del repertorio.
+        Normalmente sólo se reescribe la fila movida.
+
+        Payload esperado:
+        {
+            "version_id": 3,
+            "before": 7  # o "after": 7 (version_id de la versión de referencia)
+        }
+        """
+        repertoire = self.get_object()
+        version_id = request.data.get('version_id')
+        before = request.data.get('before')
+        after = request.data.get('after')
+
+        if not version_id or (before is None) == (after is None):
+            return Response(
+                {'error': 'Se requiere version_id y uno de before/after'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        target_id = before if before is not None else after
+        if str(version_id) == str(target_id):
+            return Response(
+                {'error': 'No se puede mover una versión respecto de sí misma'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            Repertoire.objects.select_for_update().only('pk').get(pk=repertoire.pk)
+            rows = {
+                str(rv.version_id): rv
+                for rv in RepertoireVersion.objects.filter(
+                    repertoire=repertoire,
+                    version_id__in=[version_id, target_id]
+                )
+            }
+            if len(rows) < 2:
+                return Response(
+                    {'error': 'Esta versión no está en el repertorio'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            rows[str(version_id)].move(rows[str(target_id)], before=before is not None)
+
+        serializer = self.get_serializer(self._reload(repertoire))
+        return Response({
+            'message': 'Versión movida',
+            'repertoire': serializer.data
+        })
+
     @action(detail=True, methods=['delete'])
     def remove_version(self, request, pk=None):
         """
@@ -152,7 +306,7 @@ class RepertoireViewSet(viewsets.ModelViewSet):
             )
             rv.delete()
 
-            serializer = self.get_serializer(repertoire)
+            serializer = self.get_serializer(self._reload(repertoire))
             return Response({
                 'message': 'Versión eliminada del repertorio',
                 'repertoire': serializer.data
@@ -163,11 +317,16 @@ class RepertoireViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint que permite ver y editar eventos.
     """
     queryset = Event.objects.select_related('location', 'repertoire').all()
+    field_querysets = {
+        'repertoire': lambda queryset: queryset.prefetch_related(
+            prefetch_repertoire_versions('repertoire__repertoireversion_set__version')
+        ),
+    }
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -212,6 +371,7 @@ class EventViewSet(viewsets.ModelViewSet):
         """
         event = self.get_object()
         event.pk = None
+        event.slug = ''  # se genera uno nuevo a partir del título
         event.title = f"{event.title} (copia)"
         event.status = 'DRAFT'
         event.save()
@@ -219,40 +379,73 @@ class EventViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(event)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def _transition_response(self, event, change, *args):
+        """
+        Aplica una transición del modelo (un único UPDATE de las columnas que
+        cambian) y devuelve el evento serializado, o 400 si no es válida.
+        """
+        try:
+            getattr(event, change)(*args)
+        except DjangoValidationError as e:
+            return Response({'error': ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(event)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        """
+        Confirma un evento.
+        """
+        return self._transition_response(self.get_object(), 'confirm')
+
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """
         Cancela un evento.
         """
-        event = self.get_object()
-        event.status = 'CANCELLED'
-        event.save()
-        
-        serializer = self.get_serializer(event)
-        return Response(serializer.data)
+        return self._transition_response(self.get_object(), 'cancel')
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """
         Marca un evento como completado.
         """
+        return self._transition_response(self.get_object(), 'complete')
+
+    @action(detail=True, methods=['post'])
+    def reschedule(self, request, pk=None):
+        """
+        Cambia las fechas de un evento.
+
+        Payload esperado:
+        {
+            "start_datetime": "2026-12-01T20:00:00Z",
+            "end_datetime": "2026-12-01T23:00:00Z"  # opcional, conserva la duración
+        }
+        """
         event = self.get_object()
-        event.status = 'COMPLETED'
-        event.save()
-        
-        serializer = self.get_serializer(event)
-        return Response(serializer.data)
+        payload = EventRescheduleSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        return self._transition_response(
+            event,
+            'reschedule',
+            payload.validated_data['start_datetime'],
+            payload.validated_data.get('end_datetime')
+        )
 
 
-class JamDeVientosViewSet(viewsets.ReadOnlyModelViewSet):
+class JamDeVientosViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet específico para jamdevientos.com
     Proporciona endpoints optimizados para el carrousel y selección de eventos.
+    Las respuestas se cachean y se invalidan desde events/signals.py.
     """
     queryset = Event.objects.select_related('location', 'repertoire').prefetch_related(
-        'repertoire__repertoireversion_set__version__theme'
+        prefetch_ordered_versions()
     ).filter(is_public=True)
     permission_classes = []  # Sin autenticación requerida para jamdevientos.com
+    response_cache = public_events_cache
 
     @action(detail=False, methods=['get'])
     def carousel(self, request):
@@ -260,7 +453,8 @@ class JamDeVientosViewSet(viewsets.ReadOnlyModelViewSet):
         Endpoint para obtener eventos en formato carrousel para jamdevientos.com
         GET /api/v1/events/jamdevientos/carousel/
         """
-        events = self.get_queryset().filter(
+        # El carrousel no muestra versiones: se omite el prefetch del repertorio
+        events = self.get_queryset().prefetch_related(None).filter(
             start_datetime__gte=timezone.now()
         ).order_by('start_datetime')[:10]  # Próximos 10 eventos
 
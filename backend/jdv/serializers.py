@@ -7,6 +7,7 @@ organized for easy consumption by the jam-de-vientos frontend.
 from rest_framework import serializers
 from events.models import Event, Repertoire, RepertoireVersion, Location
 from music.models import Version, Theme
+from events.utils import get_ordered_versions
 from .utils import get_sheet_music_urls
 
 
@@ -29,7 +30,7 @@ class JDVVersionSerializer(serializers.ModelSerializer):
     sheet_music_files = serializers.SerializerMethodField()
 
     # Additional metadata
-    sheet_music_count = serializers.IntegerField(source='sheet_music.count', read_only=True)
+    sheet_music_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Version
@@ -58,6 +59,11 @@ class JDVVersionSerializer(serializers.ModelSerializer):
             return obj.theme.audio.url
         return None
 
+    def get_sheet_music_count(self, obj):
+        """Use the annotated count from the view's prefetch when available."""
+        count = getattr(obj, 'sheet_music_count', None)
+        return count if count is not None else obj.sheet_music.count()
+
     def get_sheet_music_files(self, obj):
         """
         Get sheet music files organized by tuning and part type.
@@ -107,18 +113,20 @@ class JDVRepertoireVersionSerializer(serializers.ModelSerializer):
 class JDVRepertoireSerializer(serializers.ModelSerializer):
     """Repertoire serializer for Jam de Vientos with ordered versions."""
     versions = serializers.SerializerMethodField()
-    version_count = serializers.IntegerField(source='repertoireversion_set.count', read_only=True)
+    version_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Repertoire
         fields = ['id', 'name', 'description', 'versions', 'version_count', 'is_active', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+    def get_version_count(self, obj):
+        """Count versions from the ordered setlist (prefetched by the view)."""
+        return len(get_ordered_versions(obj))
+
     def get_versions(self, obj):
         """Get versions ordered by RepertoireVersion.order field."""
-        repertoire_versions = obj.repertoireversion_set.select_related(
-            'version__theme'
-        ).prefetch_related('version__sheet_music').order_by('order')
+        repertoire_versions = get_ordered_versions(obj)
 
         return JDVRepertoireVersionSerializer(
             repertoire_versions,
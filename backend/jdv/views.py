@@ -11,33 +11,54 @@ from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Prefetch
 
-from events.models import Event
+from events.models import Event, RepertoireVersion
+from music.models import Version
+from sheetmusic_api.cache import CachedResponseMixin, public_events_cache
+from sheetmusic_api.fieldsets import SparseFieldsetMixin
 from .serializers import JDVEventSerializer, JDVEventListSerializer
 
 
-class JDVViewSet(viewsets.ReadOnlyModelViewSet):
+class JDVViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Jam de Vientos events.
 
     Provides read-only access to public events with their complete repertoires,
     versions, and sheet music file URLs. Optimized for jam-de-vientos frontend.
 
+    Responses are cached (with ETag/Last-Modified) and invalidated by the
+    events app signals whenever an event, repertoire or version changes.
+    ?fields=, ?omit= and ?expand= trim the response; the repertoire setlist
+    is only loaded when it is part of it.
+
     Endpoints:
         GET /api/v1/jdv/events/ - List public events
         GET /api/v1/jdv/events/{id}/ - Event detail with full repertoire
         GET /api/v1/jdv/events/upcoming/ - Next upcoming public events
         GET /api/v1/jdv/events/carousel/ - Events for carousel display
-        GET /api/v1/jdv/events/by-slug/?slug={slug} - Event by slug (future)
+        GET /api/v1/jdv/events/by_slug/?slug={slug} - Event by slug
     """
-    queryset = Event.objects.select_related(
-        'location', 'repertoire'
-    ).prefetch_related(
-        'repertoire__repertoireversion_set__version__theme',
-        'repertoire__repertoireversion_set__version__sheet_music',
-        'repertoire__repertoireversion_set__version__version_files',
-    ).all()
+    queryset = Event.objects.select_related('location', 'repertoire').all()
+    field_querysets = {
+        # Ordered setlist, then its versions with theme and sheet music count.
+        # Sheet music URLs come from Version.part_matrix, so files are not loaded.
+        'repertoire': lambda queryset: queryset.prefetch_related(
+            Prefetch(
+                'repertoire__repertoireversion_set',
+                queryset=RepertoireVersion.objects.order_by('order', 'created_at'),
+                to_attr='ordered_versions'
+            ),
+            Prefetch(
+                'repertoire__ordered_versions__version',
+                queryset=Version.objects.select_related('theme').annotate(
+                    sheet_music_count=Count('sheet_music')
+                )
+            ),
+        ),
+    }
     permission_classes = [AllowAny]  # Public access for jam-de-vientos
+    response_cache = public_events_cache
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description', 'location__name', 'location__city']
     ordering_fields = ['start_datetime', 'end_datetime', 'created_at']
@@ -45,7 +66,7 @@ class JDVViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_serializer_class(self):
         """Use detailed serializer for retrieve, list serializer for list."""
-        if self.action == 'retrieve' or self.action in ['upcoming', 'carousel', 'by_slug']:
+        if self.action in ['retrieve', 'upcoming', 'carousel', 'by_slug', 'repertoire']:
             return JDVEventSerializer
         return JDVEventListSerializer
 
@@ -87,11 +108,7 @@ class JDVViewSet(viewsets.ReadOnlyModelViewSet):
             status='CONFIRMED'
         ).order_by('start_datetime')[:limit]
 
-        serializer = JDVEventSerializer(
-            upcoming_events,
-            many=True,
-            context={'request': request}
-        )
+        serializer = self.get_serializer(upcoming_events, many=True)
 
         return Response({
             'events': serializer.data,
@@ -117,11 +134,7 @@ class JDVViewSet(viewsets.ReadOnlyModelViewSet):
             status='CONFIRMED'
         ).order_by('start_datetime')[:10]
 
-        serializer = JDVEventSerializer(
-            carousel_events,
-            many=True,
-            context={'request': request}
-        )
+        serializer = self.get_serializer(carousel_events, many=True)
 
         return Response({
             'events': serializer.data,
@@ -131,15 +144,12 @@ class JDVViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def by_slug(self, request):
         """
-        Get event by slug (future feature).
+        Get event by slug.
 
         Query parameters:
         - slug (str): Event slug
 
         Returns: Event detail with full repertoire
-
-        NOTE: Slug field doesn't exist yet in Event model.
-        This is prepared for future implementation.
         """
         slug = request.query_params.get('slug')
 
@@ -149,14 +159,10 @@ class JDVViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # TODO: Add slug field to Event model
-        # For now, try to match by title (temporary)
-        event = get_object_or_404(
-            self.get_queryset(),
-            title__iexact=slug.replace('-', ' ')
-        )
+        # Lookup on the unique (indexed) slug column
+        event = get_object_or_404(self.get_queryset(), slug=slug)
 
-        serializer = JDVEventSerializer(event, context={'request': request})
+        serializer = self.get_serializer(event)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
@@ -167,5 +173,5 @@ class JDVViewSet(viewsets.ReadOnlyModelViewSet):
         Returns: Event with full repertoire, versions, and sheet music files
         """
         event = self.get_object()
-        serializer = JDVEventSerializer(event, context={'request': request})
+        serializer = self.get_serializer(event)
         return Response(serializer.data)
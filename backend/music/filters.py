@@ -0,0 +1,41 @@
+import django_filters
+from .models import Theme, Instrument, Version
+
+
+class ThemeFilter(django_filters.FilterSet):
+    """
+    Filtros de temas, incluyendo la cantidad de versiones (anotada por ThemeViewSet).
+    """
+    versions_count_min = django_filters.NumberFilter(field_name='versions_count', lookup_expr='gte')
+    versions_count_max = django_filters.NumberFilter(field_name='versions_count', lookup_expr='lte')
+
+    class Meta:
+        model = Theme
+        fields = ['tonalidad', 'artist']
+
+
+class InstrumentFilter(django_filters.FilterSet):
+    """
+    Filtros de instrumentos, incluyendo la cantidad de partituras (anotada por InstrumentViewSet).
+    """
+    sheet_music_count_min = django_filters.NumberFilter(field_name='sheet_music_count', lookup_expr='gte')
+    sheet_music_count_max = django_filters.NumberFilter(field_name='sheet_music_count', lookup_expr='lte')
+
+    class Meta:
+        model = Instrument
+        fields = ['family', 'afinacion']
+
+
+class VersionFilter(django_filters.FilterSet):
+    """
+    Filtros de versiones, incluyendo la cantidad de partituras y archivos
+    (anotadas por VersionViewSet).
+    """
+    sheet_music_count_min = django_filters.NumberFilter(field_name='sheet_music_count', lookup_expr='gte')
+    sheet_music_count_max = django_filters.NumberFilter(field_name='sheet_music_count', lookup_expr='lte')
+    version_files_count_min = django_filters.NumberFilter(field_name='version_files_count', lookup_expr='gte')
+    version_files_count_max = django_filters.NumberFilter(field_name='version_files_count', lookup_expr='lte')
+
+    class Meta:
+        model = Version
+        fields = ['theme', 'type']
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.27 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+def backfill_part_matrix(apps, schema_editor):
+    """
+    Compute Version.part_matrix for existing versions
+    """
+    from music.utils import compute_part_matrix
+
+    Version = apps.get_model('music', 'Version')
+    SheetMusic = apps.get_model('music', 'SheetMusic')
+    VersionFile = apps.get_model('music', 'VersionFile')
+
+    for version in Version.objects.all():
+        sheet_music = SheetMusic.objects.filter(version=version).select_related('instrument').order_by('-created_at')
+        version_files = VersionFile.objects.filter(version=version).select_related('instrument').order_by('-created_at')
+        Version.objects.filter(pk=version.pk).update(
+            part_matrix=compute_part_matrix(version.type, sheet_music, version_files)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0011_migrate_sheetmusic_to_versionfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='version',
+            name='part_matrix',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Ruta de archivo por afinación y tipo de parte (mantenido por signals)'),
+        ),
+        migrations.RunPython(backfill_part_matrix, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-17 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0012_version_part_matrix'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sheetmusic',
+            index=models.Index(fields=['created_at', 'id'], name='sheetmusic_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='versionfile',
+            index=models.Index(fields=['created_at', 'id'], name='versionfile_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-17 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0013_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='versionfile',
+            index=models.Index(fields=['version', 'file_type', 'tuning'], name='versionfile_ver_type_tune_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='versionfile',
+            index=models.Index(fields=['version', 'file_type', 'instrument'], name='versionfile_ver_type_inst_idx'),
+        ),
+    ]
@@ -99,6 +99,12 @@ class Version(models.Model):
     audio_file = models.FileField(upload_to=version_audio_upload_path, blank=True, null=True)
     mus_file = models.FileField(upload_to=version_mus_file_upload_path, blank=True, null=True, help_text='Archivo de MuseScore (.mscz, .mscx)')
     notes = models.TextField(blank=True)
+    part_matrix = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Ruta de archivo por afinación y tipo de parte (mantenido por signals)'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -164,6 +170,10 @@ class SheetMusic(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['version', 'instrument', 'type']
+        indexes = [
+            # Keyset pagination (?pagination=cursor) on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='sheetmusic_created_id_idx'),
+        ]
 
 
 class VersionFile(models.Model):
@@ -303,6 +313,14 @@ class VersionFile(models.Model):
                 name='unique_version_ensamble_instrument'
             ),
         ]
+        indexes = [
+            # Keyset pagination (?pagination=cursor) on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='versionfile_created_id_idx'),
+            # get_file_for_instrument and the ?version=&file_type=&tuning= /
+            # ?version=&file_type=&instrument= list filters
+            models.Index(fields=['version', 'file_type', 'tuning'], name='versionfile_ver_type_tune_idx'),
+            models.Index(fields=['version', 'file_type', 'instrument'], name='versionfile_ver_type_inst_idx'),
+        ]
 
     def clean(self):
         """Validate model constraints"""
@@ -1,9 +1,52 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Theme, Instrument, Version, SheetMusic, VersionFile
 
 
+class AnnotatedCountField(serializers.ReadOnlyField):
+    """
+    Count read from the queryset annotation named like the field (see the
+    music viewsets and utils.related_count), falling back to
+    `<relation>.count()` for instances that were not annotated.
+    """
+
+    def __init__(self, relation, **kwargs):
+        self.relation = relation
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        count = getattr(instance, self.field_name, None)
+        if count is None:
+            count = getattr(instance, self.relation).count()
+        return count
+
+
+class EffectiveMediaMixin:
+    """
+    image_url/audio_url following the media inheritance chain. Uses the
+    `effective_image`/`effective_audio` annotations (utils.with_effective_media)
+    when the queryset has them, and the model's get_image/get_audio otherwise.
+    """
+
+    def _media_url(self, obj, annotation, fallback):
+        if hasattr(obj, annotation):
+            name = getattr(obj, annotation)
+            return default_storage.url(name) if name else None
+        media = getattr(obj, fallback)
+        return media.url if media and hasattr(media, 'url') else None
+
+    def get_image_url(self, obj):
+        """Return image URL using inheritance chain"""
+        return self._media_url(obj, 'effective_image', 'get_image')
+
+    def get_audio_url(self, obj):
+        """Return audio URL using inheritance chain"""
+        return self._media_url(obj, 'effective_audio', 'get_audio')
+
+
 class ThemeSerializer(serializers.ModelSerializer):
-    versions_count = serializers.ReadOnlyField(source='versions.count')
+    versions_count = AnnotatedCountField('versions')
     tonalidad_display = serializers.ReadOnlyField(source='get_tonalidad_display')
 
     class Meta:
@@ -15,7 +58,7 @@ class ThemeSerializer(serializers.ModelSerializer):
 
 
 class InstrumentSerializer(serializers.ModelSerializer):
-    sheet_music_count = serializers.ReadOnlyField(source='sheet_music.count')
+    sheet_music_count = AnnotatedCountField('sheet_music')
     afinacion_display = serializers.ReadOnlyField(source='get_afinacion_display')
     family_display = serializers.ReadOnlyField(source='get_family_display')
 
@@ -42,10 +85,10 @@ class SheetMusicSerializer(serializers.ModelSerializer):
         ]
 
 
-class VersionSerializer(serializers.ModelSerializer):
+class VersionSerializer(EffectiveMediaMixin, serializers.ModelSerializer):
     theme_title = serializers.ReadOnlyField(source='theme.title')
-    sheet_music_count = serializers.ReadOnlyField(source='sheet_music.count')
-    version_files_count = serializers.ReadOnlyField(source='version_files.count')
+    sheet_music_count = AnnotatedCountField('sheet_music')
+    version_files_count = AnnotatedCountField('version_files')
     type_display = serializers.ReadOnlyField(source='get_type_display')
     image_url = serializers.SerializerMethodField()
     audio_url = serializers.SerializerMethodField()
@@ -63,16 +106,6 @@ class VersionSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
-    def get_image_url(self, obj):
-        """Return image URL using inheritance chain (Version → Theme)"""
-        image = obj.get_image
-        return image.url if image and hasattr(image, 'url') else None
-
-    def get_audio_url(self, obj):
-        """Return audio URL using inheritance chain (Version → Theme)"""
-        audio = obj.get_audio
-        return audio.url if audio and hasattr(audio, 'url') else None
-
     def get_has_own_image(self, obj):
         """Return True if version has its own image"""
         return obj.has_own_image
@@ -82,7 +115,7 @@ class VersionSerializer(serializers.ModelSerializer):
         return obj.has_own_audio
 
 
-class VersionFileSerializer(serializers.ModelSerializer):
+class VersionFileSerializer(EffectiveMediaMixin, serializers.ModelSerializer):
     """Serializer for VersionFile model with display fields"""
     version_title = serializers.ReadOnlyField(source='version.title')
     theme_title = serializers.ReadOnlyField(source='version.theme.title')
@@ -111,16 +144,6 @@ class VersionFileSerializer(serializers.ModelSerializer):
             'image_url', 'description', 'created_at', 'updated_at'
         ]
 
-    def get_image_url(self, obj):
-        """Return image URL using inheritance chain"""
-        image = obj.get_image
-        return image.url if image and hasattr(image, 'url') else None
-
-    def get_audio_url(self, obj):
-        """Return audio URL using inheritance chain"""
-        audio = obj.get_audio
-        return audio.url if audio and hasattr(audio, 'url') else None
-
     def get_has_own_audio(self, obj):
         """Return True if VersionFile has its own audio"""
         return obj.has_own_audio
@@ -167,11 +190,11 @@ class VersionFileSerializer(serializers.ModelSerializer):
         return data
 
 
-class VersionDetailSerializer(serializers.ModelSerializer):
+class VersionDetailSerializer(EffectiveMediaMixin, serializers.ModelSerializer):
     theme = ThemeSerializer(read_only=True)
     sheet_music = SheetMusicSerializer(many=True, read_only=True)
     version_files = VersionFileSerializer(many=True, read_only=True)
-    version_files_count = serializers.SerializerMethodField()
+    version_files_count = AnnotatedCountField('version_files')
     type_display = serializers.ReadOnlyField(source='get_type_display')
     image_url = serializers.SerializerMethodField()
     audio_url = serializers.SerializerMethodField()
@@ -189,19 +212,6 @@ class VersionDetailSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
-    def get_version_files_count(self, obj):
-        return obj.version_files.count()
-
-    def get_image_url(self, obj):
-        """Return image URL using inheritance chain (Version → Theme)"""
-        image = obj.get_image
-        return image.url if image and hasattr(image, 'url') else None
-
-    def get_audio_url(self, obj):
-        """Return audio URL using inheritance chain (Version → Theme)"""
-        audio = obj.get_audio
-        return audio.url if audio and hasattr(audio, 'url') else None
-
     def get_has_own_image(self, obj):
         """Return True if version has its own image"""
         return obj.has_own_image
@@ -225,7 +235,7 @@ class SheetMusicDetailSerializer(serializers.ModelSerializer):
         ]
 
 
-class VersionFileDetailSerializer(serializers.ModelSerializer):
+class VersionFileDetailSerializer(EffectiveMediaMixin, serializers.ModelSerializer):
     """Detailed serializer with nested data"""
     version = VersionSerializer(read_only=True)
     instrument = InstrumentSerializer(read_only=True)
@@ -247,16 +257,6 @@ class VersionFileDetailSerializer(serializers.ModelSerializer):
             'image_url', 'description', 'created_at', 'updated_at'
         ]
 
-    def get_image_url(self, obj):
-        """Return image URL using inheritance chain"""
-        image = obj.get_image
-        return image.url if image and hasattr(image, 'url') else None
-
-    def get_audio_url(self, obj):
-        """Return audio URL using inheritance chain"""
-        audio = obj.get_audio
-        return audio.url if audio and hasattr(audio, 'url') else None
-
     def get_has_own_audio(self, obj):
         """Return True if VersionFile has its own audio"""
         return obj.has_own_audio
\ No newline at end of file
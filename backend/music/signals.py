@@ -1,57 +1,21 @@
 """
-Django signals for music app to send webhooks to n8n
+Django signals for music app
+
+- Send webhooks to n8n. Notifications are written to the webhook outbox and
+  delivered by `python manage.py dispatch_webhooks`, so saving never waits on n8n.
+- Keep Version.part_matrix in sync with its SheetMusic/VersionFile rows.
 """
-import os
-import httpx
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Theme, Instrument, Version
-import logging
-
-logger = logging.getLogger(__name__)
-
-# n8n webhook URL from environment
-# Use localhost since sheet-api runs on host, n8n accessible via host network
-N8N_WEBHOOK_URL = os.getenv('N8N_WEBHOOK_URL', 'http://localhost:5678/webhook/sheet-api-created')
-WEBHOOK_ENABLED = os.getenv('WEBHOOK_ENABLED', 'true').lower() == 'true'
-
-
-async def send_webhook(entity_type: str, entity_id: int, data: dict):
-    """
-    Send webhook to n8n when entity is created.
-
-    Args:
-        entity_type: Type of entity (Theme, Instrument, Version, etc.)
-        entity_id: ID of created entity
-        data: Entity data to send
-    """
-    if not WEBHOOK_ENABLED:
-        logger.info(f"Webhooks disabled. Skipping {entity_type} #{entity_id}")
-        return
-
-    payload = {
-        'entity_type': entity_type,
-        'entity_id': entity_id,
-        'action': 'created',
-        'data': data
-    }
-
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.post(N8N_WEBHOOK_URL, json=payload)
-            response.raise_for_status()
-            logger.info(f"Webhook sent for {entity_type} #{entity_id}: {response.status_code}")
-    except httpx.HTTPError as e:
-        logger.error(f"Failed to send webhook for {entity_type} #{entity_id}: {str(e)}")
-    except Exception as e:
-        logger.error(f"Unexpected error sending webhook: {str(e)}")
+from webhooks.utils import enqueue_webhook
+from .models import Theme, Instrument, Version, SheetMusic, VersionFile
+from .utils import refresh_part_matrix
 
 
 @receiver(post_save, sender=Theme)
 def theme_created(sender, instance, created, **kwargs):
     """Send webhook when Theme is created."""
     if created:
-        import asyncio
         data = {
             'id': instance.id,
             'title': instance.title,
@@ -60,22 +24,13 @@ def theme_created(sender, instance, created, **kwargs):
             'description': instance.description,
             'created_at': instance.created_at.isoformat() if instance.created_at else None
         }
-
-        # Run async webhook in sync context
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(send_webhook('Theme', instance.id, data))
+        enqueue_webhook('Theme', instance.id, data)
 
 
 @receiver(post_save, sender=Instrument)
 def instrument_created(sender, instance, created, **kwargs):
     """Send webhook when Instrument is created."""
     if created:
-        import asyncio
         data = {
             'id': instance.id,
             'name': instance.name,
@@ -83,35 +38,64 @@ def instrument_created(sender, instance, created, **kwargs):
             'afinacion': instance.afinacion,
             'created_at': instance.created_at.isoformat() if instance.created_at else None
         }
-
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(send_webhook('Instrument', instance.id, data))
+        enqueue_webhook('Instrument', instance.id, data)
 
 
 @receiver(post_save, sender=Version)
 def version_created(sender, instance, created, **kwargs):
     """Send webhook when Version is created."""
     if created:
-        import asyncio
         data = {
             'id': instance.id,
-            'theme_id': instance.theme.id,
+            'theme_id': instance.theme_id,
             'theme_title': instance.theme.title,
             'title': instance.title,
             'type': instance.type,
             'notes': instance.notes,
             'created_at': instance.created_at.isoformat() if instance.created_at else None
         }
+        enqueue_webhook('Version', instance.id, data)
 
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
 
-        loop.run_until_complete(send_webhook('Version', instance.id, data))
+@receiver(pre_save, sender=SheetMusic)
+@receiver(pre_save, sender=VersionFile)
+def version_parts_moving(sender, instance, **kwargs):
+    """Remember the version a file belonged to, in case it is moved to another one."""
+    if instance._state.adding:
+        instance._previous_version_id = None
+    else:
+        instance._previous_version_id = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('version_id', flat=True).first()
+
+
+@receiver(post_save, sender=SheetMusic)
+@receiver(post_delete, sender=SheetMusic)
+@receiver(post_save, sender=VersionFile)
+@receiver(post_delete, sender=VersionFile)
+def version_parts_changed(sender, instance, **kwargs):
+    """Rebuild the part matrix of the version owning the file (and of the one it left)."""
+    refresh_part_matrix(instance.version_id)
+
+    previous_version_id = getattr(instance, '_previous_version_id', None)
+    if previous_version_id is not None and previous_version_id != instance.version_id:
+        refresh_part_matrix(previous_version_id)
+
+
+@receiver(post_save, sender=Version)
+def version_updated(sender, instance, created, **kwargs):
+    """Rebuild the part matrix when a version changes (its type selects the files used)."""
+    if not created:
+        refresh_part_matrix(instance.id)
+
+
+@receiver(post_save, sender=Instrument)
+def instrument_updated(sender, instance, created, **kwargs):
+    """Rebuild the part matrix of every version with parts for this instrument (tuning may have changed)."""
+    if created:
+        return
+
+    version_ids = set(instance.sheet_music.values_list('version_id', flat=True))
+    version_ids.update(instance.version_files.values_list('version_id', flat=True))
+    for version_id in version_ids:
+        refresh_part_matrix(version_id)
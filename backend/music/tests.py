@@ -1,3 +1,354 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from sheetmusic_api.testing import QueryPlanMixin
+
+from .models import Theme, Instrument, Version, SheetMusic, VersionFile
+
+
+class AnnotatedCountsTest(TestCase):
+    """List endpoints read counts from annotations and can order/filter by them"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('musico', password='secret'))
+        self.instrument = Instrument.objects.create(name='Trompeta', afinacion='Bb')
+
+    def create_theme(self, title, versions=1, sheets=1):
+        theme = Theme.objects.create(title=title, tonalidad='C')
+        for i in range(versions):
+            version = Version.objects.create(theme=theme, title=f'{title} {i}')
+            for sheet_type, _ in SheetMusic.TYPE_CHOICES[:sheets]:
+                SheetMusic.objects.create(
+                    version=version, instrument=self.instrument, type=sheet_type, file='sheet_music/test.pdf'
+                )
+        return theme
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        self.create_theme('Uno')
+        small = [self.count_queries(url)[0] for url in ('/api/v1/themes/', '/api/v1/versions/', '/api/v1/instruments/')]
+
+        for i in range(5):
+            self.create_theme(f'Extra {i}', versions=2, sheets=2)
+        large = [self.count_queries(url)[0] for url in ('/api/v1/themes/', '/api/v1/versions/', '/api/v1/instruments/')]
+
+        self.assertEqual(small, large)
+
+    def test_counts_are_not_multiplied_by_joins(self):
+        theme = self.create_theme('Dos', versions=1, sheets=3)
+        version = theme.versions.get()
+        for tuning in ('Bb', 'Eb'):
+            VersionFile.objects.create(
+                version=version, file_type='DUETO_TRANSPOSITION', tuning=tuning, file='version_files/test.pdf'
+            )
+
+        _, response = self.count_queries(f'/api/v1/versions/{version.pk}/')
+        self.assertEqual(response.data['version_files_count'], 2)
+
+        _, response = self.count_queries('/api/v1/versions/')
+        row = response.data['results'][0]
+        self.assertEqual((row['sheet_music_count'], row['version_files_count']), (3, 2))
+
+    def test_order_and_filter_by_counts(self):
+        self.create_theme('Pocas', versions=1)
+        self.create_theme('Muchas', versions=3)
+        self.create_theme('Ninguna', versions=0)
+
+        _, response = self.count_queries('/api/v1/themes/', {'ordering': '-versions_count'})
+        rows = response.data['results']
+        self.assertEqual([(row['title'], row['versions_count']) for row in rows], [
+            ('Muchas', 3), ('Pocas', 1), ('Ninguna', 0)
+        ])
+
+        _, response = self.count_queries('/api/v1/themes/', {'versions_count_min': 1})
+        rows = response.data['results']
+        self.assertEqual(sorted(row['title'] for row in rows), ['Muchas', 'Pocas'])
+
+
+class EffectiveMediaTest(TestCase):
+    """Inherited image/audio URLs are resolved from annotations, without loading version or theme"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('musico', password='secret'))
+        self.theme = Theme.objects.create(
+            title='Tema', tonalidad='C', image='themes/cover.jpg', audio='themes/track.mp3'
+        )
+        self.version = Version.objects.create(theme=self.theme, title='Dueto', image='versions/own.jpg')
+        self.own_audio = VersionFile.objects.create(
+            version=self.version, file_type='DUETO_TRANSPOSITION', tuning='Bb',
+            file='version_files/bb.pdf', audio='version_files/bb.mp3'
+        )
+
+    def add_file(self, tuning):
+        return VersionFile.objects.create(
+            version=self.version, file_type='DUETO_TRANSPOSITION', tuning=tuning, file='version_files/x.pdf'
+        )
+
+    def test_inheritance_chain(self):
+        from django.core.files.storage import default_storage
+
+        inherited = self.add_file('Eb')
+        response = self.client.get(f'/api/v1/versions/{self.version.pk}/')
+        self.assertEqual(response.data['image_url'], default_storage.url('versions/own.jpg'))
+        self.assertEqual(response.data['audio_url'], default_storage.url('themes/track.mp3'))
+
+        files = {row['id']: row for row in response.data['version_files']}
+        self.assertEqual(files[self.own_audio.pk]['audio_url'], default_storage.url('version_files/bb.mp3'))
+        self.assertEqual(files[inherited.pk]['audio_url'], default_storage.url('themes/track.mp3'))
+        self.assertEqual(files[inherited.pk]['image_url'], default_storage.url('versions/own.jpg'))
+
+        # Same values as the model properties used for non-annotated instances
+        response = self.client.get('/api/v1/version-files/')
+        for row in response.data['results']:
+            instance = VersionFile.objects.get(pk=row['id'])
+            self.assertEqual((row['image_url'], row['audio_url']), (instance.get_image.url, instance.get_audio.url))
+
+    def test_nested_files_cost_no_extra_queries(self):
+        def count():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(f'/api/v1/versions/{self.version.pk}/')
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        small = count()
+        for tuning in ('Eb', 'F', 'C'):
+            self.add_file(tuning)
+        self.assertEqual(small, count())
+
+
+class SparseFieldsetTest(TestCase):
+    """?fields=, ?omit= and ?expand= trim both the response and the queries behind it"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('musico', password='secret'))
+        instrument = Instrument.objects.create(name='Trompeta', afinacion='Bb')
+        self.version = Version.objects.create(
+            theme=Theme.objects.create(title='Tema', tonalidad='C'), title='Versión'
+        )
+        SheetMusic.objects.create(version=self.version, instrument=instrument, file='sheet_music/test.pdf')
+        self.url = f'/api/v1/versions/{self.version.pk}/'
+
+    def get(self, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_fields_and_omit(self):
+        full, full_queries = self.get()
+        self.assertIn('sheet_music', full.data)
+
+        response, queries = self.get({'fields': 'id,title'})
+        self.assertEqual(set(response.data), {'id', 'title'})
+        self.assertLess(queries, full_queries)
+
+        response, _ = self.get({'omit': 'notes,sheet_music'})
+        self.assertEqual(set(response.data), set(full.data) - {'notes', 'sheet_music'})
+
+    def test_expand_selects_nested_fields(self):
+        full, full_queries = self.get()
+
+        response, queries = self.get({'expand': 'theme'})
+        self.assertIn('theme', response.data)
+        self.assertNotIn('sheet_music', response.data)
+        self.assertNotIn('version_files', response.data)
+        self.assertEqual(response.data['version_files_count'], 0)
+        self.assertEqual(queries, full_queries - 3)  # sheet music, their instruments, version files
+
+        response, _ = self.get({'expand': ''})
+        self.assertNotIn('theme', response.data)
+
+    def test_writes_are_not_pruned(self):
+        response = self.client.patch(f'{self.url}?fields=id', {'notes': 'Nueva'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('notes', response.data)
+
+
+class FlexiblePaginationTest(TestCase):
+    """Deep catalog lists can skip COUNT(*) or use keyset pagination, on request"""
+
+    url = '/api/v1/version-files/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('musico', password='secret'))
+        self.files = []
+        for i in range(5):
+            version = Version.objects.create(theme=Theme.objects.create(title=f'Tema {i}', tonalidad='C'))
+            self.files.append(VersionFile.objects.create(
+                version=version, file_type='STANDARD_SCORE', file='version_files/x.pdf'
+            ))
+        # Ties on created_at are broken by id
+        VersionFile.objects.update(created_at=self.files[0].created_at)
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        counts = [q for q in context.captured_queries if 'COUNT(' in q['sql']]
+        return response, len(counts)
+
+    def test_default_keeps_page_numbers_and_count(self):
+        response, counts = self.get(self.url)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(counts, 1)
+
+    def test_count_false(self):
+        from unittest import mock
+        from sheetmusic_api.pagination import FlexiblePagination
+
+        with mock.patch.object(FlexiblePagination, 'page_size', 2):
+            response, counts = self.get(self.url, {'count': 'false', 'page': 2})
+            self.assertIsNone(response.data['count'])
+            self.assertEqual(counts, 0)
+            self.assertEqual(len(response.data['results']), 2)
+            self.assertIn('page=3', response.data['next'])
+            self.assertNotIn('page=', response.data['previous'])
+
+            response, _ = self.get(self.url, {'count': 'false', 'page': 3})
+            self.assertIsNone(response.data['next'])
+
+    def test_cursor_walks_every_row_once(self):
+        from unittest import mock
+        from sheetmusic_api.pagination import FlexiblePagination
+
+        seen = []
+        with mock.patch.object(FlexiblePagination, 'page_size', 2):
+            response, counts = self.get(self.url, {'pagination': 'cursor'})
+            while True:
+                self.assertEqual(counts, 0)
+                seen.extend(row['id'] for row in response.data['results'])
+                if not response.data['next']:
+                    break
+                response, counts = self.get(response.data['next'])
+
+        self.assertEqual(seen, sorted((f.pk for f in self.files), reverse=True))
+
+
+class VersionFileQueryPlanTest(QueryPlanMixin, TestCase):
+    """The file lookups by version are served by the composite indexes"""
+
+    def setUp(self):
+        self.version = Version.objects.create(
+            theme=Theme.objects.create(title='Tema', tonalidad='C'), type='DUETO'
+        )
+        self.instrument = Instrument.objects.create(name='Trompeta', afinacion='Bb')
+
+    def test_dueto_lookup(self):
+        # get_file_for_instrument / download_for_instrument for DUETO versions
+        self.assertUsesIndex(
+            VersionFile.objects.filter(version=self.version, file_type='DUETO_TRANSPOSITION', tuning='Bb'),
+            'versionfile_ver_type_tune_idx', 'unique_version_dueto_tuning'
+        )
+
+    def test_ensamble_lookup(self):
+        self.assertUsesIndex(
+            VersionFile.objects.filter(version=self.version, file_type='ENSAMBLE_INSTRUMENT', instrument=self.instrument),
+            'versionfile_ver_type_inst_idx', 'unique_version_ensamble_instrument'
+        )
+
+    def test_list_filters(self):
+        self.assertUsesIndex(
+            VersionFile.objects.filter(version=self.version, file_type='STANDARD_SCORE'),
+            'versionfile_ver_type_tune_idx', 'versionfile_ver_type_inst_idx'
+        )
+        self.assertUsesIndex(VersionFile.objects.order_by('-created_at', '-id'), 'versionfile_created_id_idx')
+
+
+class PartMatrixTest(TestCase):
+    """Version.part_matrix follows the files, types and tunings it is built from"""
+
+    def setUp(self):
+        self.theme = Theme.objects.create(title='Tema', tonalidad='C')
+        self.trumpet = Instrument.objects.create(name='Trompeta', afinacion='Bb')
+        self.sax = Instrument.objects.create(name='Saxo alto', afinacion='Eb')
+        self.horn = Instrument.objects.create(name='Corno', afinacion='F')
+
+    def matrix(self, version):
+        version.refresh_from_db()
+        return version.part_matrix
+
+    def test_matrix_per_version_type(self):
+        standard = Version.objects.create(theme=self.theme, type='STANDARD')
+        SheetMusic.objects.create(version=standard, instrument=self.trumpet, type='MELODIA_PRINCIPAL', file='sheet_music/a.pdf')
+        SheetMusic.objects.create(version=standard, instrument=self.sax, type='MELODIA_SECUNDARIA', file='sheet_music/b.pdf')
+        self.assertEqual(self.matrix(standard), {
+            'Bb': {'MELODIA_PRINCIPAL': 'sheet_music/a.pdf'},
+            'Eb': {'ARMONIA': 'sheet_music/b.pdf'},
+        })
+
+        every_part = lambda path: {'MELODIA_PRINCIPAL': path, 'ARMONIA': path, 'BAJO': path}
+
+        dueto = Version.objects.create(theme=self.theme, type='DUETO')
+        VersionFile.objects.create(
+            version=dueto, file_type='DUETO_TRANSPOSITION', tuning='Bb', file='version_files/bb.pdf'
+        )
+        self.assertEqual(self.matrix(dueto), {'Bb': every_part('version_files/bb.pdf')})
+
+        ensamble = Version.objects.create(theme=self.theme, type='ENSAMBLE')
+        VersionFile.objects.create(
+            version=ensamble, file_type='ENSAMBLE_INSTRUMENT', instrument=self.horn, file='version_files/f.pdf'
+        )
+        self.assertEqual(self.matrix(ensamble), {'F': every_part('version_files/f.pdf')})
+
+    def test_save_move_and_delete(self):
+        version = Version.objects.create(theme=self.theme, type='STANDARD')
+        other = Version.objects.create(theme=self.theme, type='STANDARD')
+        sheet = SheetMusic.objects.create(
+            version=version, instrument=self.trumpet, type='MELODIA_PRINCIPAL', file='sheet_music/a.pdf'
+        )
+
+        sheet.file = 'sheet_music/a2.pdf'
+        sheet.save()
+        self.assertEqual(self.matrix(version), {'Bb': {'MELODIA_PRINCIPAL': 'sheet_music/a2.pdf'}})
+
+        sheet.version = other
+        sheet.save()
+        self.assertEqual(self.matrix(version), {})
+        self.assertEqual(self.matrix(other), {'Bb': {'MELODIA_PRINCIPAL': 'sheet_music/a2.pdf'}})
+
+        sheet.delete()
+        self.assertEqual(self.matrix(other), {})
+
+    def test_version_file_move(self):
+        version = Version.objects.create(theme=self.theme, type='DUETO')
+        other = Version.objects.create(theme=self.theme, type='DUETO')
+        version_file = VersionFile.objects.create(
+            version=version, file_type='DUETO_TRANSPOSITION', tuning='Eb', file='version_files/eb.pdf'
+        )
+
+        version_file.version = other
+        version_file.save()
+        self.assertEqual(self.matrix(version), {})
+        self.assertEqual(set(self.matrix(other)), {'Eb'})
+
+    def test_type_change(self):
+        version = Version.objects.create(theme=self.theme, type='STANDARD')
+        SheetMusic.objects.create(version=version, instrument=self.trumpet, type='BAJO', file='sheet_music/a.pdf')
+        VersionFile.objects.create(
+            version=version, file_type='DUETO_TRANSPOSITION', tuning='C', file='version_files/c.pdf'
+        )
+        self.assertEqual(set(self.matrix(version)), {'Bb'})
+
+        version.type = 'DUETO'
+        version.save()
+        self.assertEqual(set(self.matrix(version)), {'C'})
+
+    def test_instrument_tuning_change(self):
+        version = Version.objects.create(theme=self.theme, type='STANDARD')
+        SheetMusic.objects.create(version=version, instrument=self.trumpet, type='BAJO', file='sheet_music/a.pdf')
+
+        self.trumpet.afinacion = 'C'
+        self.trumpet.save()
+        self.assertEqual(self.matrix(version), {'C': {'BAJO': 'sheet_music/a.pdf'}})
@@ -5,6 +5,9 @@ import os
 import uuid
 from datetime import datetime
 
+from django.db.models import CharField, Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+
 
 def get_theme_based_filename(instance, filename, file_type):
     """
@@ -272,6 +275,151 @@ def get_file_for_instrument(version, instrument):
     return None
 
 
+
+# Part matrix: tuning x part type -> file path, denormalized on Version.part_matrix
+PART_MATRIX_TUNINGS = ['Bb', 'Eb', 'C', 'F', 'C_BASS']
+PART_MATRIX_PART_TYPES = ['MELODIA_PRINCIPAL', 'ARMONIA', 'BAJO']
+
+# Instrument tuning -> matrix tuning key
+PART_MATRIX_TUNING_MAP = {
+    'Bb': 'Bb',
+    'Eb': 'Eb',
+    'C': 'C',
+    'F': 'F',
+}
+
+# Sheet music type -> matrix part type
+PART_MATRIX_TYPE_MAP = {
+    'MELODIA_PRINCIPAL': 'MELODIA_PRINCIPAL',
+    'MELODIA_SECUNDARIA': 'ARMONIA',  # Map secondary melody to harmony
+    'ARMONIA': 'ARMONIA',
+    'BAJO': 'BAJO',
+}
+
+
+def compute_part_matrix(version_type, sheet_music=(), version_files=()):
+    """
+    Build the part matrix of a version from its files.
+
+    Args:
+        version_type: Version.type
+        sheet_music: SheetMusic rows of the version (with instrument), used for STANDARD
+        version_files: VersionFile rows of the version (with instrument)
+
+    Returns:
+        dict: Sparse mapping {tuning: {part_type: file_path}}; missing parts
+        are simply absent. Rows are applied in the given order, later rows
+        overwrite earlier ones.
+    """
+    matrix = {}
+
+    def assign(tuning_key, part_types, file):
+        if tuning_key and file:
+            parts = matrix.setdefault(tuning_key, {})
+            for part_type in part_types:
+                parts[part_type] = file.name
+
+    if version_type == 'STANDARD':
+        # For STANDARD: use SheetMusic model (individual instrument parts)
+        for sm in sheet_music:
+            part_type_key = PART_MATRIX_TYPE_MAP.get(sm.type)
+            if part_type_key:
+                assign(PART_MATRIX_TUNING_MAP.get(sm.instrument.afinacion), [part_type_key], sm.file)
+
+    elif version_type == 'DUETO':
+        # For DUETO: same transposed file for all part types of a tuning
+        for vf in version_files:
+            if vf.file_type == 'DUETO_TRANSPOSITION' and vf.tuning in PART_MATRIX_TUNINGS:
+                assign(vf.tuning, PART_MATRIX_PART_TYPES, vf.file)
+
+    elif version_type in ['ENSAMBLE', 'GRUPO_REDUCIDO']:
+        # For ENSAMBLE/GRUPO_REDUCIDO: file per instrument, mapped by its tuning
+        file_type = 'ENSAMBLE_INSTRUMENT' if version_type == 'ENSAMBLE' else 'STANDARD_SCORE'
+        for vf in version_files:
+            if vf.file_type == file_type and vf.instrument:
+                assign(PART_MATRIX_TUNING_MAP.get(vf.instrument.afinacion), PART_MATRIX_PART_TYPES, vf.file)
+
+    return matrix
+
+
+def refresh_part_matrix(version_id):
+    """
+    Recompute and store Version.part_matrix for one version.
+
+    Uses a queryset update so it neither fires signals nor touches updated_at.
+    """
+    from .models import Version, SheetMusic, VersionFile
+
+    version_type = Version.objects.filter(pk=version_id).values_list('type', flat=True).first()
+    if version_type is None:
+        return
+
+    sheet_music = []
+    version_files = []
+    if version_type == 'STANDARD':
+        sheet_music = SheetMusic.objects.filter(version_id=version_id).select_related('instrument')
+    else:
+        version_files = VersionFile.objects.filter(version_id=version_id).select_related('instrument')
+
+    Version.objects.filter(pk=version_id).update(
+        part_matrix=compute_part_matrix(version_type, sheet_music, version_files)
+    )
+
+
+def related_count(model, field):
+    """
+    Correlated subquery that counts the `model` rows whose `field` points at
+    the outer row (0 when there are none).
+
+    Unlike Count() over a join, several of these on the same queryset don't
+    multiply each other's rows, and they can be used in order_by()/filter().
+
+    Example:
+        Theme.objects.annotate(versions_count=related_count(Version, 'theme'))
+    """
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def with_version_counts(queryset):
+    """Annotate `sheet_music_count` and `version_files_count` on a Version queryset"""
+    from .models import SheetMusic, VersionFile
+
+    return queryset.annotate(
+        sheet_music_count=related_count(SheetMusic, 'version'),
+        version_files_count=related_count(VersionFile, 'version'),
+    )
+
+
+# Media inheritance chains: the first non-empty file wins (own → Version → Theme)
+EFFECTIVE_MEDIA_CHAINS = {
+    'Version': {
+        'effective_image': ('image', 'theme__image'),
+        'effective_audio': ('audio_file', 'theme__audio'),
+    },
+    'VersionFile': {
+        'effective_image': ('version__image', 'version__theme__image'),
+        'effective_audio': ('audio', 'version__audio_file', 'version__theme__audio'),
+    },
+}
+
+
+def with_effective_media(queryset):
+    """
+    Annotate `effective_image` and `effective_audio` on a Version or
+    VersionFile queryset: the storage name of the media after applying the
+    same inheritance as get_image/get_audio, resolved in SQL so serializers
+    don't load the version or theme to find it.
+    """
+    chains = EFFECTIVE_MEDIA_CHAINS[queryset.model.__name__]
+    return queryset.annotate(**{
+        name: Coalesce(*(NullIf(field, Value('')) for field in fields), output_field=CharField())
+        for name, fields in chains.items()
+    })
+
+
 if __name__ == "__main__":
     # Test the function
     test_cases = [
@@ -291,4 +439,4 @@ if __name__ == "__main__":
     for theme, instrument, expected in test_cases:
         result = calculate_relative_tonality(theme, instrument)
         status = "✓" if result == expected else "✗"
-        print(f"{theme:2} -> {instrument:2} -> {expected:3} -> {result:3} {status}")
\ No newline at end of file
+        print(f"{theme:2} -> {instrument:2} -> {expected:3} -> {result:3} {status}")
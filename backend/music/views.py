@@ -3,6 +3,10 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch
+
+from sheetmusic_api.fieldsets import SparseFieldsetMixin
+from sheetmusic_api.pagination import FlexiblePagination
 
 from .models import Theme, Instrument, Version, SheetMusic, VersionFile
 from .serializers import (
@@ -11,33 +15,38 @@ from .serializers import (
     SheetMusicSerializer, SheetMusicDetailSerializer,
     VersionFileSerializer, VersionFileDetailSerializer
 )
-from .utils import calculate_relative_tonality, get_clef_for_instrument
+from .filters import ThemeFilter, InstrumentFilter, VersionFilter
+from .utils import (
+    calculate_relative_tonality, get_clef_for_instrument,
+    related_count, with_version_counts, with_effective_media
+)
 
 
-class ThemeViewSet(viewsets.ModelViewSet):
-    queryset = Theme.objects.all()
+class ThemeViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    # Counts are annotated so serializers, ordering and filters don't count per row
+    queryset = Theme.objects.annotate(versions_count=related_count(Version, 'theme'))
     serializer_class = ThemeSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'artist', 'description']
-    filterset_fields = ['tonalidad', 'artist']
-    ordering_fields = ['title', 'artist', 'created_at', 'tonalidad']
+    filterset_class = ThemeFilter
+    ordering_fields = ['title', 'artist', 'created_at', 'tonalidad', 'versions_count']
     ordering = ['title']
 
     @action(detail=True, methods=['get'])
     def versions(self, request, pk=None):
         theme = self.get_object()
-        versions = theme.versions.all()
+        versions = with_effective_media(with_version_counts(theme.versions.select_related('theme')))
         serializer = VersionSerializer(versions, many=True)
         return Response(serializer.data)
 
 
-class InstrumentViewSet(viewsets.ModelViewSet):
-    queryset = Instrument.objects.all()
+class InstrumentViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Instrument.objects.annotate(sheet_music_count=related_count(SheetMusic, 'instrument'))
     serializer_class = InstrumentSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'family']
-    filterset_fields = ['family', 'afinacion']
-    ordering_fields = ['name', 'family', 'afinacion', 'created_at']
+    filterset_class = InstrumentFilter
+    ordering_fields = ['name', 'family', 'afinacion', 'created_at', 'sheet_music_count']
     ordering = ['name']
 
     @action(detail=True, methods=['get'])
@@ -48,13 +57,24 @@ class InstrumentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class VersionViewSet(viewsets.ModelViewSet):
-    queryset = Version.objects.select_related('theme').prefetch_related('sheet_music__instrument').all()
+class VersionViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = with_effective_media(with_version_counts(Version.objects.select_related('theme')))
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'theme__title', 'notes']
-    filterset_fields = ['theme', 'type']
-    ordering_fields = ['created_at', 'updated_at', 'theme__title', 'type']
+    filterset_class = VersionFilter
+    ordering_fields = [
+        'created_at', 'updated_at', 'theme__title', 'type',
+        'sheet_music_count', 'version_files_count'
+    ]
     ordering = ['-created_at']
+    # Only the detail serializer renders the files themselves, and only when requested
+    field_querysets = {
+        'sheet_music': lambda queryset: queryset.prefetch_related('sheet_music__instrument'),
+        'version_files': lambda queryset: queryset.prefetch_related(Prefetch(
+            'version_files',
+            queryset=with_effective_media(VersionFile.objects.select_related('instrument'))
+        )),
+    }
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -69,13 +89,14 @@ class VersionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class SheetMusicViewSet(viewsets.ModelViewSet):
+class SheetMusicViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = SheetMusic.objects.select_related('version', 'instrument', 'version__theme').all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['version__title', 'version__theme__title', 'instrument__name']
     filterset_fields = ['version', 'instrument', 'version__theme', 'type', 'clef', 'tonalidad_relativa']
     ordering_fields = ['created_at', 'updated_at', 'type', 'clef']
     ordering = ['-created_at']
+    pagination_class = FlexiblePagination
 
     def perform_create(self, serializer):
         """
@@ -120,7 +141,7 @@ class SheetMusicViewSet(viewsets.ModelViewSet):
         return SheetMusicSerializer
 
 
-class VersionFileViewSet(viewsets.ModelViewSet):
+class VersionFileViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for VersionFile model.
 
@@ -129,12 +150,15 @@ class VersionFileViewSet(viewsets.ModelViewSet):
     - ENSAMBLE: files organized by instrument
     - STANDARD: general version files
     """
-    queryset = VersionFile.objects.select_related('version', 'instrument', 'version__theme').all()
+    queryset = with_effective_media(
+        VersionFile.objects.select_related('version', 'instrument', 'version__theme')
+    )
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['version__title', 'version__theme__title', 'instrument__name', 'description']
     filterset_fields = ['version', 'file_type', 'tuning', 'instrument', 'version__type']
     ordering_fields = ['created_at', 'updated_at', 'file_type']
     ordering = ['-created_at']
+    pagination_class = FlexiblePagination
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -4,7 +4,7 @@ Django Admin configuration for Music Learning App
 from django.contrib import admin
 from .models import (
     Lesson, Exercise, UserProfile, LessonProgress,
-    ExerciseAttempt, Badge, UserBadge, Achievement, UserAchievement,
+    ExerciseAttempt, UserDailyActivity, LeaderboardEntry, Badge, UserBadge, Achievement, UserAchievement,
     Challenge, ChallengeNote, UserChallengeProgress
 )
 
@@ -134,6 +134,24 @@ class ExerciseAttemptAdmin(admin.ModelAdmin):
     date_hierarchy = 'attempted_at'
 
 
+@admin.register(UserDailyActivity)
+class UserDailyActivityAdmin(admin.ModelAdmin):
+    """Admin for UserDailyActivity rollup (maintained automatically)"""
+    list_display = ('user', 'date', 'exercises', 'correct', 'xp', 'seconds')
+    search_fields = ('user__username',)
+    date_hierarchy = 'date'
+    raw_id_fields = ('user',)
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    """Admin for LeaderboardEntry (rebuild with `rebuild_leaderboards`)"""
+    list_display = ('board', 'user', 'score', 'updated_at')
+    list_filter = ('board',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+
+
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
     """Admin for Badge model"""
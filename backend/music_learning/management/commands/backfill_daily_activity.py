@@ -0,0 +1,97 @@
+"""
+Management command to backfill the UserDailyActivity rollup from ExerciseAttempt
+Usage: python manage.py backfill_daily_activity [--rebuild] [--user USERNAME] [--streaks]
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+from music_learning.models import ExerciseAttempt, UserDailyActivity, UserProfile
+from music_learning.utils import compute_streaks, invalidate_user_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfills the daily activity rollup from exercise attempts. '
+        'XP is rebuilt from attempts only (lesson, challenge and badge XP '
+        'is not stored per attempt)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Delete existing rows and rebuild them (default: only add missing days)'
+        )
+        parser.add_argument('--user', help='Only this username')
+        parser.add_argument(
+            '--streaks',
+            action='store_true',
+            help='Recompute current/longest streak of each profile from the rollup'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        attempts = ExerciseAttempt.objects.all()
+        activity = UserDailyActivity.objects.all()
+        profiles = UserProfile.objects.all()
+        if options['user']:
+            attempts = attempts.filter(user__username=options['user'])
+            activity = activity.filter(user__username=options['user'])
+            profiles = profiles.filter(user__username=options['user'])
+
+        rows = attempts.annotate(
+            day=TruncDate('attempted_at')
+        ).values('user_id', 'day').annotate(
+            exercises=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True)),
+            xp=Sum('xp_earned'),
+            seconds=Sum('time_spent')
+        ).order_by()
+
+        # Users whose rollup or streak changes; their cached /user/stats/ is dropped after commit
+        touched = set()
+        with transaction.atomic():
+            if options['rebuild']:
+                touched.update(activity.values_list('user_id', flat=True).distinct())
+                deleted, _ = activity.delete()
+                self.stdout.write(f'Deleted {deleted} rows')
+
+            batch = []
+            created = 0
+            for row in rows.iterator():
+                touched.add(row['user_id'])
+                batch.append(UserDailyActivity(
+                    user_id=row['user_id'],
+                    date=row['day'],
+                    exercises=row['exercises'],
+                    correct=row['correct'],
+                    xp=row['xp'] or 0,
+                    seconds=row['seconds'] or 0,
+                ))
+                if len(batch) >= options['batch_size']:
+                    created += len(UserDailyActivity.objects.bulk_create(batch, ignore_conflicts=True))
+                    batch = []
+            if batch:
+                created += len(UserDailyActivity.objects.bulk_create(batch, ignore_conflicts=True))
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Processed {created} user/day rows'))
+
+        if options['streaks']:
+            updated = []
+            for profile in profiles.select_related('user').iterator():
+                current, longest, last_date = compute_streaks(profile.user)
+                profile.current_streak = current
+                profile.longest_streak = max(longest, profile.longest_streak)
+                profile.last_practice_date = last_date or profile.last_practice_date
+                updated.append(profile)
+                touched.add(profile.user_id)
+            UserProfile.objects.bulk_update(
+                updated,
+                ['current_streak', 'longest_streak', 'last_practice_date'],
+                batch_size=options['batch_size']
+            )
+            self.stdout.write(self.style.SUCCESS(f'✓ Recomputed streaks for {len(updated)} profiles'))
+
+        transaction.on_commit(lambda: [invalidate_user_stats(user_id) for user_id in touched])
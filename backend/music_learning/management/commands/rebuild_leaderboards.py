@@ -0,0 +1,79 @@
+"""
+Management command to rebuild the precomputed leaderboards
+Usage: python manage.py rebuild_leaderboards [--weeks N]
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from music_learning.models import (
+    ExerciseAttempt, LessonProgress, LeaderboardEntry,
+    UserDailyActivity, UserProfile
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the global, weekly and per-category leaderboards. '
+        'Global scores come from UserProfile.total_xp, weekly ones from the '
+        'daily activity rollup, category ones from exercise XP plus the '
+        'reward of completed lessons'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--weeks',
+            type=int,
+            default=1,
+            help='Number of weekly boards to rebuild, counting the current one (older ones are dropped)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        entries = []
+
+        # Global
+        for user_id, total_xp in UserProfile.objects.filter(total_xp__gt=0).values_list('user_id', 'total_xp'):
+            entries.append(LeaderboardEntry(board=LeaderboardEntry.GLOBAL, user_id=user_id, score=total_xp))
+
+        # Weekly
+        today = timezone.localdate()
+        week_start = today - timedelta(days=today.weekday())
+        for week in range(options['weeks']):
+            start = week_start - timedelta(weeks=week)
+            board = LeaderboardEntry.weekly_board(start)
+            rows = UserDailyActivity.objects.filter(
+                date__gte=start,
+                date__lt=start + timedelta(weeks=1)
+            ).values('user_id').annotate(score=Sum('xp')).order_by()
+            entries.extend(
+                LeaderboardEntry(board=board, user_id=row['user_id'], score=row['score'])
+                for row in rows if row['score']
+            )
+
+        # Category
+        category_scores = defaultdict(int)
+        attempt_rows = ExerciseAttempt.objects.values(
+            'user_id', 'exercise__lesson__category'
+        ).annotate(score=Sum('xp_earned')).order_by()
+        for row in attempt_rows:
+            category_scores[(row['user_id'], row['exercise__lesson__category'])] += row['score'] or 0
+        lesson_rows = LessonProgress.objects.filter(is_completed=True).values(
+            'user_id', 'lesson__category'
+        ).annotate(score=Sum('lesson__xp_reward')).order_by()
+        for row in lesson_rows:
+            category_scores[(row['user_id'], row['lesson__category'])] += row['score'] or 0
+        entries.extend(
+            LeaderboardEntry(board=LeaderboardEntry.category_board(category), user_id=user_id, score=score)
+            for (user_id, category), score in category_scores.items() if score
+        )
+
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            LeaderboardEntry.objects.bulk_create(entries, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt leaderboards with {len(entries)} entries'))
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-17 02:53
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('music_learning', '0002_challenge_alter_exercise_type_userchallengeprogress_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('exercises', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('correct', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('xp', models.IntegerField(default=0, help_text='XP ganado en el día', validators=[django.core.validators.MinValueValidator(0)])),
+                ('seconds', models.IntegerField(default=0, help_text='Segundos de práctica', validators=[django.core.validators.MinValueValidator(0)])),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Actividad Diaria',
+                'verbose_name_plural': 'Actividad Diaria',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'user'], name='music_learn_date_8a1dff_idx')],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-17 02:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('music_learning', '0003_user_daily_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=50)),
+                ('score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Entrada de Ranking',
+                'verbose_name_plural': 'Rankings',
+                'ordering': ['board', '-score', 'user_id'],
+                'indexes': [models.Index(fields=['board', '-score', 'user'], name='music_learn_board_32c022_idx')],
+                'unique_together': {('board', 'user')},
+            },
+        ),
+    ]
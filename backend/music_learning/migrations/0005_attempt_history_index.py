@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-17 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music_learning', '0004_leaderboard_entry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='exerciseattempt',
+            name='music_learn_user_id_6b4a2e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='exerciseattempt',
+            index=models.Index(fields=['user', 'attempted_at', 'id'], name='attempt_user_time_id_idx'),
+        ),
+    ]
@@ -8,6 +8,29 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
 
+def increment_or_create(model, lookup, **deltas):
+    """
+    Add `deltas` to the counters of the row matching `lookup`, creating it if needed
+
+    One UPDATE with F() expressions, plus an INSERT the first time. Safe
+    under concurrency as long as `lookup` is covered by a unique constraint.
+    """
+    from django.db import IntegrityError, transaction
+    from django.db.models import F
+
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    rows = model.objects.filter(**lookup)
+    if rows.update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Created concurrently by another request
+        rows.update(**changes)
+
+
 class Lesson(models.Model):
     """Musical lesson with exercises and prerequisites"""
 
@@ -253,45 +276,65 @@ class UserProfile(models.Model):
         return round((self.correct_answers / self.total_answers) * 100, 2)
 
     def add_xp(self, amount):
-        """Add XP and level up if necessary"""
-        XP_PER_LEVEL = 100
-        self.total_xp += amount
-        self.current_xp += amount
-
-        # Level up logic
-        while self.current_xp >= XP_PER_LEVEL:
-            self.level += 1
-            self.current_xp -= XP_PER_LEVEL
-
-        self.save()
+        """Add XP and level up if necessary (atomic, see apply_progress)"""
+        self.apply_progress(xp=amount, practiced=False)
 
     def update_streak(self):
-        """Update streak based on practice date"""
-        from datetime import date, timedelta
-
-        today = date.today()
-
-        if not self.last_practice_date:
-            # First practice
-            self.current_streak = 1
-            self.last_practice_date = today
-        elif self.last_practice_date == today:
-            # Already practiced today, do nothing
-            pass
-        elif self.last_practice_date == today - timedelta(days=1):
-            # Consecutive day
-            self.current_streak += 1
-            self.last_practice_date = today
-
-            # Update longest streak
-            if self.current_streak > self.longest_streak:
-                self.longest_streak = self.current_streak
-        else:
-            # Streak broken
-            self.current_streak = 1
-            self.last_practice_date = today
+        """Update streak based on practice date (atomic, see apply_progress)"""
+        self.apply_progress()
 
-        self.save()
+    def apply_progress(self, xp=0, lessons=0, exercises=0, correct=0,
+                       answers=0, practice_minutes=0, practiced=True, category=None):
+        """
+        Apply XP, counters and streak in a single UPDATE with F() expressions.
+
+        Concurrent completions can't overwrite each other's counters. Level
+        and current_xp are derived from the new total with
+        calculate_level_from_xp() and XP_PER_LEVEL, and the streak follows
+        the practice-date rules (same day: unchanged, next day: +1,
+        otherwise: restart at 1). XP is also added to the daily activity
+        rollup and the leaderboards (`category` is the lesson category, if
+        any). The instance is refreshed afterwards.
+        """
+        from datetime import timedelta
+        from django.conf import settings
+        from django.db.models import Case, F, Value, When
+        from django.db.models.functions import Greatest
+        from .utils import calculate_level_from_xp
+
+        xp_per_level = settings.MUSIC_LEARNING_SETTINGS.get('XP_PER_LEVEL', 100)
+        total_xp = F('total_xp') + xp
+        changes = {
+            'total_xp': total_xp,
+            'current_xp': total_xp % xp_per_level,
+            'level': calculate_level_from_xp(total_xp),
+            'total_lessons_completed': F('total_lessons_completed') + lessons,
+            'total_exercises_completed': F('total_exercises_completed') + exercises,
+            'correct_answers': F('correct_answers') + correct,
+            'total_answers': F('total_answers') + answers,
+            'total_practice_time': F('total_practice_time') + practice_minutes,
+            'updated_at': timezone.now(),
+        }
+
+        if practiced:
+            # Same calendar as UserDailyActivity, compute_streaks and the weekly boards
+            today = timezone.localdate()
+            new_streak = Case(
+                When(last_practice_date=today, then=F('current_streak')),
+                When(last_practice_date=today - timedelta(days=1), then=F('current_streak') + 1),
+                default=Value(1),
+            )
+            changes.update({
+                'current_streak': new_streak,
+                'longest_streak': Greatest(F('longest_streak'), new_streak),
+                'last_practice_date': today,
+            })
+
+        UserProfile.objects.filter(pk=self.pk).update(**changes)
+        if xp:
+            UserDailyActivity.record(self.user_id, xp=xp)
+            LeaderboardEntry.record_xp(self.user_id, xp, category)
+        self.refresh_from_db()
 
 
 class LessonProgress(models.Model):
@@ -414,7 +457,8 @@ class ExerciseAttempt(models.Model):
         verbose_name = 'Intento de Ejercicio'
         verbose_name_plural = 'Intentos de Ejercicios'
         indexes = [
-            models.Index(fields=['user', 'attempted_at']),
+            # Also the key of the attempt history cursor pagination
+            models.Index(fields=['user', 'attempted_at', 'id'], name='attempt_user_time_id_idx'),
             models.Index(fields=['exercise', 'is_correct']),
         ]
 
@@ -423,6 +467,120 @@ class ExerciseAttempt(models.Model):
         return f"{status} {self.user.username} - {self.exercise}"
 
 
+class UserDailyActivity(models.Model):
+    """
+    Per-user, per-day rollup of learning activity
+
+    Maintained incrementally: exercise counters when attempts are inserted,
+    xp whenever the profile gains XP (lessons, challenges, badges...).
+    History reads (stats, streaks, leaderboards) use it instead of scanning
+    ExerciseAttempt. Backfill with `python manage.py backfill_daily_activity`.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_activity'
+    )
+    date = models.DateField()
+
+    # Counters
+    exercises = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    correct = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    xp = models.IntegerField(default=0, help_text="XP ganado en el día", validators=[MinValueValidator(0)])
+    seconds = models.IntegerField(default=0, help_text="Segundos de práctica", validators=[MinValueValidator(0)])
+
+    class Meta:
+        unique_together = ['user', 'date']
+        ordering = ['-date']
+        verbose_name = 'Actividad Diaria'
+        verbose_name_plural = 'Actividad Diaria'
+        indexes = [
+            models.Index(fields=['date', 'user']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date} ({self.exercises} ejercicios, {self.xp} XP)"
+
+    @classmethod
+    def record(cls, user_id, day=None, exercises=0, correct=0, xp=0, seconds=0):
+        """
+        Add to the user's row for `day` (today by default), creating it if needed
+
+        /user/stats/ reads its recent activity from these rows, so its cached
+        windows are dropped once the write commits.
+        """
+        from django.db import transaction
+        from .utils import invalidate_user_stats
+
+        increment_or_create(
+            cls,
+            {'user_id': user_id, 'date': day or timezone.localdate()},
+            exercises=exercises, correct=correct, xp=xp, seconds=seconds
+        )
+        transaction.on_commit(lambda: invalidate_user_stats(user_id))
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Precomputed leaderboard score of a user
+
+    Boards:
+        global               total XP
+        weekly:<YYYY>-W<ww>  XP earned during the ISO week
+        category:<category>  XP earned in lessons of the category
+
+    Scores are incremented whenever the profile gains XP and can be rebuilt
+    with `python manage.py rebuild_leaderboards`. Rows are read in
+    (board, -score) index order, and a rank is 1 + the number of higher scores.
+    """
+
+    GLOBAL = 'global'
+
+    board = models.CharField(max_length=50)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_entries'
+    )
+    score = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['board', 'user']
+        ordering = ['board', '-score', 'user_id']
+        verbose_name = 'Entrada de Ranking'
+        verbose_name_plural = 'Rankings'
+        indexes = [
+            models.Index(fields=['board', '-score', 'user']),
+        ]
+
+    def __str__(self):
+        return f"{self.board} - {self.user.username}: {self.score}"
+
+    @staticmethod
+    def weekly_board(day=None):
+        year, week, _ = (day or timezone.localdate()).isocalendar()
+        return f'weekly:{year}-W{week:02d}'
+
+    @staticmethod
+    def category_board(category):
+        return f'category:{category}'
+
+    @classmethod
+    def record_xp(cls, user_id, xp, category=None):
+        """Add XP to the user's global, current weekly and (optional) category boards"""
+        boards = [cls.GLOBAL, cls.weekly_board()]
+        if category:
+            boards.append(cls.category_board(category))
+        for board in boards:
+            increment_or_create(cls, {'board': board, 'user_id': user_id}, score=xp)
+
+    def get_rank(self):
+        """1 + number of users with a higher score on the same board"""
+        return LeaderboardEntry.objects.filter(board=self.board, score__gt=self.score).count() + 1
+
+
 class Badge(models.Model):
     """Unlockable badge/achievement"""
 
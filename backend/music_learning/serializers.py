@@ -4,7 +4,7 @@ Serializers for Music Learning App API
 from rest_framework import serializers
 from .models import (
     Lesson, Exercise, UserProfile, LessonProgress,
-    ExerciseAttempt, Badge, UserBadge, Achievement, UserAchievement,
+    ExerciseAttempt, LeaderboardEntry, Badge, UserBadge, Achievement, UserAchievement,
     Challenge, ChallengeNote, UserChallengeProgress
 )
 
@@ -28,10 +28,7 @@ class LessonListSerializer(serializers.ModelSerializer):
     Lesson list serializer with user progress information
     Used for GET /lessons/ endpoint
     """
-    exercises_count = serializers.IntegerField(
-        source='exercises.count',
-        read_only=True
-    )
+    exercises_count = serializers.SerializerMethodField()
     is_unlocked = serializers.SerializerMethodField()
     user_progress = serializers.SerializerMethodField()
     prerequisites = serializers.PrimaryKeyRelatedField(
@@ -48,45 +45,63 @@ class LessonListSerializer(serializers.ModelSerializer):
             'is_unlocked', 'user_progress', 'order'
         ]
 
+    def get_exercises_count(self, obj):
+        """Use the queryset annotation when available"""
+        if hasattr(obj, 'exercises_count'):
+            return obj.exercises_count
+        return obj.exercises.count()
+
+    def _get_progress(self, obj):
+        """
+        User's LessonProgress for this lesson, or None
+
+        Read from the `lesson_progress` dict the view puts in the context
+        (all the user's rows, loaded once); queried per lesson otherwise.
+        """
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return None
+
+        progress_by_lesson = self.context.get('lesson_progress')
+        if progress_by_lesson is not None:
+            return progress_by_lesson.get(obj.pk)
+
+        return LessonProgress.objects.filter(user=request.user, lesson=obj).first()
+
     def get_is_unlocked(self, obj):
         """Check if lesson is unlocked for current user"""
         request = self.context.get('request')
+        graph = self.context.get('lesson_graph')
+
+        if graph is not None:
+            has_prerequisites = graph.has_prerequisites(obj.pk)
+        else:
+            has_prerequisites = obj.prerequisites.count() > 0
 
         # If no user or anonymous, only unlock lessons without prerequisites
         if not request or not request.user.is_authenticated:
-            return obj.prerequisites.count() == 0
+            return not has_prerequisites
 
         # Check if user has progress entry with is_unlocked=True
-        try:
-            progress = LessonProgress.objects.get(
-                user=request.user,
-                lesson=obj
-            )
+        progress = self._get_progress(obj)
+        if progress is not None:
             return progress.is_unlocked
-        except LessonProgress.DoesNotExist:
-            # If no progress exists, check if it's a first lesson
-            return obj.prerequisites.count() == 0
+
+        # If no progress exists, check if it's a first lesson
+        return not has_prerequisites
 
     def get_user_progress(self, obj):
         """Get user progress for this lesson"""
-        request = self.context.get('request')
-
-        if not request or not request.user.is_authenticated:
+        progress = self._get_progress(obj)
+        if progress is None:
             return None
 
-        try:
-            progress = LessonProgress.objects.get(
-                user=request.user,
-                lesson=obj
-            )
-            return {
-                'is_completed': progress.is_completed,
-                'stars': progress.stars,
-                'best_score': progress.best_score,
-                'attempts': progress.attempts
-            }
-        except LessonProgress.DoesNotExist:
-            return None
+        return {
+            'is_completed': progress.is_completed,
+            'stars': progress.stars,
+            'best_score': progress.best_score,
+            'attempts': progress.attempts
+        }
 
 
 class LessonDetailSerializer(LessonListSerializer):
@@ -139,6 +154,20 @@ class LessonProgressSerializer(serializers.ModelSerializer):
         ]
 
 
+class ExerciseAttemptSerializer(serializers.ModelSerializer):
+    """Exercise attempt in the user's history (never includes the correct answer)"""
+    exercise_id = serializers.UUIDField(source='exercise.id', read_only=True)
+    exercise_question = serializers.CharField(source='exercise.question', read_only=True)
+    lesson_id = serializers.UUIDField(source='exercise.lesson_id', read_only=True)
+
+    class Meta:
+        model = ExerciseAttempt
+        fields = [
+            'id', 'exercise_id', 'exercise_question', 'lesson_id',
+            'user_answer', 'is_correct', 'time_spent', 'xp_earned', 'attempted_at'
+        ]
+
+
 class ExerciseResultSerializer(serializers.Serializer):
     """Serializer for individual exercise result in lesson completion"""
     exercise_id = serializers.UUIDField()
@@ -191,31 +220,29 @@ class BadgeSerializer(serializers.ModelSerializer):
             'category', 'xp_reward', 'is_unlocked', 'unlocked_at'
         ]
 
-    def get_is_unlocked(self, obj):
-        """Check if badge is unlocked for current user"""
+    def _get_user_badge(self, obj):
+        """
+        UserBadge of the current user, or None
+
+        Read from `obj.user_state`, prefetched by BadgeViewSet for request.user;
+        queried once per badge (not per field) otherwise.
+        """
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
-            return False
+            return None
+
+        if not hasattr(obj, 'user_state'):
+            obj.user_state = list(UserBadge.objects.filter(user=request.user, badge=obj))
+        return obj.user_state[0] if obj.user_state else None
 
-        return UserBadge.objects.filter(
-            user=request.user,
-            badge=obj
-        ).exists()
+    def get_is_unlocked(self, obj):
+        """Check if badge is unlocked for current user"""
+        return self._get_user_badge(obj) is not None
 
     def get_unlocked_at(self, obj):
         """Get unlock timestamp if unlocked"""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return None
-
-        try:
-            user_badge = UserBadge.objects.get(
-                user=request.user,
-                badge=obj
-            )
-            return user_badge.unlocked_at
-        except UserBadge.DoesNotExist:
-            return None
+        user_badge = self._get_user_badge(obj)
+        return user_badge.unlocked_at if user_badge else None
 
 
 class AchievementSerializer(serializers.ModelSerializer):
@@ -234,65 +261,40 @@ class AchievementSerializer(serializers.ModelSerializer):
             'is_completed', 'completed_at'
         ]
 
-    def get_current_progress(self, obj):
-        """Get user's current progress on this achievement"""
+    def _get_user_achievement(self, obj):
+        """
+        UserAchievement of the current user, or None
+
+        Read from `obj.user_state`, prefetched by AchievementViewSet for
+        request.user; queried once per achievement (not per field) otherwise.
+        """
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
-            return 0
+            return None
 
-        try:
-            user_achievement = UserAchievement.objects.get(
-                user=request.user,
-                achievement=obj
-            )
-            return user_achievement.current_progress
-        except UserAchievement.DoesNotExist:
-            return 0
+        if not hasattr(obj, 'user_state'):
+            obj.user_state = list(UserAchievement.objects.filter(user=request.user, achievement=obj))
+        return obj.user_state[0] if obj.user_state else None
+
+    def get_current_progress(self, obj):
+        """Get user's current progress on this achievement"""
+        user_achievement = self._get_user_achievement(obj)
+        return user_achievement.current_progress if user_achievement else 0
 
     def get_progress_percentage(self, obj):
         """Get progress percentage"""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return 0
-
-        try:
-            user_achievement = UserAchievement.objects.get(
-                user=request.user,
-                achievement=obj
-            )
-            return user_achievement.progress_percentage
-        except UserAchievement.DoesNotExist:
-            return 0
+        user_achievement = self._get_user_achievement(obj)
+        return user_achievement.progress_percentage if user_achievement else 0
 
     def get_is_completed(self, obj):
         """Check if achievement is completed"""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-
-        try:
-            user_achievement = UserAchievement.objects.get(
-                user=request.user,
-                achievement=obj
-            )
-            return user_achievement.is_completed
-        except UserAchievement.DoesNotExist:
-            return False
+        user_achievement = self._get_user_achievement(obj)
+        return user_achievement.is_completed if user_achievement else False
 
     def get_completed_at(self, obj):
         """Get completion timestamp"""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return None
-
-        try:
-            user_achievement = UserAchievement.objects.get(
-                user=request.user,
-                achievement=obj
-            )
-            return user_achievement.completed_at
-        except UserAchievement.DoesNotExist:
-            return None
+        user_achievement = self._get_user_achievement(obj)
+        return user_achievement.completed_at if user_achievement else None
 
 
 class ChallengeNoteSerializer(serializers.ModelSerializer):
@@ -307,10 +309,7 @@ class ChallengeNoteSerializer(serializers.ModelSerializer):
 
 class ChallengeListSerializer(serializers.ModelSerializer):
     """Challenge list serializer with basic info"""
-    notes_count = serializers.IntegerField(
-        source='notes.count',
-        read_only=True
-    )
+    notes_count = serializers.SerializerMethodField()
     user_progress = serializers.SerializerMethodField()
 
     class Meta:
@@ -321,6 +320,12 @@ class ChallengeListSerializer(serializers.ModelSerializer):
             'user_progress', 'order'
         ]
 
+    def get_notes_count(self, obj):
+        """Use the queryset annotation when available"""
+        if hasattr(obj, 'notes_count'):
+            return obj.notes_count
+        return obj.notes.count()
+
     def get_user_progress(self, obj):
         """Get user progress for this challenge"""
         request = self.context.get('request')
@@ -328,21 +333,24 @@ class ChallengeListSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return None
 
-        try:
-            progress = UserChallengeProgress.objects.get(
-                user=request.user,
-                challenge=obj
-            )
-            return {
-                'is_completed': progress.is_completed,
-                'stars': progress.stars,
-                'accuracy': progress.accuracy,
-                'best_accuracy': progress.best_accuracy,
-                'attempts': progress.attempts
-            }
-        except UserChallengeProgress.DoesNotExist:
+        # All the user's rows, loaded once by the view
+        progress_by_challenge = self.context.get('challenge_progress')
+        if progress_by_challenge is not None:
+            progress = progress_by_challenge.get(obj.pk)
+        else:
+            progress = UserChallengeProgress.objects.filter(user=request.user, challenge=obj).first()
+
+        if progress is None:
             return None
 
+        return {
+            'is_completed': progress.is_completed,
+            'stars': progress.stars,
+            'accuracy': progress.accuracy,
+            'best_accuracy': progress.best_accuracy,
+            'attempts': progress.attempts
+        }
+
 
 class ChallengeDetailSerializer(ChallengeListSerializer):
     """Challenge detail serializer with nested notes"""
@@ -402,3 +410,13 @@ class ChallengeCompleteResponseSerializer(serializers.Serializer):
     new_level = serializers.IntegerField()
     level_up = serializers.BooleanField()
     unlocked_badges = BadgeInfoSerializer(many=True)
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """Leaderboard row; `rank` is set by LeaderboardViewSet"""
+    rank = serializers.IntegerField(read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'username', 'score']
@@ -2,11 +2,12 @@
 Signal handlers for Music Learning App
 Auto-trigger achievements, badge checks, and lesson unlocks
 """
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import LessonProgress, UserProfile
-from .utils import check_achievements, check_badges, unlock_next_lessons
+from .models import Lesson, LessonProgress, UserProfile
+from .utils import schedule_gamification, invalidate_lesson_graph, LESSON_PROGRESS_METRICS
 
 
 @receiver(post_save, sender=User)
@@ -18,33 +19,28 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """
-    Save UserProfile when User is saved
-    """
-    if hasattr(instance, 'music_profile'):
-        instance.music_profile.save()
-
-
 @receiver(post_save, sender=LessonProgress)
 def on_lesson_progress_update(sender, instance, created, **kwargs):
     """
-    When a lesson is completed:
+    When a lesson is completed outside the completion view (admin, shell),
+    run after commit:
     1. Check and unlock achievements
     2. Check and unlock badges
     3. Unlock next lessons if prerequisites are met
+
+    The completion view runs the pipeline itself and marks its saves with
+    `gamification_handled`.
     """
     # Only trigger if lesson was just completed (not on every save)
-    if instance.is_completed:
-        user = instance.user
-        lesson = instance.lesson
-
-        # Check for achievements
-        check_achievements(user)
+    if instance.is_completed and not getattr(instance, 'gamification_handled', False):
+        schedule_gamification(instance.user, instance.lesson, LESSON_PROGRESS_METRICS)
 
-        # Check for badges
-        check_badges(user)
 
-        # Unlock next lessons
-        unlock_next_lessons(user, lesson)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(m2m_changed, sender=Lesson.prerequisites.through)
+def on_lesson_graph_change(sender, **kwargs):
+    """
+    Drop the cached prerequisite graph when lessons or prerequisites change
+    """
+    transaction.on_commit(invalidate_lesson_graph)
@@ -1,3 +1,607 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    Lesson, Exercise, Badge, UserBadge, LessonProgress, Achievement, UserAchievement,
+    Challenge, ChallengeNote, UserChallengeProgress, UserDailyActivity, LeaderboardEntry, ExerciseAttempt,
+    UserProfile
+)
+from .serializers import BadgeSerializer
+from .views import LeaderboardPagination
+from .utils import (
+    learning_cache, get_lesson_graph, unlock_next_lessons, compute_streaks, schedule_gamification,
+    check_achievements, check_badges
+)
+
+
+def create_lesson(slug, prerequisites=(), exercises=3, **kwargs):
+    """Create a published lesson with `exercises` exercises"""
+    lesson = Lesson.objects.create(
+        slug=slug,
+        title=slug.title(),
+        description='Lección de prueba',
+        icon='🎵',
+        category=kwargs.pop('category', 'notes'),
+        difficulty='beginner',
+        estimated_time=5,
+        is_published=True,
+        **kwargs
+    )
+    lesson.prerequisites.set(prerequisites)
+    for order in range(exercises):
+        Exercise.objects.create(
+            lesson=lesson,
+            type='note-recognition',
+            question=f'Pregunta {order}',
+            options=['Do', 'Re', 'Mi'],
+            correct_answer='Do',
+            difficulty='easy',
+            order=order,
+        )
+    return lesson
+
+
+def lesson_results(lesson, correct=True):
+    return {
+        'exercise_results': [
+            {'exercise_id': str(exercise.id), 'user_answer': 'Do', 'is_correct': correct, 'time_spent': 20}
+            for exercise in lesson.exercises.all()
+        ]
+    }
+
+
+class GamificationUnitOfWorkTest(TransactionTestCase):
+    """
+    A lesson completion evaluates unlocks, badges and achievements exactly once
+
+    TransactionTestCase so the view's transaction really commits before the
+    pipeline runs, and on_commit callbacks of other saves really fire.
+    """
+
+    def setUp(self):
+        cache.clear()
+        learning_cache.reset_stats()
+        self.user = User.objects.create_user('alumno', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.lesson = create_lesson('notas-basicas')
+        self.next_lesson = create_lesson('notas-avanzadas', prerequisites=[self.lesson])
+        Badge.objects.create(
+            code='primera-leccion',
+            name='Primera lección',
+            description='Completá una lección',
+            icon='🏅',
+            category='beginner',
+            unlock_criteria={'type': 'lessons_completed', 'target': 1},
+        )
+
+    def complete(self, lesson):
+        response = self.client.post(
+            f'/api/v1/lessons/{lesson.id}/complete/', lesson_results(lesson), format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_completion_runs_pipeline_once(self):
+        response = self.complete(self.lesson)
+
+        self.assertEqual(learning_cache.get_counter('gamification_runs'), 1)
+        self.assertEqual(response.data['unlocked_lessons'], [str(self.next_lesson.id)])
+        self.assertEqual([b['code'] for b in response.data['unlocked_badges']], ['primera-leccion'])
+        self.assertEqual(UserBadge.objects.filter(user=self.user).count(), 1)
+
+    def test_repeated_completion_runs_pipeline_once_each(self):
+        self.complete(self.lesson)
+        response = self.complete(self.lesson)
+
+        self.assertEqual(learning_cache.get_counter('gamification_runs'), 2)
+        self.assertEqual(response.data['unlocked_lessons'], [])
+        self.assertEqual(response.data['unlocked_badges'], [])
+
+    def test_rolled_back_schedule_is_dropped(self):
+        other = User.objects.create_user('otro', password='secret')
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                schedule_gamification(other, lesson=self.lesson)
+                raise RuntimeError
+
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    schedule_gamification(other, lesson=self.lesson)
+                    raise RuntimeError
+            schedule_gamification(self.user, metrics={'total_xp'})
+
+        # Only the committed user was evaluated
+        self.assertEqual(learning_cache.get_counter('gamification_runs'), 1)
+
+    def test_completion_saved_outside_the_view(self):
+        # e.g. from the admin: the signal runs the pipeline on commit
+        with transaction.atomic():
+            LessonProgress.objects.create(user=self.user, lesson=self.lesson, is_unlocked=True, is_completed=True)
+            self.assertEqual(learning_cache.get_counter('gamification_runs'), 0)
+
+        self.assertEqual(learning_cache.get_counter('gamification_runs'), 1)
+        self.assertTrue(
+            LessonProgress.objects.filter(user=self.user, lesson=self.next_lesson, is_unlocked=True).exists()
+        )
+
+
+class LessonGraphTest(TestCase):
+    """Unlocks and the lessons list use the cached prerequisite graph"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alumno', password='secret')
+        self.notes = create_lesson('notas')
+        self.rhythm = create_lesson('ritmo')
+        self.reading = create_lesson('lectura', prerequisites=[self.notes, self.rhythm])
+
+    def complete(self, lesson):
+        LessonProgress.objects.create(user=self.user, lesson=lesson, is_unlocked=True, is_completed=True)
+
+    def test_topological_order(self):
+        order = get_lesson_graph().order
+        self.assertLess(order.index(self.notes.pk), order.index(self.reading.pk))
+        self.assertLess(order.index(self.rhythm.pk), order.index(self.reading.pk))
+
+    def test_unlocks_only_when_all_prerequisites_are_completed(self):
+        self.complete(self.notes)
+        self.assertEqual(unlock_next_lessons(self.user, self.notes), [])
+
+        self.complete(self.rhythm)
+        self.assertEqual(unlock_next_lessons(self.user, self.rhythm), [self.reading])
+        self.assertTrue(LessonProgress.objects.get(user=self.user, lesson=self.reading).is_unlocked)
+
+        # Already unlocked: nothing new
+        self.assertEqual(unlock_next_lessons(self.user, self.notes), [])
+
+    def test_graph_is_invalidated_when_prerequisites_change(self):
+        self.assertFalse(get_lesson_graph().has_prerequisites(self.rhythm.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rhythm.prerequisites.add(self.notes)
+
+        self.assertTrue(get_lesson_graph().has_prerequisites(self.rhythm.pk))
+
+    def test_lessons_list_is_unlocked(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.complete(self.notes)
+
+        response = client.get('/api/v1/lessons/')
+        unlocked = {lesson['slug']: lesson['is_unlocked'] for lesson in response.data['results']}
+
+        self.assertEqual(unlocked, {'notas': True, 'ritmo': True, 'lectura': False})
+
+
+class ProgressListQueryBudgetTest(TestCase):
+    """Lesson and challenge lists load the user's progress once, whatever the catalog size"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alumno', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_catalog(self, prefix, size):
+        for i in range(size):
+            lesson = create_lesson(f'{prefix}-leccion-{i}')
+            LessonProgress.objects.create(user=self.user, lesson=lesson, is_unlocked=True, stars=i % 4)
+
+            challenge = Challenge.objects.create(
+                slug=f'{prefix}-desafio-{i}', title='Desafío', description='Sostener nota',
+                type='note-holding', difficulty='beginner', is_published=True
+            )
+            ChallengeNote.objects.create(challenge=challenge, note='C', octave=4, beats_to_hold=4)
+            UserChallengeProgress.objects.create(user=self.user, challenge=challenge, stars=1)
+        cache.clear()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_lessons_list_query_count_is_constant(self):
+        self.add_catalog('a', 1)
+        small, _ = self.count_queries('/api/v1/lessons/')
+
+        self.add_catalog('b', 6)
+        large, response = self.count_queries('/api/v1/lessons/')
+
+        self.assertEqual(small, large)
+        lesson = response.data['results'][0]
+        self.assertEqual(lesson['exercises_count'], 3)
+        self.assertIsNotNone(lesson['user_progress'])
+
+    def test_challenges_list_query_count_is_constant(self):
+        self.add_catalog('a', 1)
+        small, _ = self.count_queries('/api/v1/challenges/')
+
+        self.add_catalog('b', 6)
+        large, response = self.count_queries('/api/v1/challenges/')
+
+        self.assertEqual(small, large)
+        challenge = response.data['results'][0]
+        self.assertEqual(challenge['notes_count'], 1)
+        self.assertEqual(challenge['user_progress']['stars'], 1)
+
+
+class BadgeAchievementListTest(TestCase):
+    """Badge and achievement lists join the user's state in a single prefetch"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_catalog(self, prefix, size):
+        for i in range(size):
+            badge = Badge.objects.create(
+                code=f'{prefix}-insignia-{i}', name='Insignia', description='d', icon='🏅',
+                category='progress', unlock_criteria={'type': 'total_xp', 'target': 100}
+            )
+            achievement = Achievement.objects.create(
+                code=f'{prefix}-logro-{i}', title='Logro', description='d', target=10,
+                metric_type='exercises_completed'
+            )
+            if i % 2:
+                UserBadge.objects.create(user=self.user, badge=badge)
+                UserAchievement.objects.create(user=self.user, achievement=achievement, current_progress=5)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_query_count_does_not_depend_on_catalog_size(self):
+        self.add_catalog('a', 2)
+        small_badges, _ = self.count_queries('/api/v1/badges/')
+        small_achievements, _ = self.count_queries('/api/v1/achievements/')
+
+        self.add_catalog('b', 8)
+        badge_queries, badges = self.count_queries('/api/v1/badges/')
+        achievement_queries, achievements = self.count_queries('/api/v1/achievements/')
+
+        self.assertEqual(small_badges, badge_queries)
+        self.assertEqual(small_achievements, achievement_queries)
+        self.assertEqual(sum(b['is_unlocked'] for b in badges.data['results']), 5)
+
+        progress = {a['code']: a for a in achievements.data['results']}
+        self.assertEqual(progress['b-logro-1']['current_progress'], 5)
+        self.assertEqual(progress['b-logro-1']['progress_percentage'], 50)
+        self.assertEqual(progress['b-logro-0']['current_progress'], 0)
+
+    def test_badge_serializer_without_prefetch_queries_each_badge_once(self):
+        self.add_catalog('a', 2)
+        context = {'request': mock.Mock(user=self.user)}
+
+        # The list plus one UserBadge query per badge, shared by is_unlocked and unlocked_at
+        with self.assertNumQueries(3):
+            data = BadgeSerializer(Badge.objects.order_by('code')[:2], many=True, context=context).data
+        self.assertEqual([(b['is_unlocked'], b['unlocked_at'] is not None) for b in data], [(False, False), (True, True)])
+
+
+class IncrementalEvaluationTest(TestCase):
+    """Achievements and badges are evaluated only for the changed metrics, in bulk"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno', password='secret')
+        UserProfile.objects.get_or_create(user=self.user)
+        UserProfile.objects.filter(user=self.user).update(total_lessons_completed=2, total_xp=100)
+
+    def achievement(self, code, metric, target, xp=10):
+        return Achievement.objects.create(
+            code=code, title=code, description='d', target=target, metric_type=metric, xp_reward=xp
+        )
+
+    def badge(self, code, metric, target, xp=20):
+        return Badge.objects.create(
+            code=code, name=code, description='d', icon='🏅', category='progress',
+            unlock_criteria={'type': metric, 'target': target}, xp_reward=xp
+        )
+
+    def total_xp(self):
+        return UserProfile.objects.get(user=self.user).total_xp
+
+    def writes(self, context, model):
+        table = model._meta.db_table
+        return [
+            q['sql'].split()[0] for q in context.captured_queries
+            if table in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE'))
+        ]
+
+    def test_check_achievements_for_a_metric_subset(self):
+        reached = self.achievement('dos-lecciones', 'lessons_completed', 2)
+        self.achievement('diez-lecciones', 'lessons_completed', 10)
+        started = self.achievement('cinco-lecciones', 'lessons_completed', 5)
+        UserAchievement.objects.create(user=self.user, achievement=started, current_progress=1)
+        self.achievement('mucha-xp', 'total_xp', 50)
+
+        with CaptureQueriesContext(connection) as context:
+            completed = check_achievements(self.user, {'lessons_completed'})
+
+        self.assertEqual(completed, [reached])
+        # One INSERT for the new rows and one UPDATE for the existing one
+        self.assertEqual(self.writes(context, UserAchievement), ['INSERT', 'UPDATE'])
+        progress = dict(
+            UserAchievement.objects.filter(user=self.user).values_list('achievement__code', 'current_progress')
+        )
+        self.assertEqual(progress, {'dos-lecciones': 2, 'diez-lecciones': 2, 'cinco-lecciones': 2})
+        self.assertEqual(self.total_xp(), 110)
+
+        # Nothing new: no XP, and the total_xp achievement only on its metric
+        self.assertEqual(check_achievements(self.user, {'lessons_completed'}), [])
+        self.assertEqual(self.total_xp(), 110)
+        self.assertEqual([a.code for a in check_achievements(self.user, {'total_xp'})], ['mucha-xp'])
+        self.assertEqual(self.total_xp(), 120)
+
+    def test_check_badges_for_a_metric_subset(self):
+        reached = self.badge('dos-lecciones', 'lessons_completed', 2)
+        other = self.badge('otra-de-lecciones', 'lessons_completed', 1)
+        self.badge('cinco-lecciones', 'lessons_completed', 5)
+        self.badge('mucha-xp', 'total_xp', 50)
+
+        with CaptureQueriesContext(connection) as context:
+            unlocked = check_badges(self.user, {'lessons_completed'})
+
+        self.assertEqual({b.code for b in unlocked}, {reached.code, other.code})
+        self.assertEqual(self.writes(context, UserBadge), ['INSERT'])
+        self.assertEqual(self.total_xp(), 140)
+
+        self.assertEqual(check_badges(self.user, {'lessons_completed'}), [])
+        self.assertEqual(self.total_xp(), 140)
+        self.assertEqual([b.code for b in check_badges(self.user, {'total_xp'})], ['mucha-xp'])
+        self.assertEqual(self.total_xp(), 160)
+
+
+class UserStatsTest(TestCase):
+    """/user/stats/ aggregates with grouped queries and is cached until the next attempt"""
+
+    url = '/api/v1/user/stats/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alumno', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.lesson = create_lesson('ritmo-basico', category='rhythm', exercises=4)
+
+    def complete(self, correct=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/v1/lessons/{self.lesson.id}/complete/', lesson_results(self.lesson, correct), format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_aggregates_by_category_and_day(self):
+        self.complete(correct=True)
+        self.complete(correct=False)
+
+        response = self.client.get(self.url, {'days': 30})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['by_category']['rhythm'], {'lessons_completed': 1, 'accuracy': 50.0})
+        self.assertEqual(response.data['by_category']['notes'], {'lessons_completed': 0, 'accuracy': 0})
+        self.assertEqual(len(response.data['recent_activity']), 1)
+        self.assertEqual(response.data['recent_activity'][0]['exercises_completed'], 8)
+        # All XP of the day: 4 correct exercises + the lesson reward, twice
+        self.assertEqual(response.data['recent_activity'][0]['xp_earned'], 40 + 50 + 50)
+
+    def test_cached_until_next_attempt(self):
+        self.complete()
+        self.client.get(self.url)
+
+        # Profile only; the aggregates come from the cache
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        cached_queries = len(context.captured_queries)
+        self.assertLessEqual(cached_queries, 3)
+
+        self.complete(correct=False)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['recent_activity'][0]['exercises_completed'], 8)
+
+    def test_xp_outside_lessons_refreshes_stats(self):
+        self.assertEqual(self.client.get(self.url).data['recent_activity'], [])
+
+        # Challenges, badges and achievements grant XP through apply_progress
+        profile, _ = UserProfile.objects.get_or_create(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.apply_progress(xp=30)
+
+        self.assertEqual(self.client.get(self.url).data['recent_activity'][0]['xp_earned'], 30)
+
+    def test_invalid_days(self):
+        response = self.client.get(self.url, {'days': 'semana'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DailyActivityRollupTest(TestCase):
+    """UserDailyActivity is kept up to date and feeds streak computation"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno', password='secret')
+
+    def test_record_accumulates_per_day(self):
+        UserDailyActivity.record(self.user.pk, exercises=3, correct=2, seconds=40)
+        UserDailyActivity.record(self.user.pk, xp=25)
+
+        activity = UserDailyActivity.objects.get(user=self.user)
+        self.assertEqual(
+            (activity.exercises, activity.correct, activity.xp, activity.seconds),
+            (3, 2, 25, 40)
+        )
+
+    def test_compute_streaks(self):
+        from datetime import timedelta
+        today = timezone.localdate()
+        for days_ago in (0, 1, 2, 5, 6, 7, 8):
+            UserDailyActivity.record(self.user.pk, day=today - timedelta(days=days_ago), exercises=1)
+
+        self.assertEqual(compute_streaks(self.user, today), (3, 4, today))
+        self.assertEqual(compute_streaks(self.user, today + timedelta(days=2)), (0, 4, today))
+
+    def test_backfill_refreshes_cached_stats(self):
+        from io import StringIO
+        from django.core.management import call_command
+        cache.clear()
+        lesson = create_lesson('ritmo-basico', category='rhythm', exercises=2)
+        for exercise in lesson.exercises.all():
+            ExerciseAttempt.objects.create(user=self.user, exercise=exercise, user_answer='x', is_correct=True, time_spent=5)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/v1/user/stats/').data['recent_activity'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('backfill_daily_activity', '--rebuild', '--streaks', stdout=StringIO())
+
+        activity = client.get('/api/v1/user/stats/').data['recent_activity']
+        self.assertEqual([day['exercises_completed'] for day in activity], [2])
+
+
+class AtomicProfileUpdateTest(TestCase):
+    """XP and streak updates are applied in the database, not on stale instances"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno', password='secret')
+        self.profile, _ = UserProfile.objects.get_or_create(user=self.user)
+
+    def test_stale_instances_do_not_lose_xp(self):
+        other = UserProfile.objects.get(pk=self.profile.pk)
+        self.profile.add_xp(180)
+        other.add_xp(70)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(
+            (self.profile.total_xp, self.profile.level, self.profile.current_xp),
+            (250, 3, 50)
+        )
+
+    def test_user_save_keeps_profile_counters(self):
+        # A login (last_login update) saves the User with a stale cached profile
+        user = User.objects.select_related('music_profile').get(pk=self.user.pk)
+        self.profile.apply_progress(xp=40, lessons=1)
+        user.save(update_fields=['last_login'])
+
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.total_xp, self.profile.total_lessons_completed), (40, 1))
+
+    def test_streak_uses_the_local_date(self):
+        from datetime import date
+        UserProfile.objects.filter(pk=self.profile.pk).update(
+            last_practice_date=date(2030, 1, 1), current_streak=2, longest_streak=2
+        )
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2030, 1, 2)):
+            self.profile.apply_progress(xp=10)
+
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.current_streak, self.profile.last_practice_date), (3, date(2030, 1, 2)))
+        self.assertTrue(UserDailyActivity.objects.filter(user=self.user, date=date(2030, 1, 2)).exists())
+
+    def test_update_streak(self):
+        from datetime import timedelta
+        today = timezone.localdate()
+        UserProfile.objects.filter(pk=self.profile.pk).update(
+            last_practice_date=today - timedelta(days=1), current_streak=4, longest_streak=4
+        )
+        stale = UserProfile.objects.get(pk=self.profile.pk)
+        stale.update_streak()
+        stale.update_streak()
+
+        self.assertEqual(
+            (stale.current_streak, stale.longest_streak, stale.last_practice_date),
+            (5, 5, today)
+        )
+
+
+class LeaderboardTest(TestCase):
+    """Leaderboards are kept up to date on XP gains and ranked with ties"""
+
+    url = '/api/v1/leaderboard/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [User.objects.create_user(f'alumno{i}', password='secret') for i in range(5)]
+        for user, xp in zip(self.users, [50, 120, 80, 120, 10]):
+            user.music_profile.apply_progress(xp=xp, practiced=False, category='rhythm' if xp > 50 else None)
+
+    def test_ranks_with_ties_and_cursor_pages(self):
+        response = self.client.get(self.url)
+        rows = [(row['rank'], row['username'], row['score']) for row in response.data['results']]
+
+        self.assertEqual(rows, [
+            (1, 'alumno1', 120), (1, 'alumno3', 120), (3, 'alumno2', 80),
+            (4, 'alumno0', 50), (5, 'alumno4', 10),
+        ])
+
+        with mock.patch.object(LeaderboardPagination, 'page_size', 2):
+            first = self.client.get(self.url)
+            second = self.client.get(first.data['next'])
+        self.assertEqual([row['rank'] for row in second.data['results']], [3, 4])
+
+    def test_category_and_weekly_boards(self):
+        response = self.client.get(self.url, {'board': 'category', 'category': 'rhythm'})
+        self.assertEqual([row['username'] for row in response.data['results']], ['alumno1', 'alumno3', 'alumno2'])
+
+        response = self.client.get(self.url, {'board': 'weekly'})
+        self.assertEqual(len(response.data['results']), 5)
+
+        response = self.client.get(self.url, {'board': 'category', 'category': 'jazz'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_my_rank(self):
+        self.client.force_authenticate(self.users[2])
+        response = self.client.get(f'{self.url}me/')
+        self.assertEqual((response.data['rank'], response.data['score'], response.data['total']), (3, 80, 5))
+
+    def test_rebuild_matches_incremental_scores(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        before = set(LeaderboardEntry.objects.filter(board=LeaderboardEntry.GLOBAL).values_list('user_id', 'score'))
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        after = set(LeaderboardEntry.objects.filter(board=LeaderboardEntry.GLOBAL).values_list('user_id', 'score'))
+        self.assertEqual(before, after)
+
+
+class AttemptHistoryTest(TestCase):
+    """The attempt history is paginated newest first, with cursor pagination on request"""
+
+    url = '/api/v1/user/progress/attempts/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.lesson = create_lesson('historial', exercises=3)
+        other = create_lesson('otra', exercises=1)
+        exercises = list(self.lesson.exercises.all()) + list(other.exercises.all())
+        for exercise in exercises:
+            ExerciseAttempt.objects.create(
+                user=self.user, exercise=exercise, user_answer='C', is_correct=True, time_spent=5
+            )
+
+    def test_lesson_filter_and_cursor(self):
+        response = self.client.get(self.url, {'lesson': str(self.lesson.id)})
+        self.assertEqual(response.data['count'], 3)
+        self.assertNotIn('correct_answer', response.data['results'][0])
+
+        response = self.client.get(self.url, {'pagination': 'cursor'})
+        self.assertNotIn('count', response.data)
+        ids = [row['id'] for row in response.data['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 4)
+
+        response = self.client.get(self.url, {'lesson': 'nope'})
+        self.assertEqual(response.status_code, 400)
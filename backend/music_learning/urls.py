@@ -8,7 +8,8 @@ from .views import (
     UserProgressViewSet,
     BadgeViewSet,
     AchievementViewSet,
-    ChallengeViewSet
+    ChallengeViewSet,
+    LeaderboardViewSet
 )
 
 # Create router and register viewsets
@@ -17,6 +18,7 @@ router.register(r'lessons', LessonViewSet, basename='lesson')
 router.register(r'challenges', ChallengeViewSet, basename='challenge')
 router.register(r'badges', BadgeViewSet, basename='badge')
 router.register(r'achievements', AchievementViewSet, basename='achievement')
+router.register(r'leaderboard', LeaderboardViewSet, basename='leaderboard')
 
 # Custom routes for user progress (no model-based routing)
 user_progress_list = UserProgressViewSet.as_view({
@@ -31,6 +33,10 @@ user_progress_challenges = UserProgressViewSet.as_view({
     'get': 'challenges'
 })
 
+user_progress_attempts = UserProgressViewSet.as_view({
+    'get': 'attempts'
+})
+
 user_stats = UserProgressViewSet.as_view({
     'get': 'stats'
 })
@@ -47,6 +53,7 @@ urlpatterns = [
     path('user/progress/', user_progress_list, name='user-progress'),
     path('user/progress/lessons/', user_progress_lessons, name='user-progress-lessons'),
     path('user/progress/challenges/', user_progress_challenges, name='user-progress-challenges'),
+    path('user/progress/attempts/', user_progress_attempts, name='user-progress-attempts'),
     path('user/stats/', user_stats, name='user-stats'),
     path('user/streak/update/', user_streak_update, name='user-streak-update'),
 ]
@@ -1,16 +1,29 @@
 """
 Utility functions for Music Learning App gamification logic
 """
+from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 
+from sheetmusic_api.cache import NamespacedCache
+
+# Shared cache namespace of the app; `gamification_runs` counts pipeline executions
+learning_cache = NamespacedCache('music_learning', counters=['gamification_runs'])
+
 
 def calculate_level_from_xp(total_xp):
     """
     Calculate user level based on total XP
     Formula: level = (total_xp // XP_PER_LEVEL) + 1
+
+    `total_xp` can also be an integer F() expression, to compute the level
+    inside an UPDATE (`/` on integer columns is integer division there)
     """
+    from django.db.models.expressions import Combinable
+
     xp_per_level = settings.MUSIC_LEARNING_SETTINGS.get('XP_PER_LEVEL', 100)
+    if isinstance(total_xp, Combinable):
+        return total_xp / xp_per_level + 1
     return (total_xp // xp_per_level) + 1
 
 
@@ -37,11 +50,90 @@ def calculate_stars(correct_count, total_count):
         return 0
 
 
+class LessonGraph:
+    """
+    In-memory prerequisite DAG of all lessons
+
+    Built from two queries (lessons and the prerequisites table) and kept in
+    the shared cache until a lesson or its prerequisites change (signals).
+
+    Attributes:
+        prerequisites: lesson_id -> set of prerequisite lesson ids
+        dependents: lesson_id -> set of lesson ids it is a prerequisite of
+        published: set of published lesson ids
+        order: lesson ids in topological order (prerequisites first)
+    """
+
+    def __init__(self, lesson_ids, published, edges):
+        self.published = set(published)
+        self.prerequisites = {lesson_id: set() for lesson_id in lesson_ids}
+        self.dependents = {lesson_id: set() for lesson_id in lesson_ids}
+        for lesson_id, prerequisite_id in edges:
+            self.prerequisites[lesson_id].add(prerequisite_id)
+            self.dependents[prerequisite_id].add(lesson_id)
+        self.order = self._topological_order(lesson_ids)
+
+    def _topological_order(self, lesson_ids):
+        """Kahn's algorithm; lessons in a cycle (bad data) go last"""
+        pending = {lesson_id: len(self.prerequisites[lesson_id]) for lesson_id in lesson_ids}
+        ready = [lesson_id for lesson_id in lesson_ids if not pending[lesson_id]]
+        order = []
+        while ready:
+            lesson_id = ready.pop(0)
+            order.append(lesson_id)
+            for dependent_id in self.dependents[lesson_id]:
+                pending[dependent_id] -= 1
+                if not pending[dependent_id]:
+                    ready.append(dependent_id)
+        seen = set(order)
+        return order + [lesson_id for lesson_id in lesson_ids if lesson_id not in seen]
+
+    @classmethod
+    def build(cls):
+        from .models import Lesson
+
+        lessons = list(Lesson.objects.values_list('id', 'is_published'))
+        edges = Lesson.prerequisites.through.objects.values_list('from_lesson_id', 'to_lesson_id')
+        return cls(
+            [lesson_id for lesson_id, _ in lessons],
+            [lesson_id for lesson_id, is_published in lessons if is_published],
+            list(edges)
+        )
+
+    def has_prerequisites(self, lesson_id):
+        return bool(self.prerequisites.get(lesson_id))
+
+    def unlockable(self, lesson_id, completed_ids):
+        """
+        Published dependents of `lesson_id` whose prerequisites are all completed,
+        in topological order
+        """
+        candidates = self.dependents.get(lesson_id, set()) & self.published
+        ready = {
+            dependent_id for dependent_id in candidates
+            if self.prerequisites[dependent_id] <= completed_ids
+        }
+        return [dependent_id for dependent_id in self.order if dependent_id in ready]
+
+
+def get_lesson_graph():
+    """Prerequisite graph from the shared cache, built on a miss"""
+    # Invalidated by signals; the timeout only bounds changes made with update()
+    return learning_cache.get_or_set('lesson_graph', LessonGraph.build, 60 * 60)
+
+
+def invalidate_lesson_graph():
+    learning_cache.delete('lesson_graph')
+
+
 def unlock_next_lessons(user, completed_lesson):
     """
     Unlock lessons that have the completed lesson as a prerequisite
     Only unlocks if ALL prerequisites are met
 
+    Uses the cached prerequisite graph and the user's completed set, so the
+    number of queries doesn't depend on how many lessons are unlocked.
+
     Args:
         user: User instance
         completed_lesson: Lesson instance that was just completed
@@ -51,158 +143,296 @@ def unlock_next_lessons(user, completed_lesson):
     """
     from .models import Lesson, LessonProgress
 
-    # Find all lessons that have this lesson as a prerequisite
-    next_lessons = Lesson.objects.filter(
-        prerequisites=completed_lesson,
-        is_published=True
+    graph = get_lesson_graph()
+    if not graph.dependents.get(completed_lesson.pk):
+        return []
+
+    completed_ids = set(
+        LessonProgress.objects.filter(user=user, is_completed=True).values_list('lesson_id', flat=True)
     )
+    ready_ids = graph.unlockable(completed_lesson.pk, completed_ids)
+    if not ready_ids:
+        return []
 
-    unlocked_lessons = []
+    existing = dict(
+        LessonProgress.objects.filter(user=user, lesson_id__in=ready_ids).values_list('lesson_id', 'is_unlocked')
+    )
+    to_create = [lesson_id for lesson_id in ready_ids if lesson_id not in existing]
+    to_unlock = [lesson_id for lesson_id, is_unlocked in existing.items() if not is_unlocked]
 
-    for lesson in next_lessons:
-        # Check if all prerequisites are completed
-        all_prerequisites = lesson.prerequisites.all()
-
-        all_met = all(
-            LessonProgress.objects.filter(
-                user=user,
-                lesson=prereq,
-                is_completed=True
-            ).exists()
-            for prereq in all_prerequisites
+    # Create missing progress rows already unlocked, and unlock existing ones
+    LessonProgress.objects.bulk_create(
+        [LessonProgress(user=user, lesson_id=lesson_id, is_unlocked=True) for lesson_id in to_create],
+        ignore_conflicts=True
+    )
+    if to_unlock:
+        LessonProgress.objects.filter(user=user, lesson_id__in=to_unlock).update(
+            is_unlocked=True,
+            updated_at=timezone.now()
         )
 
-        if all_met:
-            # Get or create progress and unlock
-            progress, created = LessonProgress.objects.get_or_create(
-                user=user,
-                lesson=lesson,
-                defaults={'is_unlocked': True}
-            )
+    unlocked_ids = set(to_create) | set(to_unlock)
+    if not unlocked_ids:
+        return []
+    lessons = Lesson.objects.in_bulk(unlocked_ids)
+    return [lessons[lesson_id] for lesson_id in ready_ids if lesson_id in lessons]
+
+
+def get_user_stats(user, days=7):
+    """
+    Per-category accuracy and daily activity of a user
+
+    Two grouped queries for the categories (attempts and completed lessons)
+    and the UserDailyActivity rollup for the last `days` days, so history
+    costs O(days) rather than O(attempts). Cached per user until the next
+    attempt (see invalidate_user_stats).
+
+    Returns:
+        dict: {'by_category': {category: {...}}, 'recent_activity': [...]}
+    """
+    from datetime import timedelta
+    from django.db.models import Count, Q
+    from .models import Lesson, LessonProgress, ExerciseAttempt, UserDailyActivity
+
+    generation = learning_cache.get(f'stats_generation:{user.pk}', 0)
+    key = f'stats:{user.pk}:{generation}:{days}'
+    stats = learning_cache.get(key)
+    if stats is not None:
+        return stats
+
+    attempts = ExerciseAttempt.objects.filter(user=user)
+
+    # Accuracy by category
+    accuracy_rows = attempts.values('exercise__lesson__category').annotate(
+        total=Count('id'),
+        correct=Count('id', filter=Q(is_correct=True))
+    ).order_by()
+    accuracy = {
+        row['exercise__lesson__category']: round((row['correct'] / row['total']) * 100, 2)
+        for row in accuracy_rows
+    }
+
+    completed = dict(
+        LessonProgress.objects.filter(user=user, is_completed=True)
+        .values('lesson__category')
+        .annotate(count=Count('id'))
+        .order_by()
+        .values_list('lesson__category', 'count')
+    )
+
+    by_category = {
+        category: {
+            'lessons_completed': completed.get(category, 0),
+            'accuracy': accuracy.get(category, 0)
+        }
+        for category, _ in Lesson.CATEGORY_CHOICES
+    }
+
+    # Recent activity (last `days` days, most recent first, only active days)
+    since = timezone.localdate() - timedelta(days=days - 1)
+    recent_activity = [
+        {
+            'date': str(activity.date),
+            'exercises_completed': activity.exercises,
+            'xp_earned': activity.xp
+        }
+        for activity in UserDailyActivity.objects.filter(user=user, date__gte=since).order_by('-date')
+    ]
+
+    stats = {'by_category': by_category, 'recent_activity': recent_activity}
+    learning_cache.set(key, stats, 60 * 60)
+    return stats
+
+
+def invalidate_user_stats(user_id):
+    """Start a new stats generation for the user, dropping cached windows"""
+    import time
+    learning_cache.set(f'stats_generation:{user_id}', time.time_ns(), None)
+
+
+def compute_streaks(user, today=None):
+    """
+    Current and longest streak of a user from the UserDailyActivity rollup
+
+    The current streak counts consecutive active days ending today or
+    yesterday (the streak is still alive until the day is over).
+
+    Returns:
+        tuple: (current_streak, longest_streak, last_practice_date)
+    """
+    from datetime import timedelta
+    from .models import UserDailyActivity
+
+    today = today or timezone.localdate()
+    dates = list(
+        UserDailyActivity.objects.filter(user=user).order_by('date').values_list('date', flat=True)
+    )
+    if not dates:
+        return 0, 0, None
+
+    longest = run = 1
+    for previous, current in zip(dates, dates[1:]):
+        run = run + 1 if current - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+
+    current_streak = run if today - dates[-1] <= timedelta(days=1) else 0
+    return current_streak, longest, dates[-1]
+
 
-            if not progress.is_unlocked:
-                progress.is_unlocked = True
-                progress.save()
-                unlocked_lessons.append(lesson)
-            elif created:
-                unlocked_lessons.append(lesson)
+# Metrics achievements and badges can be unlocked by, and the UserProfile
+# field holding each one (perfect_lessons is counted from LessonProgress)
+METRIC_PROFILE_FIELDS = {
+    'lessons_completed': 'total_lessons_completed',
+    'exercises_completed': 'total_exercises_completed',
+    'streak_days': 'current_streak',
+    'total_xp': 'total_xp',
+    'perfect_lessons': None,
+}
 
-    return unlocked_lessons
+# Metrics that can change on a LessonProgress save / a challenge completion
+LESSON_PROGRESS_METRICS = ('lessons_completed', 'perfect_lessons')
+CHALLENGE_METRICS = ('exercises_completed', 'streak_days', 'total_xp')
 
 
-def check_achievements(user):
+def get_metric_values(user, profile, metrics):
     """
-    Check and update user achievements based on current metrics
+    Current value of each requested metric
+
+    Args:
+        user: User instance
+        profile: Fresh UserProfile of the user
+        metrics: Iterable of metric names (keys of METRIC_PROFILE_FIELDS)
+
+    Returns:
+        dict: metric -> value. perfect_lessons costs one COUNT, only if requested
+    """
+    from .models import LessonProgress
+
+    values = {}
+    for metric in metrics:
+        field = METRIC_PROFILE_FIELDS.get(metric)
+        if field:
+            values[metric] = getattr(profile, field)
+        elif metric == 'perfect_lessons':
+            values[metric] = LessonProgress.objects.filter(user=user, stars=3).count()
+    return values
+
+
+def check_achievements(user, metrics=None):
+    """
+    Check and update user achievements whose metric changed
     Automatically completes achievements when target is reached
 
+    Only achievements tracking one of `metrics` are evaluated, and the
+    user's progress rows are loaded in one query and written in bulk.
+
     Args:
         user: User instance
+        metrics: Changed metric names (default: every metric)
 
     Returns:
         list: List of newly completed Achievement instances
     """
     from .models import Achievement, UserAchievement
 
-    profile = user.music_profile
-    achievements = Achievement.objects.filter(is_active=True)
-
+    metrics = set(METRIC_PROFILE_FIELDS if metrics is None else metrics)
+    achievements = list(Achievement.objects.filter(is_active=True, metric_type__in=metrics))
+    if not achievements:
+        return []
+
+    existing = {
+        user_achievement.achievement_id: user_achievement
+        for user_achievement in UserAchievement.objects.filter(user=user, achievement__in=achievements)
+    }
+    profile = get_or_create_user_profile(user)  # fresh row, counters may have been updated with F()
+    values = get_metric_values(user, profile, {a.metric_type for a in achievements})
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
     newly_completed = []
 
     for achievement in achievements:
-        user_achievement, created = UserAchievement.objects.get_or_create(
-            user=user,
-            achievement=achievement
-        )
+        user_achievement = existing.get(achievement.id)
 
         # Skip if already completed
-        if user_achievement.is_completed:
+        if user_achievement is not None and user_achievement.is_completed:
             continue
 
-        # Get current metric value
-        current_value = 0
-        if achievement.metric_type == 'lessons_completed':
-            current_value = profile.total_lessons_completed
-        elif achievement.metric_type == 'exercises_completed':
-            current_value = profile.total_exercises_completed
-        elif achievement.metric_type == 'streak_days':
-            current_value = profile.current_streak
-        elif achievement.metric_type == 'perfect_lessons':
-            from .models import LessonProgress
-            current_value = LessonProgress.objects.filter(
-                user=user,
-                stars=3
-            ).count()
-        elif achievement.metric_type == 'total_xp':
-            current_value = profile.total_xp
+        current_value = values[achievement.metric_type]
+        if user_achievement is None:
+            user_achievement = UserAchievement(user=user, achievement=achievement)
+            to_create.append(user_achievement)
+        elif user_achievement.current_progress != current_value or current_value >= achievement.target:
+            user_achievement.updated_at = now
+            to_update.append(user_achievement)
+        else:
+            continue
 
         # Update progress
         user_achievement.current_progress = current_value
 
         # Check if completed
-        if current_value >= achievement.target and not user_achievement.is_completed:
+        if current_value >= achievement.target:
             user_achievement.is_completed = True
-            user_achievement.completed_at = timezone.now()
-
-            # Award XP
-            profile.add_xp(achievement.xp_reward)
-
+            user_achievement.completed_at = now
             newly_completed.append(achievement)
 
-        user_achievement.save()
+    UserAchievement.objects.bulk_create(to_create, ignore_conflicts=True)
+    UserAchievement.objects.bulk_update(
+        to_update, ['current_progress', 'is_completed', 'completed_at', 'updated_at']
+    )
+
+    # Award XP
+    xp_reward = sum(achievement.xp_reward for achievement in newly_completed)
+    if xp_reward:
+        profile.apply_progress(xp=xp_reward, practiced=False)
 
     return newly_completed
 
 
-def check_badges(user):
+def check_badges(user, metrics=None):
     """
     Check and unlock badges based on unlock criteria
 
+    Only badges whose criteria type is one of `metrics` are evaluated,
+    against the user's unlocked badges loaded in one query.
+
     Args:
         user: User instance
+        metrics: Changed metric names (default: every metric)
 
     Returns:
         list: List of newly unlocked Badge instances
     """
-    from .models import Badge, UserBadge, LessonProgress
-
-    profile = user.music_profile
-    badges = Badge.objects.filter(is_active=True)
-
-    newly_unlocked = []
-
-    for badge in badges:
-        # Skip if already unlocked
-        if UserBadge.objects.filter(user=user, badge=badge).exists():
-            continue
-
-        # Check unlock criteria
-        criteria = badge.unlock_criteria
-        criteria_type = criteria.get('type')
-        target = criteria.get('target', 0)
+    from .models import Badge, UserBadge
 
-        should_unlock = False
+    metrics = set(METRIC_PROFILE_FIELDS if metrics is None else metrics)
+    badges = list(
+        Badge.objects.filter(is_active=True, unlock_criteria__type__in=metrics)
+        .exclude(user_badges__user=user)
+    )
+    if not badges:
+        return []
 
-        if criteria_type == 'lessons_completed':
-            should_unlock = profile.total_lessons_completed >= target
-        elif criteria_type == 'perfect_lessons':
-            perfect_count = LessonProgress.objects.filter(user=user, stars=3).count()
-            should_unlock = perfect_count >= target
-        elif criteria_type == 'streak_days':
-            should_unlock = profile.current_streak >= target
-        elif criteria_type == 'total_xp':
-            should_unlock = profile.total_xp >= target
-        elif criteria_type == 'exercises_completed':
-            should_unlock = profile.total_exercises_completed >= target
+    profile = get_or_create_user_profile(user)  # fresh row, counters may have been updated with F()
+    values = get_metric_values(user, profile, {b.unlock_criteria.get('type') for b in badges})
 
-        if should_unlock:
-            # Unlock badge
-            UserBadge.objects.create(user=user, badge=badge)
+    newly_unlocked = [
+        badge for badge in badges
+        if values.get(badge.unlock_criteria.get('type'), 0) >= badge.unlock_criteria.get('target', 0)
+    ]
 
-            # Award XP
-            if badge.xp_reward > 0:
-                profile.add_xp(badge.xp_reward)
+    # Unlock badges
+    UserBadge.objects.bulk_create(
+        [UserBadge(user=user, badge=badge) for badge in newly_unlocked],
+        ignore_conflicts=True
+    )
 
-            newly_unlocked.append(badge)
+    # Award XP
+    xp_reward = sum(badge.xp_reward for badge in newly_unlocked)
+    if xp_reward:
+        profile.apply_progress(xp=xp_reward, practiced=False)
 
     return newly_unlocked
 
@@ -232,3 +462,54 @@ def get_or_create_user_profile(user):
     )
 
     return profile
+
+
+# Gamification
+# ------------
+# Unlocks, badges and achievements are evaluated once the transaction that
+# changed the progress has committed. The completion views call
+# run_gamification() after their atomic() block and use its results; other
+# LessonProgress saves (admin, shell, scripts) go through
+# schedule_gamification(), an on_commit callback dropped on rollback.
+
+
+def run_gamification(user, lessons=(), metrics=None):
+    """
+    Evaluate the user: unlock lessons, then badges and achievements
+
+    Call it after the progress changes are committed.
+
+    Args:
+        user: User instance
+        lessons: Completed lessons whose dependents may unlock
+        metrics: Changed metric names (default: every metric)
+
+    Returns:
+        dict: {'lessons': [...], 'badges': [...], 'achievements': [...]}
+    """
+    metrics = set(METRIC_PROFILE_FIELDS if metrics is None else metrics)
+
+    unlocked_lessons = []
+    for lesson in lessons:
+        unlocked_lessons.extend(unlock_next_lessons(user, lesson))
+
+    results = {
+        'lessons': unlocked_lessons,
+        'badges': check_badges(user, metrics),
+        'achievements': check_achievements(user, metrics),
+    }
+    learning_cache.count('gamification_runs')
+    return results
+
+
+def schedule_gamification(user, lesson=None, metrics=None):
+    """
+    Run the evaluation when the current transaction commits (results are discarded)
+
+    Args:
+        user: User instance
+        lesson: Completed Lesson whose dependents may unlock (optional)
+        metrics: Changed metric names (default: every metric)
+    """
+    lessons = [] if lesson is None else [lesson]
+    transaction.on_commit(lambda: run_gamification(user, lessons, metrics))
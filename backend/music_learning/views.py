@@ -1,17 +1,22 @@
 """
 ViewSets for Music Learning App API
 """
-from rest_framework import viewsets, status
+import uuid
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Avg, Count, Q
-from datetime import datetime, timedelta
+from django.db.models import Avg, Count, Prefetch, Q
+from sheetmusic_api.pagination import FlexiblePagination
 
 from .models import (
-    Lesson, Exercise, UserProfile, LessonProgress,
-    ExerciseAttempt, Badge, Achievement,
+    Lesson, UserProfile, LessonProgress,
+    ExerciseAttempt, UserDailyActivity, LeaderboardEntry, Badge, UserBadge, Achievement, UserAchievement,
     Challenge, ChallengeNote, UserChallengeProgress
 )
 from .serializers import (
@@ -20,9 +25,13 @@ from .serializers import (
     LessonCompleteRequestSerializer, BadgeSerializer,
     AchievementSerializer, BadgeInfoSerializer,
     ChallengeListSerializer, ChallengeDetailSerializer,
-    UserChallengeProgressSerializer, ChallengeCompleteRequestSerializer
+    UserChallengeProgressSerializer, ChallengeCompleteRequestSerializer,
+    LeaderboardEntrySerializer, ExerciseAttemptSerializer
+)
+from .utils import (
+    get_or_create_user_profile, get_lesson_graph, run_gamification,
+    get_user_stats, CHALLENGE_METRICS
 )
-from .utils import get_or_create_user_profile, check_achievements, check_badges, unlock_next_lessons
 
 
 class LessonViewSet(viewsets.ReadOnlyModelViewSet):
@@ -31,14 +40,38 @@ class LessonViewSet(viewsets.ReadOnlyModelViewSet):
     Provides list and retrieve actions
     Custom action: complete
     """
-    queryset = Lesson.objects.filter(is_published=True).prefetch_related('exercises', 'prerequisites')
+    queryset = Lesson.objects.filter(is_published=True).prefetch_related('prerequisites')
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        # Meta.ordering is not applied to aggregate queries, keep it explicit
+        queryset = super().get_queryset().annotate(
+            exercises_count=Count('exercises')
+        ).order_by('order', 'created_at')
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('exercises')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return LessonDetailSerializer
         return LessonListSerializer
 
+    def get_serializer_context(self):
+        """
+        Add the cached prerequisite graph and all of the user's progress rows
+        (keyed by lesson id) so serializers don't query per lesson
+        """
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['lesson_graph'] = get_lesson_graph()
+            if self.request.user.is_authenticated:
+                context['lesson_progress'] = {
+                    progress.lesson_id: progress
+                    for progress in LessonProgress.objects.filter(user=self.request.user)
+                }
+        return context
+
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
     def complete(self, request, pk=None):
         """
@@ -75,108 +108,123 @@ class LessonViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
+        # Fetch every exercise in one query and make sure they belong to this lesson
+        exercise_ids = {result['exercise_id'] for result in exercise_results}
+        exercises = lesson.exercises.in_bulk(exercise_ids)
+        missing = exercise_ids - set(exercises)
+        if missing:
+            return Response(
+                {"error": "Exercises do not belong to this lesson",
+                 "exercise_ids": sorted(str(exercise_id) for exercise_id in missing)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         # Get or create user profile
         profile = get_or_create_user_profile(user)
         
-        # Get or create lesson progress
-        lesson_progress, created = LessonProgress.objects.get_or_create(
-            user=user,
-            lesson=lesson,
-            defaults={'is_unlocked': True}
-        )
-        
-        # Update attempt count
-        lesson_progress.attempts += 1
-        if not lesson_progress.first_attempted_at:
-            lesson_progress.first_attempted_at = timezone.now()
-        lesson_progress.last_attempted_at = timezone.now()
-        
-        # Process exercise results
-        correct_count = 0
-        total_count = len(exercise_results)
-        total_time = 0
-        total_xp = 0
-        
-        for result in exercise_results:
-            exercise = Exercise.objects.get(id=result['exercise_id'])
-            is_correct = result['is_correct']
-            time_spent = result['time_spent']
-            
-            # Create exercise attempt record
-            xp_earned = exercise.xp_reward if is_correct else 0
-            ExerciseAttempt.objects.create(
+        with transaction.atomic():
+            # Lock the progress row so concurrent completions don't lose attempts
+            lesson_progress, created = LessonProgress.objects.select_for_update().get_or_create(
                 user=user,
-                exercise=exercise,
-                lesson_progress=lesson_progress,
-                user_answer=result['user_answer'],
-                is_correct=is_correct,
-                time_spent=time_spent,
-                xp_earned=xp_earned
+                lesson=lesson,
+                defaults={'is_unlocked': True}
             )
             
-            if is_correct:
-                correct_count += 1
-                total_xp += xp_earned
+            # Update attempt count
+            now = timezone.now()
+            lesson_progress.attempts += 1
+            if not lesson_progress.first_attempted_at:
+                lesson_progress.first_attempted_at = now
+            lesson_progress.last_attempted_at = now
+            
+            # Process exercise results
+            correct_count = 0
+            total_count = len(exercise_results)
+            total_time = 0
+            total_xp = 0
+            attempts = []
+            
+            for result in exercise_results:
+                exercise = exercises[result['exercise_id']]
+                is_correct = result['is_correct']
+                time_spent = result['time_spent']
+                
+                xp_earned = exercise.xp_reward if is_correct else 0
+                attempts.append(ExerciseAttempt(
+                    user=user,
+                    exercise=exercise,
+                    lesson_progress=lesson_progress,
+                    user_answer=result['user_answer'],
+                    is_correct=is_correct,
+                    time_spent=time_spent,
+                    xp_earned=xp_earned
+                ))
+                
+                if is_correct:
+                    correct_count += 1
+                    total_xp += xp_earned
+                
+                total_time += time_spent
+            
+            ExerciseAttempt.objects.bulk_create(attempts)
+            UserDailyActivity.record(user.pk, exercises=total_count, correct=correct_count, seconds=total_time)
+            
+            # Calculate score and stars
+            score = round((correct_count / total_count) * 100)
+            stars = lesson_progress.calculate_stars(correct_count, total_count)
+            
+            # Update lesson progress
+            if score >= 50:  # Minimum 50% to complete
+                lesson_progress.is_completed = True
+                lesson_progress.completed_at = now
+            
+            # Update best score and stars
+            if score > lesson_progress.best_score:
+                lesson_progress.best_score = score
+            if stars > lesson_progress.stars:
+                lesson_progress.stars = stars
+            
+            # The pipeline is run below, after commit, instead of from the signal
+            lesson_progress.gamification_handled = True
+            lesson_progress.save()
+            
+            # Update user profile
+            old_level = profile.level
+            
+            # Add XP from lesson completion
+            if lesson_progress.is_completed:
+                total_xp += lesson.xp_reward
             
-            total_time += time_spent
-        
-        # Calculate score and stars
-        score = round((correct_count / total_count) * 100)
-        stars = lesson_progress.calculate_stars(correct_count, total_count)
-        
-        # Update lesson progress
-        if score >= 50:  # Minimum 50% to complete
-            lesson_progress.is_completed = True
-            lesson_progress.completed_at = timezone.now()
-        
-        # Update best score and stars
-        if score > lesson_progress.best_score:
-            lesson_progress.best_score = score
-        if stars > lesson_progress.stars:
-            lesson_progress.stars = stars
-        
-        lesson_progress.save()
-        
-        # Update user profile
-        old_level = profile.level
-        
-        # Add XP from lesson completion
-        if lesson_progress.is_completed:
-            total_xp += lesson.xp_reward
-        
-        profile.add_xp(total_xp)
-        
-        # Update statistics
-        if lesson_progress.is_completed and lesson_progress.attempts == 1:
             # Only count first completion
-            profile.total_lessons_completed += 1
-        
-        profile.total_exercises_completed += total_count
-        profile.correct_answers += correct_count
-        profile.total_answers += total_count
-        profile.total_practice_time += total_time // 60  # Convert to minutes
-        
-        # Update streak
-        profile.update_streak()
-        profile.save()
+            first_completion = lesson_progress.is_completed and lesson_progress.attempts == 1
+            
+            # XP, statistics and streak in a single UPDATE
+            profile.apply_progress(
+                xp=total_xp,
+                lessons=1 if first_completion else 0,
+                exercises=total_count,
+                correct=correct_count,
+                answers=total_count,
+                practice_minutes=total_time // 60,  # Convert to minutes
+                category=lesson.category,
+            )
         
         new_level = profile.level
         level_up = new_level > old_level
         
-        # Check for unlocked content
-        unlocked_lessons = []
-        unlocked_badges = []
-        
+        # Unlock next lessons, check badges and achievements (only for the
+        # metrics that changed), now that the completion is committed
+        results = {'lessons': [], 'badges': [], 'achievements': []}
         if lesson_progress.is_completed:
-            # Unlock next lessons
-            next_lessons = unlock_next_lessons(user, lesson)
-            unlocked_lessons = [str(l.id) for l in next_lessons]
-            
-            # Check badges and achievements
-            new_badges = check_badges(user)
-            unlocked_badges = BadgeInfoSerializer(new_badges, many=True).data
-            
-            check_achievements(user)
+            changed_metrics = {'exercises_completed', 'streak_days', 'total_xp'}
+            if first_completion:
+                changed_metrics.add('lessons_completed')
+            if stars == 3:
+                changed_metrics.add('perfect_lessons')
+            results = run_gamification(user, [lesson], changed_metrics)
+        
+        unlocked_lessons = [str(l.id) for l in results['lessons']]
+        unlocked_badges = BadgeInfoSerializer(results['badges'], many=True).data
         
         # Return response
         return Response({
@@ -191,6 +239,11 @@ class LessonViewSet(viewsets.ReadOnlyModelViewSet):
         })
 
 
+class AttemptHistoryPagination(FlexiblePagination):
+    """Attempt history pages; ?pagination=cursor keys on (attempted_at, id)"""
+    cursor_ordering = ('-attempted_at', '-id')
+
+
 class UserProgressViewSet(viewsets.ViewSet):
     """
     ViewSet for user progress and statistics
@@ -214,7 +267,6 @@ class UserProgressViewSet(viewsets.ViewSet):
         serializer = UserProfileSerializer(profile)
         
         # Add badge and achievement counts
-        from .models import UserBadge, UserAchievement
         data = serializer.data
         data['badges_count'] = UserBadge.objects.filter(user=request.user).count()
         data['achievements_completed'] = UserAchievement.objects.filter(
@@ -256,6 +308,41 @@ class UserProgressViewSet(viewsets.ViewSet):
         serializer = UserChallengeProgressSerializer(progress, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def attempts(self, request):
+        """
+        Get the user's exercise attempt history, newest first
+        GET /api/v1/user/progress/attempts/
+
+        Query params:
+        - lesson: only attempts of this lesson's exercises
+        - pagination=cursor / count=false: see sheetmusic_api.pagination
+        """
+        if not request.user.is_authenticated:
+            return Response(
+                {"error": "Authentication required"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        attempts = ExerciseAttempt.objects.filter(
+            user=request.user
+        ).select_related('exercise').order_by('-attempted_at', '-id')
+        lesson_id = request.query_params.get('lesson')
+        if lesson_id:
+            try:
+                lesson_id = uuid.UUID(lesson_id)
+            except ValueError:
+                return Response(
+                    {"error": "lesson must be a lesson id"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            attempts = attempts.filter(exercise__lesson_id=lesson_id)
+
+        paginator = AttemptHistoryPagination()
+        page = paginator.paginate_queryset(attempts, request, view=self)
+        serializer = ExerciseAttemptSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
@@ -268,6 +355,17 @@ class UserProgressViewSet(viewsets.ViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
+        # Window for recent activity: ?days=N (default 7)
+        ml_settings = settings.MUSIC_LEARNING_SETTINGS
+        try:
+            days = int(request.query_params.get('days', ml_settings.get('STATS_DEFAULT_DAYS', 7)))
+        except ValueError:
+            return Response(
+                {"error": "days must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        days = min(max(days, 1), ml_settings.get('STATS_MAX_DAYS', 365))
+        
         profile = get_or_create_user_profile(request.user)
         
         # Overview stats
@@ -278,53 +376,13 @@ class UserProgressViewSet(viewsets.ViewSet):
             'accuracy': profile.accuracy
         }
         
-        # Stats by category
-        by_category = {}
-        for category, _ in Lesson.CATEGORY_CHOICES:
-            lessons_in_category = Lesson.objects.filter(category=category)
-            completed = LessonProgress.objects.filter(
-                user=request.user,
-                lesson__category=category,
-                is_completed=True
-            )
-            
-            attempts_in_category = ExerciseAttempt.objects.filter(
-                user=request.user,
-                exercise__lesson__category=category
-            )
-            
-            total_attempts = attempts_in_category.count()
-            correct_attempts = attempts_in_category.filter(is_correct=True).count()
-            
-            category_accuracy = 0
-            if total_attempts > 0:
-                category_accuracy = round((correct_attempts / total_attempts) * 100, 2)
-            
-            by_category[category] = {
-                'lessons_completed': completed.count(),
-                'accuracy': category_accuracy
-            }
-        
-        # Recent activity (last 7 days)
-        recent_activity = []
-        for i in range(7):
-            date = datetime.now().date() - timedelta(days=i)
-            attempts_on_day = ExerciseAttempt.objects.filter(
-                user=request.user,
-                attempted_at__date=date
-            )
-            
-            if attempts_on_day.exists():
-                recent_activity.append({
-                    'date': str(date),
-                    'exercises_completed': attempts_on_day.count(),
-                    'xp_earned': sum(a.xp_earned for a in attempts_on_day)
-                })
+        # Stats by category and recent activity (grouped queries, cached until the next attempt)
+        stats = get_user_stats(request.user, days)
         
         return Response({
             'overview': overview,
-            'by_category': by_category,
-            'recent_activity': recent_activity
+            'by_category': stats['by_category'],
+            'recent_activity': stats['recent_activity']
         })
 
     @action(detail=False, methods=['post'])
@@ -358,6 +416,17 @@ class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = BadgeSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        """Prefetch the current user's UserBadge into `user_state` (one query)"""
+        queryset = super().get_queryset()
+        if self.request.user.is_authenticated:
+            queryset = queryset.prefetch_related(Prefetch(
+                'user_badges',
+                queryset=UserBadge.objects.filter(user=self.request.user),
+                to_attr='user_state'
+            ))
+        return queryset
+
 
 class AchievementViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -368,6 +437,17 @@ class AchievementViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AchievementSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        """Prefetch the current user's UserAchievement into `user_state` (one query)"""
+        queryset = super().get_queryset()
+        if self.request.user.is_authenticated:
+            queryset = queryset.prefetch_related(Prefetch(
+                'user_achievements',
+                queryset=UserAchievement.objects.filter(user=self.request.user),
+                to_attr='user_state'
+            ))
+        return queryset
+
 
 class ChallengeViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -375,14 +455,33 @@ class ChallengeViewSet(viewsets.ReadOnlyModelViewSet):
     Provides list and retrieve actions
     Custom action: complete
     """
-    queryset = Challenge.objects.filter(is_published=True).prefetch_related('notes')
+    queryset = Challenge.objects.filter(is_published=True)
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        # Meta.ordering is not applied to aggregate queries, keep it explicit
+        queryset = super().get_queryset().annotate(
+            notes_count=Count('notes')
+        ).order_by('order', 'created_at')
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('notes')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ChallengeDetailSerializer
         return ChallengeListSerializer
 
+    def get_serializer_context(self):
+        """Add all of the user's challenge progress rows, keyed by challenge id"""
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve') and self.request.user.is_authenticated:
+            context['challenge_progress'] = {
+                progress.challenge_id: progress
+                for progress in UserChallengeProgress.objects.filter(user=self.request.user)
+            }
+        return context
+
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
     def complete(self, request, pk=None):
         """
@@ -418,43 +517,39 @@ class ChallengeViewSet(viewsets.ReadOnlyModelViewSet):
         # Get or create user profile
         profile = get_or_create_user_profile(user)
 
-        # Get or create challenge progress
-        progress, created = UserChallengeProgress.objects.get_or_create(
-            user=user,
-            challenge=challenge
-        )
+        old_level = profile.level
 
-        # Calculate stars based on accuracy
-        stars = progress.calculate_stars(accuracy)
+        with transaction.atomic():
+            # Lock the progress row so concurrent completions don't lose attempts
+            progress, created = UserChallengeProgress.objects.select_for_update().get_or_create(
+                user=user,
+                challenge=challenge
+            )
 
-        # Calculate XP earned (base + bonus for high accuracy)
-        xp_earned = challenge.xp_reward
-        if stars == 3:
-            xp_earned = int(xp_earned * 1.5)  # 50% bonus for 3 stars
-        elif stars == 2:
-            xp_earned = int(xp_earned * 1.2)  # 20% bonus for 2 stars
+            # Calculate stars based on accuracy
+            stars = progress.calculate_stars(accuracy)
 
-        # Update progress
-        old_level = profile.level
-        progress.update_progress(accuracy, xp_earned)
+            # Calculate XP earned (base + bonus for high accuracy)
+            xp_earned = challenge.xp_reward
+            if stars == 3:
+                xp_earned = int(xp_earned * 1.5)  # 50% bonus for 3 stars
+            elif stars == 2:
+                xp_earned = int(xp_earned * 1.2)  # 20% bonus for 2 stars
 
-        # Add XP to profile
-        profile.add_xp(xp_earned)
+            # Update progress
+            progress.update_progress(accuracy, xp_earned)
 
-        # Update stats
-        profile.total_exercises_completed += 1
-        profile.update_streak()
-        profile.save()
+            # XP, stats and streak in a single UPDATE
+            profile.apply_progress(xp=xp_earned, exercises=1)
 
         new_level = profile.level
         level_up = new_level > old_level
 
-        # Check for unlocked badges
+        # Check for unlocked badges now that the transaction is committed
         unlocked_badges = []
         if progress.is_completed:
-            new_badges = check_badges(user)
-            unlocked_badges = BadgeInfoSerializer(new_badges, many=True).data
-            check_achievements(user)
+            results = run_gamification(user, metrics=CHALLENGE_METRICS)
+            unlocked_badges = BadgeInfoSerializer(results['badges'], many=True).data
 
         # Return response
         return Response({
@@ -466,3 +561,88 @@ class ChallengeViewSet(viewsets.ReadOnlyModelViewSet):
             'level_up': level_up,
             'unlocked_badges': unlocked_badges
         })
+
+
+class LeaderboardPagination(CursorPagination):
+    """Cursor pagination in board order, stable while scores change"""
+    page_size = 50
+    ordering = ('-score', 'user_id')
+
+
+class LeaderboardViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    XP leaderboards served from the precomputed LeaderboardEntry table
+
+    GET /api/v1/leaderboard/?board=global|weekly|category&category=notes
+    GET /api/v1/leaderboard/me/?board=...
+    """
+    serializer_class = LeaderboardEntrySerializer
+    pagination_class = LeaderboardPagination
+    permission_classes = [AllowAny]
+    filter_backends = []
+
+    def get_board(self):
+        """Board name from query params; raises ValidationError if unknown"""
+        from rest_framework.exceptions import ValidationError
+
+        board = self.request.query_params.get('board', 'global')
+        if board == 'global':
+            return LeaderboardEntry.GLOBAL
+        if board == 'weekly':
+            return LeaderboardEntry.weekly_board()
+        if board == 'category':
+            category = self.request.query_params.get('category')
+            if category not in dict(Lesson.CATEGORY_CHOICES):
+                raise ValidationError({'category': 'Unknown lesson category'})
+            return LeaderboardEntry.category_board(category)
+        raise ValidationError({'board': 'Must be global, weekly or category'})
+
+    def get_queryset(self):
+        return LeaderboardEntry.objects.filter(
+            board=self.get_board(),
+            score__gt=0
+        ).select_related('user')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+
+        if page:
+            # Competition ranking (1, 2, 2, 4): one COUNT query for the whole page
+            top = page[0].score
+            counts = queryset.aggregate(
+                higher=Count('id', filter=Q(score__gt=top)),
+                higher_or_equal=Count('id', filter=Q(score__gte=top))
+            )
+            ties_on_page = sum(1 for entry in page if entry.score == top)
+            first_index = {}
+            for index, entry in enumerate(page):
+                if entry.score == top:
+                    entry.rank = counts['higher'] + 1
+                else:
+                    first = first_index.setdefault(entry.score, index)
+                    entry.rank = counts['higher_or_equal'] + first - ties_on_page + 1
+
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def me(self, request):
+        """
+        Rank and score of the current user
+        GET /api/v1/leaderboard/me/
+        """
+        if not request.user.is_authenticated:
+            return Response(
+                {"error": "Authentication required"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        board = self.get_board()
+        entry = LeaderboardEntry.objects.filter(board=board, user=request.user, score__gt=0).first()
+        return Response({
+            'board': board,
+            'score': entry.score if entry else 0,
+            'rank': entry.get_rank() if entry else None,
+            'total': LeaderboardEntry.objects.filter(board=board, score__gt=0).count()
+        })
@@ -0,0 +1,217 @@
+"""
+Shared cache helpers.
+
+The backend is configured from the environment in settings (CACHE_BACKEND):
+a file-based or database cache shared by every gunicorn worker on a host,
+or Redis when available.
+
+`NamespacedCache` scopes keys per app/feature. Every key includes the
+namespace version, so `invalidate()` drops all entries of a namespace at
+once by bumping it. Hits and misses are counted in the shared cache and
+exposed by `GET /api/v1/cache/stats/`. Counters are buffered per process
+and flushed every CACHE_STATS_FLUSH_EVERY increments; outside Redis the
+increments are not atomic, so the numbers are approximate.
+
+`CachedResponseMixin` builds a full-response cache for public, read-heavy
+endpoints on top of it, with ETag/Last-Modified and 304 support.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+# Registry of namespaces created in this process, used by the stats endpoint
+NAMESPACES = {}
+
+_MISSING = object()
+
+
+class NamespacedCache:
+    """
+    View of the default cache restricted to one namespace.
+
+    Keys look like `<namespace>:<version>:<key>`. The version is initialised
+    from the clock, so if the version key is ever evicted the new one is
+    still greater and stale entries are never served again.
+    """
+
+    def __init__(self, namespace, timeout=None, counters=()):
+        self.namespace = namespace
+        self.timeout = timeout
+        # Extra counters reported next to hits/misses (see count())
+        self.counters = ['hits', 'misses', *counters]
+        self._pending = Counter()
+        self._pending_lock = threading.Lock()
+        NAMESPACES[namespace] = self
+
+    @property
+    def version_key(self):
+        return f'namespace:{self.namespace}:version'
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # add() so concurrent workers agree on a single version
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def make_key(self, key, version=None):
+        """
+        Full cache key. Pass the `version` read before computing a value to
+        store it: if the namespace is invalidated meanwhile, the value lands
+        under the old version and is never served.
+        """
+        if version is None:
+            version = self.get_version()
+        return f'{self.namespace}:{version}:{key}'
+
+    def get(self, key, default=None, version=None):
+        value = cache.get(self.make_key(key, version), _MISSING)
+        if value is _MISSING:
+            self.count('misses')
+            return default
+        self.count('hits')
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT and self.timeout is not None:
+            timeout = self.timeout
+        cache.set(self.make_key(key, version), value, timeout)
+
+    def delete(self, key):
+        cache.delete(self.make_key(key))
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT):
+        """Return the cached value, computing and storing it on a miss"""
+        version = self.get_version()
+        value = self.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout, version=version)
+        return value
+
+    def invalidate(self):
+        """Drop every entry of the namespace by bumping its version"""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, time.time_ns(), None)
+
+    def count(self, counter):
+        """Increment a shared counter of the namespace (buffered, see flush_counters)"""
+        with self._pending_lock:
+            self._pending[counter] += 1
+            if sum(self._pending.values()) < settings.CACHE_STATS_FLUSH_EVERY:
+                return
+            pending, self._pending = self._pending, Counter()
+        self._flush(pending)
+
+    def flush_counters(self):
+        """Add this process's buffered increments to the shared counters"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, Counter()
+        self._flush(pending)
+
+    def _flush(self, pending):
+        for counter, delta in pending.items():
+            key = f'namespace:{self.namespace}:{counter}'
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                if not cache.add(key, delta, None):
+                    cache.incr(key, delta)
+
+    def get_counter(self, counter):
+        self.flush_counters()
+        return cache.get(f'namespace:{self.namespace}:{counter}', 0)
+
+    def get_stats(self):
+        stats = {counter: self.get_counter(counter) for counter in self.counters}
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total * 100, 2) if total else 0
+        return stats
+
+    def reset_stats(self):
+        with self._pending_lock:
+            self._pending.clear()
+        cache.delete_many([
+            f'namespace:{self.namespace}:{counter}' for counter in self.counters
+        ])
+
+
+def get_cache_stats():
+    """Hit/miss counters of every known namespace"""
+    return {
+        'backend': settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1],
+        'namespaces': {
+            name: namespace.get_stats()
+            for name, namespace in sorted(NAMESPACES.items())
+        },
+    }
+
+
+# Public event endpoints (events.JamDeVientosViewSet, jdv.JDVViewSet)
+public_events_cache = NamespacedCache('public_events')
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin that caches successful GET responses.
+
+    Responses are keyed by host + path + query string (serializers build
+    absolute URLs from the request). Set `response_cache` to a
+    NamespacedCache; invalidation is done elsewhere, usually from signals.
+    """
+    response_cache = None
+    cache_timeout = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or self.response_cache is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        location = f'{request.get_host()}{request.get_full_path()}'
+        key = 'response:' + hashlib.md5(location.encode('utf-8')).hexdigest()
+        # Read the version once: a response rendered before an invalidation
+        # must be stored under the old version, not the new one
+        version = self.response_cache.get_version()
+        entry = self.response_cache.get(key, version=version)
+        response = None
+
+        if entry is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+            response.render()
+            entry = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+                'last_modified': int(time.time()),
+            }
+            self.response_cache.set(key, entry, self.cache_timeout or settings.API_CACHE_TIMEOUT, version=version)
+            response['X-Cache'] = 'MISS'
+
+        # Answer conditional requests with 304 Not Modified
+        not_modified = get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified'],
+        )
+        if not_modified is not None:
+            response = not_modified
+        elif response is None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['X-Cache'] = 'HIT'
+
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return response
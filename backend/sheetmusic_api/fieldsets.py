@@ -0,0 +1,96 @@
+"""
+Sparse fieldsets for API responses.
+
+Query parameters (read requests only, top-level fields):
+    ?fields=id,title    only these fields
+    ?omit=notes,image   every field except these
+    ?expand=theme       of the nested serializer fields, render only these;
+                        `?expand=` alone leaves all of them out. Without the
+                        parameter every nested field is rendered.
+
+Views also declare which fields need extra queries (prefetches, joins), so
+the queryset only loads what the response is going to contain.
+"""
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer
+
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class Fieldset:
+    """Fields requested by the client (None means "not restricted")"""
+
+    def __init__(self, fields=None, omit=(), expand=None):
+        self.fields = fields
+        self.omit = set(omit)
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        fields = params.get('fields')
+        expand = params.get('expand')
+        return cls(
+            fields=_split(fields) if fields else None,
+            omit=_split(params.get('omit', '')),
+            expand=_split(expand) if expand is not None else None,
+        )
+
+    def includes(self, name, field):
+        if self.fields is not None and name not in self.fields:
+            return False
+        if name in self.omit:
+            return False
+        if self.expand is not None and isinstance(field, BaseSerializer) and name not in self.expand:
+            return False
+        return True
+
+    def prune(self, serializer):
+        """Drop the fields that were not requested (from the child of a list serializer)"""
+        target = getattr(serializer, 'child', serializer)
+        for name, field in list(target.fields.items()):
+            if not self.includes(name, field):
+                target.fields.pop(name)
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin for ?fields=, ?omit= and ?expand=.
+
+    Attributes:
+        field_querysets: {field name: function(queryset) -> queryset} adding the
+            select_related/prefetch_related that field needs. Applied only when
+            the action's serializer has the field and the client asked for it.
+
+    Write requests are never pruned.
+    """
+    field_querysets = {}
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            request = getattr(self, 'request', None)
+            if request is not None and request.method in SAFE_METHODS:
+                self._fieldset = Fieldset.from_request(request)
+            else:
+                self._fieldset = Fieldset()
+        return self._fieldset
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.field_querysets:
+            return queryset
+
+        fieldset = self.get_fieldset()
+        serializer_fields = self.get_serializer_class()().fields
+        for name, load in self.field_querysets.items():
+            field = serializer_fields.get(name)
+            if field is not None and fieldset.includes(name, field):
+                queryset = load(queryset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        self.get_fieldset().prune(serializer)
+        return serializer
@@ -0,0 +1,104 @@
+"""
+Pagination with opt-ins for deep lists.
+
+By default it behaves like the API-wide PageNumberPagination (?page=N, with
+`count`), so existing clients are unaffected. Clients can opt in to:
+
+    ?pagination=cursor   keyset pagination on (created_at, id): no COUNT and
+                         no OFFSET, so deep pages cost the same as the first.
+                         Follow the `next`/`previous` links (?cursor=...)
+    ?count=false         page numbers without the COUNT(*) query: `count` is
+                         null and `next` is known by reading one extra row
+"""
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(CursorPagination):
+    """CursorPagination that always ends the ordering with the primary key as tie-breaker"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+
+class FlexiblePagination(PageNumberPagination):
+    """
+    Page-number pagination with opt-in cursor pagination and count skipping.
+
+    Attributes:
+        cursor_ordering: Ordering used in cursor mode when the view has no
+            OrderingFilter ordering (should match a composite index)
+    """
+    cursor_ordering = ('-created_at', '-id')
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        self.skip_count = False
+
+        params = request.query_params
+        if params.get(self.mode_query_param) == 'cursor' or KeysetCursorPagination.cursor_query_param in params:
+            self.cursor_paginator = KeysetCursorPagination()
+            self.cursor_paginator.ordering = self.cursor_ordering
+            self.cursor_paginator.page_size = self.get_page_size(request)
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+
+        if params.get(self.count_query_param, '').lower() in ('false', '0'):
+            return self.paginate_without_count(queryset, request)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        try:
+            page_number = int(request.query_params.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            page_number = 0
+        if page_number < 1:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+
+        offset = (page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if page_number > 1 and not rows:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message='That page contains no results'))
+
+        self.skip_count = True
+        self.request = request
+        self.page_number = page_number
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        if not self.skip_count:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', self.get_uncounted_link(self.page_number + 1) if self.has_next else None),
+            ('previous', self.get_uncounted_link(self.page_number - 1) if self.page_number > 1 else None),
+            ('results', data),
+        ]))
+
+    def get_uncounted_link(self, page_number):
+        url = self.request.build_absolute_uri()
+        if page_number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page_number)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count']['nullable'] = True
+        return schema
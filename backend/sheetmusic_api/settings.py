@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
     'events',
     'music_learning',
     'jdv',  # Jam de Vientos API endpoints
+    'webhooks',  # Outbox de notificaciones a n8n
 ]
 
 MIDDLEWARE = [
@@ -216,12 +218,56 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
 # Cache configuration (for better performance)
+# Shared by every gunicorn worker so invalidations and hits are seen by all:
+#   file   - directorio local (un solo host, sin servicios extra) [default]
+#   db     - tabla en la base de datos (requiere `python manage.py createcachetable`)
+#   redis  - servidor Redis en CACHE_LOCATION (requiere el paquete `redis`)
+#   locmem - memoria de cada proceso (solo desarrollo)
+# The test suite always runs on locmem (see TEST_RUNNER), so it never touches
+# the cache of the server running on this host.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'file').lower()
+
+if CACHE_BACKEND == 'redis':
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        # Falling back to another backend would silently stop sharing the cache
+        raise ImproperlyConfigured('CACHE_BACKEND=redis requires the `redis` package')
+
+CACHE_BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join('/tmp', 'sheetmusic_cache')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'sheetmusic_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://localhost:6379/1'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'sheetmusic'),
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f'Unknown CACHE_BACKEND {CACHE_BACKEND!r}, expected one of {", ".join(CACHE_BACKENDS)}')
+CACHE_BACKEND_PATH, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[CACHE_BACKEND]
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKEND_PATH,
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_DEFAULT_LOCATION),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'sheetmusic'),
+        # Bump to discard every cached entry after an incompatible deploy
+        'VERSION': int(os.environ.get('CACHE_VERSION', '1')),
+        'TIMEOUT': 300,
     }
 }
 
+# Seconds a cached public response lives (invalidated earlier by signals on writes)
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', '300'))
+
+# Cache hit/miss counters are buffered per process and flushed every N increments.
+# Only Redis increments atomically; elsewhere batching keeps the counter writes
+# off the hot path, and the stats are approximate.
+CACHE_STATS_FLUSH_EVERY = int(os.environ.get(
+    'CACHE_STATS_FLUSH_EVERY', '1' if CACHE_BACKEND == 'redis' else '50'
+))
+
+# Swaps CACHES for a per-process locmem cache while the suite runs
+TEST_RUNNER = 'sheetmusic_api.testing.TestRunner'
+
 # WhiteNoise configuration for serving static files
 R2_BUCKET_NAME = os.environ.get('R2_BUCKET_NAME')
 R2_ENDPOINT_URL = os.environ.get('R2_ENDPOINT_URL')
@@ -262,4 +308,25 @@ MUSIC_LEARNING_SETTINGS = {
     'ALLOW_ANONYMOUS': True,  # Permitir modo demo sin autenticación
     'XP_PER_LEVEL': 100,
     'STREAK_REQUIRED_HOURS': 24,
+    'STATS_DEFAULT_DAYS': 7,  # Ventana de actividad reciente en /user/stats/
+    'STATS_MAX_DAYS': 365,
+}
+
+# n8n Webhook Integration
+# Signals write to an outbox table; `python manage.py dispatch_webhooks` delivers it
+WEBHOOK_SETTINGS = {
+    'URL': os.environ.get('N8N_WEBHOOK_URL', 'http://localhost:5678/webhook/sheet-api-created'),
+    'ENABLED': os.environ.get('WEBHOOK_ENABLED', 'true').lower() == 'true',
+    'TIMEOUT': float(os.environ.get('WEBHOOK_TIMEOUT', '5')),
+    'BATCH_SIZE': int(os.environ.get('WEBHOOK_BATCH_SIZE', '50')),
+    'POLL_INTERVAL': float(os.environ.get('WEBHOOK_POLL_INTERVAL', '5')),
+    'MAX_ATTEMPTS': int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8')),
+    # Batch mode: one POST per flush with events coalesced per entity.
+    # A batch is flushed at BATCH_SIZE events or after FLUSH_INTERVAL seconds.
+    'BATCH_MODE': os.environ.get('WEBHOOK_BATCH_MODE', 'false').lower() == 'true',
+    'FLUSH_INTERVAL': float(os.environ.get('WEBHOOK_FLUSH_INTERVAL', '10')),
+    'RETRY_BASE_SECONDS': 30,
+    'RETRY_MAX_SECONDS': 3600,
+    # Claimed events are leased for TIMEOUT per POST plus this margin
+    'LEASE_MARGIN_SECONDS': 60,
 }
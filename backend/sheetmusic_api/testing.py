@@ -0,0 +1,71 @@
+"""
+Test helpers.
+
+TestRunner runs the suite on a per-process locmem cache whatever
+CACHE_BACKEND says, so `manage.py test`, `django-admin test` or a coverage
+wrapper never read or invalidate the cache of a server on the same host.
+
+QueryPlanMixin.assertUsesIndex(queryset, *names) runs EXPLAIN for the
+queryset and checks the planner picked one of the named indexes. Supported
+on SQLite and PostgreSQL; on other backends the test is skipped.
+
+Test tables only have a handful of rows, so PostgreSQL would rather scan them
+sequentially: sequential scans are disabled while explaining, so the check is
+"can the planner serve this query from the index", not "is it cheaper today".
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sheetmusic-tests',
+        'KEY_PREFIX': 'sheetmusic',
+        'TIMEOUT': 300,
+    }
+}
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_settings = override_settings(CACHES=TEST_CACHES, CACHE_STATS_FLUSH_EVERY=50)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryPlanMixin:
+
+    @contextmanager
+    def _planner_prefers_indexes(self):
+        if connection.vendor != 'postgresql':
+            yield
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+
+    def explain(self, queryset):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'No query plan checks for {connection.vendor}')
+        with self._planner_prefers_indexes():
+            return queryset.explain()
+
+    def assertUsesIndex(self, queryset, *names):
+        plan = self.explain(queryset)
+        # SQLite: "USING [COVERING] INDEX name"; PostgreSQL: "Index [Only] Scan using name", "Bitmap Index Scan on name"
+        pattern = r'(?:INDEX|using|Scan on) ({})\b'.format('|'.join(map(re.escape, names)))
+        if not re.search(pattern, plan):
+            self.fail(f'None of {", ".join(names)} used by:\n{queryset.query}\n\nPlan:\n{plan}')
@@ -22,6 +22,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .views import cache_stats
+
 # Configuración de Swagger/OpenAPI
 schema_view = get_schema_view(
    openapi.Info(
@@ -51,6 +53,7 @@ urlpatterns = [
         path('events/', include('events.urls')),
         path('', include('music_learning.urls')),
         path('jdv/', include('jdv.urls')),  # Jam de Vientos API endpoints
+        path('cache/stats/', cache_stats, name='cache-stats'),  # Métricas del cache (solo admin)
     ])),
 ]
 
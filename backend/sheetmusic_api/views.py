@@ -0,0 +1,22 @@
+"""
+Project-level API views
+"""
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .cache import NAMESPACES, get_cache_stats
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats(request):
+    """
+    Hit/miss counters of the shared cache, per namespace.
+
+    DELETE resets the counters (not the cached entries).
+    """
+    if request.method == 'DELETE':
+        for namespace in NAMESPACES.values():
+            namespace.reset_stats()
+    return Response(get_cache_stats())
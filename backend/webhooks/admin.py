@@ -0,0 +1,29 @@
+from django.contrib import admin
+from .models import WebhookBatch, WebhookEvent
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['entity_type', 'entity_id', 'action', 'status', 'attempts', 'next_attempt_at', 'created_at']
+    list_filter = ['status', 'entity_type', 'action']
+    raw_id_fields = ['batch']
+    search_fields = ['entity_type', 'last_error']
+    readonly_fields = ['created_at', 'delivered_at']
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        """Requeue selected events (including dead ones) for immediate delivery"""
+        from django.utils import timezone
+        updated = queryset.exclude(status='DELIVERED').update(
+            status='PENDING',
+            next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} eventos reencolados')
+    retry_now.short_description = 'Reintentar ahora'
+
+
+@admin.register(WebhookBatch)
+class WebhookBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'size', 'source_events', 'latency_ms', 'queue_delay_ms', 'created_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['status', 'size', 'source_events', 'latency_ms', 'queue_delay_ms', 'error', 'created_at']
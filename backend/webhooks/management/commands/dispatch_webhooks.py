@@ -0,0 +1,61 @@
+"""
+Management command to deliver pending n8n webhooks from the outbox
+Usage: python manage.py dispatch_webhooks [--once] [--batch-size 50] [--interval 5]
+"""
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+
+from webhooks.utils import dispatch_pending, get_webhook_setting
+
+
+class Command(BaseCommand):
+    help = 'Delivers pending webhook events from the outbox to n8n'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit instead of polling forever'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Events delivered per batch (default: WEBHOOK_SETTINGS["BATCH_SIZE"])'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='Seconds to sleep when the outbox is empty (default: WEBHOOK_SETTINGS["POLL_INTERVAL"])'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or get_webhook_setting('BATCH_SIZE')
+        interval = options['interval'] or get_webhook_setting('POLL_INTERVAL')
+
+        # One pooled client for the whole run instead of one per event
+        with httpx.Client(timeout=get_webhook_setting('TIMEOUT')) as client:
+            while True:
+                # --once always flushes, even a partial batch
+                summary = dispatch_pending(client, batch_size=batch_size, force=options['once'])
+                processed = sum(summary.values())
+
+                if processed:
+                    self.stdout.write(
+                        f"delivered={summary['delivered']} "
+                        f"retried={summary['retried']} dead={summary['dead']}"
+                    )
+
+                # A full batch means there is probably more work waiting
+                if processed >= batch_size:
+                    continue
+
+                if options['once']:
+                    break
+
+                time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS('✓ Outbox drained'))
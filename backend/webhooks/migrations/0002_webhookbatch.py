@@ -0,0 +1,37 @@
+# Generated by Django 4.2.27 on 2026-10-17 02:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhooks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('DELIVERED', 'Entregado'), ('FAILED', 'Fallido')], max_length=20)),
+                ('source_events', models.PositiveIntegerField(default=0, help_text='Eventos del outbox incluidos en el lote')),
+                ('size', models.PositiveIntegerField(default=0, help_text='Entradas enviadas tras agrupar por entidad')),
+                ('latency_ms', models.PositiveIntegerField(default=0, help_text='Duración del POST a n8n en milisegundos')),
+                ('queue_delay_ms', models.PositiveIntegerField(default=0, help_text='Antigüedad del evento más viejo al enviar el lote')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Lote de Webhooks',
+                'verbose_name_plural': 'Lotes de Webhooks',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='webhooks.webhookbatch'),
+        ),
+    ]
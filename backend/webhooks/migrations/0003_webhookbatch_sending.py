@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhooks', '0002_webhookbatch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='webhookbatch',
+            name='status',
+            field=models.CharField(choices=[('SENDING', 'Enviando'), ('DELIVERED', 'Entregado'), ('FAILED', 'Fallido')], max_length=20),
+        ),
+    ]
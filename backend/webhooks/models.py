@@ -0,0 +1,107 @@
+"""
+Models for the n8n webhook outbox
+"""
+from django.db import models
+from django.utils import timezone
+
+
+class WebhookBatch(models.Model):
+    """
+    One POST to n8n carrying several coalesced outbox events.
+
+    Only used when WEBHOOK_SETTINGS['BATCH_MODE'] is enabled. Each row doubles
+    as the per-batch metrics record (size, latency, queue delay).
+    """
+
+    STATUS_CHOICES = [
+        ('SENDING', 'Enviando'),
+        ('DELIVERED', 'Entregado'),
+        ('FAILED', 'Fallido'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    source_events = models.PositiveIntegerField(
+        default=0,
+        help_text='Eventos del outbox incluidos en el lote'
+    )
+    size = models.PositiveIntegerField(
+        default=0,
+        help_text='Entradas enviadas tras agrupar por entidad'
+    )
+    latency_ms = models.PositiveIntegerField(
+        default=0,
+        help_text='Duración del POST a n8n en milisegundos'
+    )
+    queue_delay_ms = models.PositiveIntegerField(
+        default=0,
+        help_text='Antigüedad del evento más viejo al enviar el lote'
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Lote de Webhooks'
+        verbose_name_plural = 'Lotes de Webhooks'
+
+    def __str__(self):
+        return f"Lote #{self.id}: {self.size}/{self.source_events} eventos ({self.status})"
+
+
+class WebhookEvent(models.Model):
+    """
+    Outbox row for a notification pending delivery to n8n.
+
+    Rows are written by the post_save signals of the music and events apps in
+    the same transaction as the entity, and drained asynchronously by the
+    `dispatch_webhooks` management command.
+    """
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pendiente'),
+        ('DELIVERED', 'Entregado'),
+        ('DEAD', 'Descartado'),
+    ]
+
+    entity_type = models.CharField(max_length=50)
+    entity_id = models.BigIntegerField()
+    action = models.CharField(max_length=20, default='created')
+    data = models.JSONField(default=dict)
+
+    # Delivery state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    batch = models.ForeignKey(
+        WebhookBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='events'
+    )
+
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Evento de Webhook'
+        verbose_name_plural = 'Eventos de Webhook'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.entity_type} #{self.entity_id} ({self.action}) - {self.status}"
+
+    @property
+    def payload(self):
+        """Body posted to n8n for this event"""
+        return {
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'action': self.action,
+            'data': self.data,
+        }
@@ -0,0 +1,208 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import httpx
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from music.models import Instrument
+from .models import WebhookBatch, WebhookEvent
+from .utils import dispatch_pending
+
+
+# The dispatch command builds its own client; tests patch httpx.Client
+HTTPClient = httpx.Client
+
+
+def webhook_settings(**overrides):
+    return override_settings(WEBHOOK_SETTINGS={**settings.WEBHOOK_SETTINGS, 'ENABLED': True, **overrides})
+
+
+def mock_client(status_code=200, requests=None, on_request=None):
+    """httpx client answering every POST with status_code, recording the JSON bodies"""
+    def handler(request):
+        if requests is not None:
+            requests.append(json.loads(request.content))
+        if on_request is not None:
+            on_request(request)
+        return httpx.Response(status_code)
+    return HTTPClient(transport=httpx.MockTransport(handler))
+
+
+@webhook_settings(BATCH_MODE=False, MAX_ATTEMPTS=3, RETRY_BASE_SECONDS=30)
+class WebhookOutboxTest(TestCase):
+    """Notifications are written to the outbox and delivered with retries"""
+
+    def create_event(self, entity_id=1, **kwargs):
+        return WebhookEvent.objects.create(entity_type='Theme', entity_id=entity_id, data={'id': entity_id}, **kwargs)
+
+    def test_signal_writes_outbox_row_with_the_entity(self):
+        instrument = Instrument.objects.create(name='Trompeta', afinacion='Bb')
+        event = WebhookEvent.objects.get(entity_type='Instrument', entity_id=instrument.id)
+        self.assertEqual(event.status, 'PENDING')
+        self.assertEqual(event.data['name'], 'Trompeta')
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Instrument.objects.create(name='Tuba', afinacion='C')
+                raise RuntimeError
+        self.assertEqual(WebhookEvent.objects.filter(entity_type='Instrument').count(), 1)
+
+    def test_delivery(self):
+        event = self.create_event()
+        requests = []
+        summary = dispatch_pending(mock_client(requests=requests))
+
+        self.assertEqual(summary, {'delivered': 1, 'retried': 0, 'dead': 0})
+        self.assertEqual(requests, [event.payload])
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'DELIVERED')
+        self.assertEqual(event.attempts, 1)
+        self.assertIsNotNone(event.delivered_at)
+
+    def test_post_runs_outside_the_claim_transaction(self):
+        event = self.create_event()
+        depth = len(connection.atomic_blocks)
+        seen = {}
+
+        def on_request(request):
+            seen['depth'] = len(connection.atomic_blocks)
+            seen['next_attempt_at'] = WebhookEvent.objects.get(pk=event.pk).next_attempt_at
+
+        before = timezone.now()
+        dispatch_pending(mock_client(on_request=on_request))
+        self.assertEqual(seen['depth'], depth)
+        # Leased while in flight, so other dispatchers skip it
+        self.assertGreater(seen['next_attempt_at'], before)
+
+    def test_failure_is_rescheduled_with_backoff(self):
+        event = self.create_event()
+        before = timezone.now()
+        summary = dispatch_pending(mock_client(status_code=502))
+
+        self.assertEqual(summary, {'delivered': 0, 'retried': 1, 'dead': 0})
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'PENDING')
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('502', event.last_error)
+        self.assertGreaterEqual(event.next_attempt_at, before + timedelta(seconds=30))
+        self.assertLess(event.next_attempt_at, before + timedelta(seconds=60))
+
+        # Not due yet
+        self.assertEqual(sum(dispatch_pending(mock_client()).values()), 0)
+
+        # The second failure waits twice as long
+        WebhookEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+        before = timezone.now()
+        dispatch_pending(mock_client(status_code=502))
+        event.refresh_from_db()
+        self.assertGreaterEqual(event.next_attempt_at, before + timedelta(seconds=60))
+
+    def test_dead_after_max_attempts(self):
+        event = self.create_event(attempts=2)
+        summary = dispatch_pending(mock_client(status_code=500))
+
+        self.assertEqual(summary, {'delivered': 0, 'retried': 0, 'dead': 1})
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'DEAD')
+        self.assertEqual(event.attempts, 3)
+
+        WebhookEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(sum(dispatch_pending(mock_client()).values()), 0)
+
+    def test_dispatch_command_drains_the_outbox(self):
+        for entity_id in range(5):
+            self.create_event(entity_id)
+        requests = []
+
+        with mock.patch('webhooks.management.commands.dispatch_webhooks.httpx.Client',
+                        side_effect=lambda **kwargs: mock_client(requests=requests)):
+            call_command('dispatch_webhooks', '--once', '--batch-size', '2', stdout=StringIO())
+
+        self.assertEqual(len(requests), 5)
+        self.assertFalse(WebhookEvent.objects.exclude(status='DELIVERED').exists())
+
+
+@webhook_settings(BATCH_MODE=True, BATCH_SIZE=3, FLUSH_INTERVAL=60, MAX_ATTEMPTS=3)
+class WebhookBatchTest(TestCase):
+    """Batch mode sends one coalesced request per flush and records its metrics"""
+
+    def create_event(self, entity_id, data=None, action='created', age=None):
+        event = WebhookEvent.objects.create(
+            entity_type='Theme', entity_id=entity_id, action=action, data=data or {'id': entity_id}
+        )
+        if age is not None:
+            WebhookEvent.objects.filter(pk=event.pk).update(created_at=timezone.now() - age)
+        return event
+
+    def test_coalesces_per_entity(self):
+        self.create_event(1, {'title': 'Viejo'})
+        self.create_event(2)
+        self.create_event(1, {'title': 'Nuevo'}, action='updated')
+        requests = []
+
+        summary = dispatch_pending(mock_client(requests=requests), force=True)
+
+        self.assertEqual(summary, {'delivered': 3, 'retried': 0, 'dead': 0})
+        self.assertEqual(len(requests), 1)
+        body = requests[0]
+        self.assertEqual(body['count'], 2)
+        self.assertEqual(body['events'], [
+            {'entity_type': 'Theme', 'entity_id': 1, 'action': 'created', 'data': {'title': 'Nuevo'}, 'event_count': 2},
+            {'entity_type': 'Theme', 'entity_id': 2, 'action': 'created', 'data': {'id': 2}, 'event_count': 1},
+        ])
+
+    def test_flush_on_size(self):
+        self.create_event(1)
+        self.create_event(2)
+        requests = []
+
+        self.assertEqual(sum(dispatch_pending(mock_client(requests=requests)).values()), 0)
+        self.assertEqual(requests, [])
+        # Not flushed, so not leased either
+        self.assertFalse(WebhookEvent.objects.filter(next_attempt_at__gt=timezone.now()).exists())
+
+        self.create_event(3)
+        self.assertEqual(dispatch_pending(mock_client(requests=requests))['delivered'], 3)
+        self.assertEqual(len(requests), 1)
+
+    def test_flush_on_interval(self):
+        self.create_event(1, age=timedelta(seconds=30))
+        self.assertEqual(sum(dispatch_pending(mock_client()).values()), 0)
+
+        self.create_event(2, age=timedelta(seconds=90))
+        self.assertEqual(dispatch_pending(mock_client())['delivered'], 2)
+
+    def test_batch_metrics(self):
+        self.create_event(1, age=timedelta(seconds=5))
+        self.create_event(1)
+        self.create_event(2)
+
+        dispatch_pending(mock_client())
+
+        batch = WebhookBatch.objects.get()
+        self.assertEqual(batch.status, 'DELIVERED')
+        self.assertEqual((batch.source_events, batch.size), (3, 2))
+        self.assertGreaterEqual(batch.queue_delay_ms, 5000)
+        self.assertEqual(batch.events.filter(status='DELIVERED').count(), 3)
+
+    def test_failed_batch_reschedules_every_event(self):
+        for entity_id in (1, 1, 2):
+            self.create_event(entity_id)
+        before = timezone.now()
+
+        summary = dispatch_pending(mock_client(status_code=503))
+
+        self.assertEqual(summary, {'delivered': 0, 'retried': 3, 'dead': 0})
+        batch = WebhookBatch.objects.get()
+        self.assertEqual(batch.status, 'FAILED')
+        self.assertIn('503', batch.error)
+        for event in WebhookEvent.objects.all():
+            self.assertEqual((event.status, event.attempts), ('PENDING', 1))
+            self.assertGreater(event.next_attempt_at, before)
+            self.assertIsNone(event.batch_id)
@@ -0,0 +1,303 @@
+"""
+Outbox helpers for n8n webhook notifications
+"""
+import logging
+import time
+from datetime import timedelta
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def get_webhook_setting(name):
+    """Read a value from settings.WEBHOOK_SETTINGS"""
+    return settings.WEBHOOK_SETTINGS[name]
+
+
+def enqueue_webhook(entity_type, entity_id, data, action='created'):
+    """
+    Record a webhook notification in the outbox.
+
+    The row is written in the caller's transaction, so it is committed (or
+    rolled back) together with the entity that triggered it. Delivery happens
+    later in `dispatch_pending`; the request never waits on n8n.
+
+    Args:
+        entity_type: Type of entity (Theme, Instrument, Version, etc.)
+        entity_id: ID of the entity
+        data: JSON-serializable entity data to send
+        action: Action that triggered the notification
+
+    Returns:
+        WebhookEvent instance, or None if webhooks are disabled
+    """
+    from .models import WebhookEvent
+
+    if not get_webhook_setting('ENABLED'):
+        logger.info(f"Webhooks disabled. Skipping {entity_type} #{entity_id}")
+        return None
+
+    return WebhookEvent.objects.create(
+        entity_type=entity_type,
+        entity_id=entity_id,
+        action=action,
+        data=data,
+    )
+
+
+def get_retry_delay(attempts):
+    """
+    Exponential backoff for a failed delivery.
+
+    Args:
+        attempts: Number of attempts already made (>= 1)
+
+    Returns:
+        timedelta: Time to wait before the next attempt
+    """
+    base = get_webhook_setting('RETRY_BASE_SECONDS')
+    maximum = get_webhook_setting('RETRY_MAX_SECONDS')
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
+
+
+def deliver_event(client, event):
+    """
+    POST a single outbox event to n8n.
+
+    Args:
+        client: httpx.Client shared by the whole dispatch run
+        event: WebhookEvent instance
+
+    Returns:
+        str: Error message, or None if the delivery succeeded
+    """
+    return post_payload(client, event.payload)
+
+
+def post_payload(client, payload):
+    """
+    POST a JSON payload to the n8n webhook URL.
+
+    Returns:
+        str: Error message, or None if the delivery succeeded
+    """
+    try:
+        response = client.post(get_webhook_setting('URL'), json=payload)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        return str(e) or e.__class__.__name__
+    return None
+
+
+def coalesce_events(events):
+    """
+    Group outbox events by (entity_type, entity_id).
+
+    The first event of each entity keeps its position and action, and takes
+    the data of the latest event, so n8n receives one entry per entity with
+    its most recent state.
+
+    Args:
+        events: WebhookEvent instances ordered by id
+
+    Returns:
+        list: Payload entries, one per entity
+    """
+    merged = {}
+    for event in events:
+        key = (event.entity_type, event.entity_id)
+        if key in merged:
+            merged[key]['data'] = event.data
+            merged[key]['event_count'] += 1
+        else:
+            merged[key] = {**event.payload, 'event_count': 1}
+    return list(merged.values())
+
+
+def claim_due_events(batch_size):
+    """
+    Lock and return the next due outbox events.
+
+    Must be called inside a transaction. Rows are locked with SKIP LOCKED
+    (where supported) so several dispatchers can drain the outbox concurrently.
+    The caller leases them (`lease_events`) before the transaction ends.
+    """
+    from .models import WebhookEvent
+
+    return list(
+        WebhookEvent.objects.select_for_update(skip_locked=True).filter(
+            status='PENDING',
+            next_attempt_at__lte=timezone.now()
+        ).order_by('id')[:batch_size]
+    )
+
+
+def lease_events(events, requests):
+    """
+    Push next_attempt_at past the expected delivery time of the claimed events.
+
+    Deliveries run outside any transaction so the POSTs to n8n never hold the
+    database (on SQLite an open transaction blocks every other writer). While
+    leased, other dispatchers skip the rows; if this one dies before recording
+    the results, they become due again when the lease expires.
+
+    Args:
+        events: WebhookEvent instances returned by claim_due_events
+        requests: Number of POSTs that will be made for them
+    """
+    from .models import WebhookEvent
+
+    lease = get_webhook_setting('TIMEOUT') * requests + get_webhook_setting('LEASE_MARGIN_SECONDS')
+    leased_until = timezone.now() + timedelta(seconds=lease)
+    WebhookEvent.objects.filter(pk__in=[event.pk for event in events]).update(next_attempt_at=leased_until)
+    for event in events:
+        event.next_attempt_at = leased_until
+
+
+def record_failure(event, error, summary):
+    """Reschedule a failed event with backoff, or move it to DEAD"""
+    event.attempts += 1
+    event.last_error = error
+
+    if event.attempts >= get_webhook_setting('MAX_ATTEMPTS'):
+        event.status = 'DEAD'
+        summary['dead'] += 1
+        logger.error(
+            f"Giving up on webhook for {event.entity_type} #{event.entity_id} "
+            f"after {event.attempts} attempts: {error}"
+        )
+    else:
+        event.next_attempt_at = timezone.now() + get_retry_delay(event.attempts)
+        summary['retried'] += 1
+        logger.warning(f"Failed to send webhook for {event.entity_type} #{event.entity_id}: {error}")
+
+
+def record_success(event, summary, batch=None):
+    """Mark an event as delivered"""
+    event.attempts += 1
+    event.status = 'DELIVERED'
+    event.delivered_at = timezone.now()
+    event.last_error = ''
+    event.batch = batch
+    summary['delivered'] += 1
+
+
+UPDATE_FIELDS = ['status', 'attempts', 'next_attempt_at', 'last_error', 'delivered_at', 'batch']
+
+
+def dispatch_pending(client, batch_size=None, force=False):
+    """
+    Deliver one batch of due outbox events.
+
+    Sends one request per event, or a single coalesced request per batch when
+    WEBHOOK_SETTINGS['BATCH_MODE'] is enabled. Failed deliveries are
+    rescheduled with exponential backoff and moved to DEAD after MAX_ATTEMPTS.
+    Events are claimed and their results recorded in short transactions; the
+    POSTs themselves run outside of them.
+
+    Args:
+        client: httpx.Client used for every request in the batch
+        batch_size: Maximum number of events to process
+        force: In batch mode, flush even if neither the size threshold nor the
+            flush interval has been reached
+
+    Returns:
+        dict: Counts of delivered, retried and dead events
+    """
+    batch_size = batch_size or get_webhook_setting('BATCH_SIZE')
+    if get_webhook_setting('BATCH_MODE'):
+        return dispatch_batch(client, batch_size, force=force)
+
+    from .models import WebhookEvent
+
+    summary = {'delivered': 0, 'retried': 0, 'dead': 0}
+
+    with transaction.atomic():
+        events = claim_due_events(batch_size)
+        lease_events(events, requests=len(events))
+
+    for event in events:
+        error = deliver_event(client, event)
+        if error is None:
+            record_success(event, summary)
+            logger.info(f"Webhook sent for {event.entity_type} #{event.entity_id}")
+        else:
+            record_failure(event, error, summary)
+
+    WebhookEvent.objects.bulk_update(events, UPDATE_FIELDS)
+
+    return summary
+
+
+def dispatch_batch(client, batch_size, force=False):
+    """
+    Deliver due outbox events as a single coalesced request.
+
+    The batch is flushed when it reaches batch_size events or when its oldest
+    event has waited FLUSH_INTERVAL seconds. Each flush is recorded as a
+    WebhookBatch with its size and latency.
+
+    Payload:
+        {
+            "batch_id": 12,
+            "count": 3,
+            "events": [{"entity_type": ..., "entity_id": ..., "action": ...,
+                        "data": {...}, "event_count": 2}, ...]
+        }
+    """
+    from .models import WebhookBatch, WebhookEvent
+
+    summary = {'delivered': 0, 'retried': 0, 'dead': 0}
+
+    with transaction.atomic():
+        events = claim_due_events(batch_size)
+        if not events:
+            return summary
+
+        now = timezone.now()
+        oldest = min(event.created_at for event in events)
+        flush_after = timedelta(seconds=get_webhook_setting('FLUSH_INTERVAL'))
+        if not force and len(events) < batch_size and now - oldest < flush_after:
+            return summary
+
+        lease_events(events, requests=1)
+        entries = coalesce_events(events)
+        batch = WebhookBatch.objects.create(
+            status='SENDING',
+            source_events=len(events),
+            size=len(entries),
+            queue_delay_ms=int((now - oldest).total_seconds() * 1000),
+        )
+
+    started = time.monotonic()
+    error = post_payload(client, {
+        'batch_id': batch.id,
+        'count': len(entries),
+        'events': entries,
+    })
+    batch.latency_ms = int((time.monotonic() - started) * 1000)
+
+    if error is None:
+        batch.status = 'DELIVERED'
+        for event in events:
+            record_success(event, summary, batch=batch)
+    else:
+        batch.status = 'FAILED'
+        batch.error = error
+        for event in events:
+            record_failure(event, error, summary)
+
+    with transaction.atomic():
+        batch.save(update_fields=['status', 'latency_ms', 'error'])
+        WebhookEvent.objects.bulk_update(events, UPDATE_FIELDS)
+
+    logger.info(
+        f"Webhook batch #{batch.id} {batch.status}: {batch.size} entries "
+        f"from {batch.source_events} events in {batch.latency_ms}ms "
+        f"(queued {batch.queue_delay_ms}ms)"
+    )
+    return summary